@@ -1,22 +1,30 @@
-from flask import Flask
+import logging
+from flask import Flask, jsonify, request
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_cors import CORS
+from werkzeug.exceptions import HTTPException
 from .config import Config
+from .json_provider import OrjsonProvider
 
 # Initialize SQLAlchemy
 db = SQLAlchemy()
 migrate = Migrate()
 
+logger = logging.getLogger(__name__)
+
 def create_app(config_class=Config):
     """Create and configure the Flask application."""
     app = Flask(__name__)
     app.config.from_object(config_class)
+    # Serialize jsonify responses and parse request bodies with orjson
+    app.json = OrjsonProvider(app)
     
     # Initialize extensions
     db.init_app(app)
     migrate.init_app(app, db)
-    CORS(app)
+    # Expose the pagination headers of list endpoints to the frontend
+    CORS(app, expose_headers=['X-Total-Count', 'X-Page', 'X-Per-Page', 'X-Next-Cursor'])
     
     # Register main API blueprints
     from .routes import main_bp
@@ -34,6 +42,18 @@ def create_app(config_class=Config):
     from .appointments.routes import appointments_bp
     app.register_blueprint(appointments_bp)
     
+    @app.errorhandler(HTTPException)
+    def handle_http_error(e):
+        """Return HTTP errors (404, 405, 413, ...) as JSON, like the API's other errors."""
+        return jsonify({"error": e.description}), e.code
+    
+    @app.errorhandler(Exception)
+    def handle_unexpected_error(e):
+        """Log an unhandled error once and return a JSON 500, leaving nothing half-saved."""
+        db.session.rollback()
+        logger.exception(f"Unhandled error on {request.method} {request.path}: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
+    
     @app.route('/health')
     def health_check():
         """Simple health check endpoint."""
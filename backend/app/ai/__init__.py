@@ -1,5 +1,14 @@
 """AI package initialization."""
-from .agent import SymptomAssessmentAgent
-from .pubmed_tool import PubMedTool
 
 __all__ = ["SymptomAssessmentAgent", "PubMedTool"]
+
+
+def __getattr__(name):
+    """Import the agent and tools on first access so importing the package stays cheap."""
+    if name == "SymptomAssessmentAgent":
+        from .agent import SymptomAssessmentAgent
+        return SymptomAssessmentAgent
+    if name == "PubMedTool":
+        from .pubmed_tool import PubMedTool
+        return PubMedTool
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,52 +1,106 @@
 """Symptom Assessment Agent using OpenAI directly."""
 import os
+import asyncio
+import atexit
+import hashlib
+import queue
+import threading
 import logging
-import json
 import re
-from typing import Dict, List, Any, Optional
-from openai import OpenAI
-from datetime import datetime
+import time
+from collections import deque
+from typing import Callable, Dict, Iterator, List, Any, Optional, Tuple
+import httpx
+import orjson
+import tiktoken
+from openai import AsyncOpenAI, APIConnectionError, InternalServerError, RateLimitError
+from flask import current_app
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_random_exponential
+from sqlalchemy import select, func
+from cachetools import LRUCache, TTLCache
 
 from .pubmed_tool import PubMedTool
 from .clinical_trials_tool import ClinicalTrialsTool
+from .openai_throttle import OpenAIThrottle
+from .http_retry import LITERATURE_API_TIMEOUT
+from .. import db
 from ..models import MedicalDocument
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Define urgency levels
-URGENCY_LEVELS = {
-    "EMERGENCY": "Seek immediate emergency care (call emergency services or go to ER)",
-    "URGENT": "See a doctor within 24 hours",
-    "SEMI_URGENT": "Schedule an appointment within a few days",
-    "ROUTINE": "Schedule a routine appointment",
-    "SELF_CARE": "Can be managed with self-care at home with monitoring"
+# Default description for each urgency level the model may return
+URGENCY_DESCRIPTIONS = {
+    "high": "Seek immediate medical attention",
+    "medium": "Consult with a healthcare provider soon",
+    "low": "Monitor symptoms and practice appropriate self-care"
 }
 
-# Define structure without using Pydantic models to avoid compatibility issues
+DISCLAIMER = "This is an AI-assisted pre-assessment and not a medical diagnosis. Always consult with a healthcare professional for proper medical advice."
 
-class SymptomAssessmentAgent:
-    """Agent for assessing symptoms and providing urgency recommendations."""
+# Limits for patient documents included in the assessment prompt
+DOCUMENT_SNIPPET_TOKENS = 500  # per document
+DOCUMENT_TOKEN_BUDGET = 6000  # across all documents
+# Characters read from the database per document; generously above the token cap
+DOCUMENT_FETCH_CHARS = DOCUMENT_SNIPPET_TOKENS * 8
+MAX_PATIENT_DOCUMENTS = 20
+
+# Prompt size limits for the assessment model
+MODEL_CONTEXT_TOKENS = 128000
+RESPONSE_TOKEN_RESERVE = 4096
+# OpenAI only applies automatic prompt caching to prompts with at least this many tokens
+PROMPT_CACHE_MIN_TOKENS = 1024
+# Token estimate used while the tokenizer can't be loaded (tiktoken downloads it on first use)
+CHARS_PER_TOKEN = 4
+TOKENIZER_RETRY_SECONDS = 300
+
+# OpenAI errors worth retrying (APITimeoutError is a subclass of APIConnectionError)
+TRANSIENT_OPENAI_ERRORS = (RateLimitError, APIConnectionError, InternalServerError)
+
+# Patterns used to turn the symptom text into a PubMed query
+_PATIENT_MENTION_RE = re.compile(r"Patient [\w\s]+ reports:\s*(.*)")
+_STOPWORDS_RE = re.compile(r"\b(have|has|having|experiencing|suffering|from|with|and|the|is|are|my|I|feel|feeling|patient)\b", re.IGNORECASE)
+_PUNCTUATION_RE = re.compile(r"[?!.,]")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# Greetings and thanks answered without calling the model. Short replies such as
+# "yes", "no" or "ok" are left to the model: they usually answer its last question
+_TRIVIAL_MESSAGE_RE = re.compile(r"^\s*(hi|hello|hey|thanks?|thank you)[\s!.?]*$", re.IGNORECASE)
+
+# Tokens ignored when ranking documents against the symptoms
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_RANKING_STOPWORDS = {"a", "an", "and", "the", "is", "are", "i", "my", "have", "has", "with", "of", "in", "on", "for", "to", "it", "since", "feel", "feeling"}
+
+# PubMed and ClinicalTrials.gov results caches: common symptom queries repeat across patients
+PUBMED_CACHE_SIZE = 1024
+PUBMED_CACHE_TTL = 24 * 60 * 60  # seconds
+TRIALS_CACHE_SIZE = 1024
+TRIALS_CACHE_TTL = 24 * 60 * 60  # seconds
+
+# Per-patient conversation memory, expired when the patient goes quiet. The most recent
+# messages go into the prompt verbatim and older ones are folded into a short summary.
+HISTORY_MAX_MESSAGES = 20
+HISTORY_TOKEN_BUDGET = 6000  # for the messages kept verbatim
+HISTORY_SUMMARY_CHARS = 200  # per summarized patient message
+HISTORY_REASONING_CHARS = 300  # of each assessment's reasoning kept in history
+HISTORY_MAX_PATIENTS = 1024
+HISTORY_TTL = 60 * 60  # seconds
+
+# OpenAI Batch API jobs for offline re-assessment: seconds between status checks,
+# and the states after which a batch will make no further progress
+BATCH_POLL_INTERVAL = 60
+BATCH_FINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+def _has_results(items: List[Dict[str, Any]]) -> bool:
+    """Whether a PubMed or ClinicalTrials.gov tool call returned actual results.
     
-    def __init__(self):
-        """Initialize the symptom assessment agent."""
-        # Initialize OpenAI client
-        # Use a dummy API key if environment variable is not set
-        api_key = os.environ.get("OPENAI_API_KEY", "dummy-api-key-for-testing")
-        self.client = OpenAI(api_key=api_key)
-        # Flag to track if we have a real API key
-        self.has_valid_api_key = api_key != "dummy-api-key-for-testing"
-        
-        # Create PubMed tool
-        self.pubmed_tool = PubMedTool()
-        self.clinical_trials_tool = ClinicalTrialsTool()
-        
-        # Initialize conversation history
-        self.conversation_history = []
-        
-        # System prompt for the assessment
-        self.system_prompt = """You are an AI medical pre-assessment assistant speaking DIRECTLY TO THE PATIENT. 
+    The tools report failures and empty searches as a single ``error`` or
+    ``info`` placeholder instead of results, so only the first item needs checking.
+    """
+    return bool(items) and "error" not in items[0] and "info" not in items[0]
+
+# System prompt for the assessment. Shared by every agent and sent byte-identical as the
+# first message of each call, so OpenAI's prompt caching can reuse it
+SYSTEM_PROMPT = """You are an AI medical pre-assessment assistant speaking DIRECTLY TO THE PATIENT. 
         Your task is to evaluate the patient's reported symptoms and provide an initial assessment of urgency.
 
         IMPORTANT GUIDELINES:
@@ -58,12 +112,46 @@ class SymptomAssessmentAgent:
         6. Always include a clear disclaimer about the limitations of AI assessment
         7. Make your response conversational and human-like
         8. ALWAYS include both do's and don'ts in your response
+        9. Also classify the message: decide whether it actually describes medical symptoms or conditions
+           that need a health assessment (greetings, small talk and non-medical questions do not), and whether
+           any medical documents provided are relevant to these symptoms (if not, ignore them)
+        10. For medical queries, give concise PubMed search terms for the symptoms (leave empty otherwise)
 
         Urgency Levels:
         - high: Conditions requiring immediate medical attention (e.g., chest pain with shortness of breath)
         - medium: Conditions requiring care soon (e.g., high fever with stiff neck)
         - low: Conditions that can be managed with routine care or self-care (e.g., common cold)
         
+        Triage reference (examples, not an exhaustive list):
+        - high, advise emergency care right away:
+          * Chest pain or pressure, especially with shortness of breath, sweating, nausea, or pain spreading to the arm, jaw or back
+          * Sudden weakness or numbness of the face, arm or leg, trouble speaking, facial droop, or sudden loss of vision
+          * Sudden, severe "worst ever" headache, or headache with fever, stiff neck, confusion or a recent head injury
+          * Difficulty breathing, blue lips, inability to speak in full sentences, or choking
+          * Signs of severe allergic reaction: swelling of the lips, tongue or throat, hives with breathing difficulty
+          * Heavy bleeding that does not stop with pressure, vomiting blood, or black, tarry stools
+          * Fainting, seizures, new confusion, or being very hard to wake
+          * Severe abdominal pain with a rigid belly, high fever, or pain in pregnancy
+          * Thoughts of self-harm or suicide
+          * High fever in an infant under 3 months, or a child who is limp, unresponsive or not drinking
+        - medium, advise seeing a healthcare provider within 24-48 hours:
+          * Fever above 39°C (102°F) lasting more than 2 days, or any fever with a new rash
+          * Persistent vomiting or diarrhea with signs of dehydration (little urine, dizziness on standing)
+          * Painful or burning urination, especially with fever or back pain
+          * Ear pain, sinus pain or sore throat lasting more than a few days, or with high fever
+          * A wound that is red, warm, swollen or draining pus
+          * New or worsening symptoms of a known chronic condition (e.g., asthma, diabetes, heart failure)
+          * Moderate pain that limits daily activity or is not relieved by over-the-counter medication
+        - low, self-care with monitoring is appropriate:
+          * Common cold symptoms, mild sore throat, or mild cough without breathing difficulty
+          * Mild headache that responds to rest, fluids or over-the-counter pain relief
+          * Minor cuts, bruises or sprains with normal movement and no numbness
+          * Mild indigestion, occasional heartburn, or short-lived mild diarrhea
+          * Mild seasonal allergy symptoms
+        Always raise the urgency when symptoms are severe, sudden, rapidly worsening, or occur in infants,
+        older adults, pregnant patients, or people with serious chronic conditions or weakened immune systems.
+        If the patient describes any high-urgency warning sign, choose high even if other symptoms seem mild.
+        
         In your JSON response, use natural language in all fields as if speaking directly to the patient.
         For example, in the reasoning field, say "Based on your symptoms of X and Y, I'm concerned about..." rather than
         "The patient presents with symptoms that indicate..."
@@ -76,242 +164,950 @@ class SymptomAssessmentAgent:
             "recommendations": ["recommendation1 addressed to patient", "recommendation2 addressed to patient", ...],
             "dos": ["specific action to take 1", "specific action to take 2", ...],
             "donts": ["specific action to avoid 1", "specific action to avoid 2", ...],
-            "disclaimer": "I'm an AI assistant and this is not a medical diagnosis. Please consult with a healthcare professional for proper medical advice."
+            "disclaimer": "I'm an AI assistant and this is not a medical diagnosis. Please consult with a healthcare professional for proper medical advice.",
+            "is_medical_query": [true/false],
+            "classification_reason": "[short reason for the medical/non-medical classification]",
+            "documents_relevant": [true/false],
+            "pubmed_search_terms": "[concise medical search terms, or empty for non-medical messages]"
         }
         
         The 'dos' and 'donts' lists are VERY IMPORTANT and will be displayed prominently in the UI with color-coding.
         Make these actionable, specific instructions directly relevant to the patient's symptoms."""
+
+# Define structure without using Pydantic models to avoid compatibility issues
+
+class SymptomAssessmentAgent:
+    """Agent for assessing symptoms and providing urgency recommendations."""
+    
+    def __init__(self, model: str = "gpt-4o", max_concurrent_requests: int = 20):
+        """Initialize the symptom assessment agent.
+        
+        Args:
+            model: OpenAI chat model used for the assessment call
+            max_concurrent_requests: Maximum in-flight OpenAI calls across all requests
+        """
+        self.model = model
+        # Tokenizer for budgeting prompt size, loaded on first use by the encoding property
+        self._encoding = None
+        self._encoding_retry_at = 0.0
+        self._encoding_lock = threading.Lock()
+        # Initialize OpenAI client
+        # Use a dummy API key if environment variable is not set
+        api_key = os.environ.get("OPENAI_API_KEY", "dummy-api-key-for-testing")
+        # Share one pooled HTTP/2 client across requests to avoid per-request TCP+TLS setup
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+            http2=True,
+            timeout=30.0
+        )
+        # Retries are handled by _create_chat_completion so they pass through the throttle
+        self.client = AsyncOpenAI(api_key=api_key, http_client=self.http_client, max_retries=0)
+        # Shared across all requests so concurrent assessments can't exceed the account's rate limits
+        self.throttle = OpenAIThrottle(max_concurrent=max_concurrent_requests)
+        # Flag to track if we have a real API key
+        self.has_valid_api_key = api_key != "dummy-api-key-for-testing"
+        
+        # Create PubMed and ClinicalTrials.gov tools on one pooled client, so their
+        # keep-alive connections are reused across searches and requests
+        self.tools_http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=40, max_keepalive_connections=20),
+            http2=True,
+            timeout=LITERATURE_API_TIMEOUT
+        )
+        self.pubmed_tool = PubMedTool(client=self.tools_http_client)
+        self.clinical_trials_tool = ClinicalTrialsTool(client=self.tools_http_client)
+        self._pubmed_cache = TTLCache(maxsize=PUBMED_CACHE_SIZE, ttl=PUBMED_CACHE_TTL)
+        self._trials_cache = TTLCache(maxsize=TRIALS_CACHE_SIZE, ttl=TRIALS_CACHE_TTL)
+        # Lookups in progress by cache key, so concurrent identical queries share one request
+        self._inflight = {}
+        # Bounded history per patient; anonymous requests get none so users' data never mixes
+        self._histories = TTLCache(maxsize=HISTORY_MAX_PATIENTS, ttl=HISTORY_TTL)
+        self._history_token_counts = LRUCache(maxsize=HISTORY_MAX_PATIENTS * HISTORY_MAX_MESSAGES)
+        
+        # Dedicated event loop for the async OpenAI client and tool calls, so the
+        # client's connection pool is reused across requests instead of being
+        # bound to a throwaway per-request loop
+        self._loop = asyncio.new_event_loop()
+        self._loop_thread = threading.Thread(target=self._loop.run_forever, name="symptom-agent-loop", daemon=True)
+        self._loop_thread.start()
+        atexit.register(self.close)
+        
+        # System prompt for the assessment
+        self.system_prompt = SYSTEM_PROMPT
+        
+        # The system message is identical on every call: build it once, and count its
+        # tokens once the tokenizer is available
+        self._system_message = {"role": "system", "content": self.system_prompt}
+        self._system_prompt_tokens = None
+    
+    def close(self):
+        """Close the HTTP clients and stop the agent's event loop."""
+        if not self._loop.is_running():
+            return
+        future = asyncio.run_coroutine_threadsafe(self._aclose(), self._loop)
+        try:
+            future.result(timeout=5)
+        except Exception as e:
+            logger.warning(f"Error closing HTTP clients: {str(e)}")
+        self._loop.call_soon_threadsafe(self._loop.stop)
+    
+    async def _aclose(self):
+        """Close the OpenAI and tools HTTP clients."""
+        await asyncio.gather(self.http_client.aclose(), self.tools_http_client.aclose())
     
     def assess_symptoms(self, symptoms: str, age: int = None, sex: str = None, 
-                  medical_history: str = None, patient_id: str = None) -> Dict[str, Any]:
+                  medical_history: str = None, patient_id: str = None,
+                  conversation_history: Optional[List[Dict[str, str]]] = None) -> Dict[str, Any]:
         """Assess patient symptoms and determine urgency level.
         
+        Synchronous entry point for Flask routes; runs :meth:`aassess_symptoms`
+        on the agent's event loop and blocks until it completes.
+        
         Args:
             symptoms: Description of the symptoms
             age: Patient age (optional)
             sex: Patient sex (optional)
             medical_history: Medical history (optional)
+            patient_id: Patient identifier used to look up documents (optional)
+            conversation_history: Caller-owned list of prior messages (optional)
             
         Returns:
             Assessment results including urgency level and recommendations
         """
-        try:
-            # Prepare the input with all available information
-            patient_info = []
-            if age is not None:
-                patient_info.append(f"Age: {age}")
-            if sex is not None:
-                patient_info.append(f"Sex: {sex}")
-            if medical_history is not None:
-                patient_info.append(f"Medical History: {medical_history}")
-            
-            # Retrieve patient documents if patient_id is provided
-            document_texts = []
-            used_document_ids = []
-            if patient_id:
-                try:
-                    # Get all documents for this patient
-                    patient_documents = MedicalDocument.query.filter_by(patient_id=patient_id).all()
-                    
-                    if patient_documents:
-                        for doc in patient_documents:
-                            if doc.content_text:  # Only include if we have extracted text
-                                # Add a summary of the document with its content
-                                doc_summary = f"Document: {doc.filename} ({doc.file_type})\n"
-                                doc_summary += f"Content:\n{doc.content_text[:2000]}" # Limit to first 2000 chars
-                                if len(doc.content_text) > 2000:
-                                    doc_summary += "...(truncated)"
-                                
-                                document_texts.append(doc_summary)
-                                used_document_ids.append(doc.id)
-                except Exception as e:
-                    logger.error(f"Error retrieving patient documents: {str(e)}")
-            
-            patient_context = "; ".join(patient_info) if patient_info else "No additional patient information provided"
-            
-            # Step 1: First determine if this is a medical query and needs PubMed
-            # Define classifier tool
-            classify_tools = [
-                {
-                    "type": "function",
-                    "function": {
-                        "name": "classify_medical_query",
-                        "description": "Classify if a user query is medical in nature and requires a health assessment",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {
-                                "is_medical": {
-                                    "type": "boolean",
-                                    "description": "Whether the query is medical in nature"
-                                },
-                                "reason": {
-                                    "type": "string",
-                                    "description": "Reasoning for the classification"
-                                },
-                                "relevant_medical_documents": {
-                                    "type": "boolean",
-                                    "description": "Whether uploaded medical documents seem relevant to this query"
-                                }
-                            },
-                            "required": ["is_medical", "reason"]
-                        }
-                    }
+        app = current_app._get_current_object()
+        future = asyncio.run_coroutine_threadsafe(
+            self.aassess_symptoms(symptoms, age, sex, medical_history, patient_id,
+                                  conversation_history=conversation_history, app=app),
+            self._loop
+        )
+        return future.result()
+    
+    def assess_symptoms_batch(self, cases: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Assess several patients' symptoms concurrently.
+        
+        Args:
+            cases: Dicts with ``symptoms`` and optional ``age``, ``sex``,
+                ``medical_history`` and ``patient_id`` keys
+            
+        Returns:
+            One assessment per case, in the same order
+        """
+        app = current_app._get_current_object()
+        future = asyncio.run_coroutine_threadsafe(self.aassess_symptoms_batch(cases, app=app), self._loop)
+        return future.result()
+    
+    async def aassess_symptoms_batch(self, cases: List[Dict[str, Any]], app=None) -> List[Dict[str, Any]]:
+        """Async version of :meth:`assess_symptoms_batch`; the shared throttle bounds concurrency."""
+        return await asyncio.gather(*(
+            self.aassess_symptoms(case.get("symptoms"), case.get("age"), case.get("sex"),
+                                  case.get("medical_history"), case.get("patient_id"), app=app)
+            for case in cases
+        ))
+    
+    def assess_symptoms_offline(self, cases: List[Dict[str, Any]],
+                                poll_interval: float = BATCH_POLL_INTERVAL) -> List[Dict[str, Any]]:
+        """Assess a cohort through the OpenAI Batch API.
+        
+        For bulk jobs such as nightly re-scoring, backfills and evaluation runs:
+        batch requests cost half as much and have their own rate limits, but
+        complete within a 24 hour window, so this blocks until the batch
+        finishes and must not be called from a request handler.
+        
+        Args:
+            cases: Dicts with ``symptoms`` and optional ``age``, ``sex``,
+                ``medical_history`` and ``patient_id`` keys
+            poll_interval: Seconds between batch status checks
+            
+        Returns:
+            One assessment per case, in the same order
+        """
+        app = current_app._get_current_object()
+        future = asyncio.run_coroutine_threadsafe(
+            self.aassess_symptoms_offline(cases, app=app, poll_interval=poll_interval), self._loop
+        )
+        return future.result()
+    
+    async def aassess_symptoms_offline(self, cases: List[Dict[str, Any]], app=None,
+                                       poll_interval: float = BATCH_POLL_INTERVAL) -> List[Dict[str, Any]]:
+        """Async version of :meth:`assess_symptoms_offline`."""
+        if not self.has_valid_api_key:
+            logger.error("No valid OpenAI API key found. Please set the OPENAI_API_KEY environment variable.")
+            return [self._offline_error("OpenAI API key is not configured. Please set up your API key.")
+                    for _ in cases]
+        
+        # Step 1: Build each case's prompt from the same context as a live assessment.
+        # Offline cases are independent re-assessments, so no conversation history is used.
+        # The cases' PubMed searches are sent together first, so each case then reads its articles from the cache.
+        await self._prefetch_pubmed([self._pubmed_query(case["symptoms"]) for case in cases if case.get("symptoms")],
+                                    max_results=2)
+        prepared = await asyncio.gather(*(self._prepare_offline_case(case, app) for case in cases))
+        
+        lines = []
+        for i, (case, (messages, _, _)) in enumerate(zip(cases, prepared)):
+            if messages is None:
+                continue
+            lines.append(orjson.dumps({
+                "custom_id": str(i),
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": self.model,
+                    "temperature": 0,
+                    "response_format": {"type": "json_object"},
+                    "messages": messages,
+                    "user": self._cache_user_id(case.get("patient_id"))
                 }
-            ]
-            
-            # Send the classification request
-            logger.info(f"Classifying if this is a medical query: {symptoms}")
-            classification_response = self.client.chat.completions.create(
-                model="gpt-4o",
-                temperature=0.2,
-                messages=[
-                    {"role": "system", "content": "You are a medical assistant that determines if a message contains medical symptoms or conditions. Analyze if this query requires medical assessment and if it needs PubMed research."},
-                    {"role": "user", "content": f"Message: {symptoms}\n\nPatient context: {patient_context}"}
-                ],
-                tools=classify_tools,
-                tool_choice={"type": "function", "function": {"name": "classify_medical_query"}}
+            }))
+        
+        # Step 2: Upload the requests and wait for the batch to finish
+        outputs = {}
+        if lines:
+            try:
+                outputs = await self._run_batch(b"\n".join(lines), poll_interval)
+            except Exception as e:
+                logger.error(f"Error running OpenAI batch: {str(e)}")
+                return [self._offline_error(f"Failed to communicate with AI service: {str(e)}")
+                        for _ in cases]
+        
+        # Step 3: Align the results with the cases by custom_id
+        results = []
+        for i, (messages, context, error) in enumerate(prepared):
+            if messages is None:
+                results.append(self._offline_error(error))
+                continue
+            response_content = outputs.get(str(i))
+            if response_content is None:
+                results.append(self._offline_error("The batch returned no result for this case."))
+                continue
+            try:
+                results.append(await self._offline_assessment(orjson.loads(response_content), context))
+            except Exception as e:
+                logger.error(f"Error in offline symptom assessment: {str(e)}")
+                results.append(self._offline_error(f"Failed to complete symptom assessment: {str(e)}"))
+        return results
+    
+    async def _prepare_offline_case(self, case: Dict[str, Any], app) -> Tuple[Optional[List[Dict[str, str]]], Dict[str, Any], Optional[str]]:
+        """Gather one case's documents and literature and build its messages.
+        
+        Returns:
+            Tuple of (messages, context for :meth:`_offline_assessment`, error);
+            messages is None when the case can't be submitted
+        """
+        symptoms = case.get("symptoms")
+        if not symptoms:
+            return None, {}, "Symptoms are required"
+        try:
+            patient_context = self._patient_context(case.get("age"), case.get("sex"), case.get("medical_history"))
+            pubmed_query = self._pubmed_query(symptoms)
+            (document_texts, used_document_ids), (pubmed_info, pubmed_references) = await asyncio.gather(
+                self._fetch_patient_documents(app, case.get("patient_id"), symptoms),
+                self._search_literature(pubmed_query)
             )
+            messages = self._assessment_messages(symptoms, patient_context, document_texts, pubmed_info, [])
+        except Exception as e:
+            logger.error(f"Error preparing offline assessment: {str(e)}")
+            return None, {}, f"Failed to complete symptom assessment: {str(e)}"
+        
+        prompt_tokens = self._prompt_tokens(messages)
+        if prompt_tokens > MODEL_CONTEXT_TOKENS - RESPONSE_TOKEN_RESERVE:
+            logger.error(f"Assessment prompt too long: {prompt_tokens} tokens")
+            return None, {}, "The symptom description and history are too long to assess. Please shorten them and try again."
+        
+        return messages, {
+            "pubmed_query": pubmed_query,
+            "pubmed_references": pubmed_references,
+            "used_document_ids": used_document_ids
+        }, None
+    
+    async def _run_batch(self, jsonl: bytes, poll_interval: float) -> Dict[str, str]:
+        """Run a Batch API job and return the message content of each successful request.
+        
+        Args:
+            jsonl: Batch input file, one chat completion request per line
+            poll_interval: Seconds between batch status checks
             
-            # Extract classification results
-            tool_call = classification_response.choices[0].message.tool_calls[0]
-            classify_result = json.loads(tool_call.function.arguments)
-            is_medical_query = classify_result.get('is_medical', False)
-            medical_classification_reason = classify_result.get('reason', "")
-            documents_relevant = classify_result.get('relevant_medical_documents', False)
-            
-            # Default to searching PubMed if it's a medical query
-            search_pubmed = is_medical_query
-            # Extract just the medical symptoms for PubMed search
-            # Remove any "Patient X reports:" pattern from the query
-            if search_pubmed:
-                patient_mention_regex = r"Patient [\w\s]+ reports:\s*(.*)"
-                patient_mention = re.search(patient_mention_regex, symptoms)
+        Returns:
+            Mapping of custom_id to the model's message content
+        """
+        batch_file = await self.client.files.create(file=("assessments.jsonl", jsonl), purpose="batch")
+        batch = await self.client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
+        )
+        logger.info(f"Submitted OpenAI batch {batch.id}")
+        
+        while batch.status not in BATCH_FINAL_STATUSES:
+            await asyncio.sleep(poll_interval)
+            batch = await self.client.batches.retrieve(batch.id)
+        
+        logger.info(f"OpenAI batch {batch.id} finished with status {batch.status}: {batch.request_counts}")
+        # Expired and cancelled batches still return the requests that completed
+        if not batch.output_file_id:
+            raise RuntimeError(f"OpenAI batch {batch.id} {batch.status} without output")
+        
+        output = await self.client.files.content(batch.output_file_id)
+        outputs = {}
+        for line in output.content.splitlines():
+            if not line.strip():
+                continue
+            record = orjson.loads(line)
+            response = record.get("response") or {}
+            if response.get("status_code") != 200:
+                logger.warning(f"Batch request {record.get('custom_id')} failed: {record.get('error') or response.get('status_code')}")
+                continue
+            outputs[record["custom_id"]] = response["body"]["choices"][0]["message"]["content"]
+        return outputs
+    
+    async def _offline_assessment(self, llm_response: Dict[str, Any], context: Dict[str, Any]) -> Dict[str, Any]:
+        """Turn a batch model response into an assessment like :meth:`aassess_symptoms` returns."""
+        assessment = self._normalize_llm_response(llm_response)
+        assessment.pop("pubmed_search_terms", None)
+        is_medical_query = bool(assessment.get("is_medical_query", True))
+        documents_relevant = bool(assessment.get("documents_relevant", False))
+        
+        # Trials are only shown alongside supporting PubMed references
+        pubmed_references = context["pubmed_references"] if is_medical_query else []
+        clinical_trials = await self._search_clinical_trials(context["pubmed_query"]) if pubmed_references else []
+        
+        assessment.setdefault("dos", [])
+        assessment.setdefault("donts", [])
+        assessment.update(
+            is_medical_query=is_medical_query,
+            classification_reason=assessment.get("classification_reason", ""),
+            used_document_ids=context["used_document_ids"] if documents_relevant else [],
+            pubmed_references=pubmed_references,
+            clinical_trials=clinical_trials
+        )
+        return assessment
+    
+    @staticmethod
+    def _offline_error(message: str) -> Dict[str, Any]:
+        """Fallback result for a case the offline batch could not assess."""
+        return {
+            "error": message,
+            "urgency_level": "medium",
+            "urgency_description": "We could not assess these symptoms, so we recommend consulting with a healthcare professional",
+            "reasoning": "Assessment error occurred. Please consult with a healthcare professional.",
+            "recommendations": ["Consult with a healthcare professional as soon as possible"],
+            "dos": ["Contact your healthcare provider", "Seek medical help if symptoms worsen"],
+            "donts": ["Don't ignore your symptoms", "Don't wait if you feel your condition is deteriorating"],
+            "disclaimer": DISCLAIMER,
+            "pubmed_references": []
+        }
+    
+    def stream_assessment(self, symptoms: str, age: int = None, sex: str = None,
+                          medical_history: str = None, patient_id: str = None,
+                          conversation_history: Optional[List[Dict[str, str]]] = None) -> Iterator[Tuple[str, Any]]:
+        """Assess patient symptoms, yielding the model output as it is generated.
+        
+        Args:
+            symptoms: Description of the symptoms
+            age: Patient age (optional)
+            sex: Patient sex (optional)
+            medical_history: Medical history (optional)
+            patient_id: Patient identifier used to look up documents (optional)
+            conversation_history: Caller-owned list of prior messages (optional)
+            
+        Yields:
+            ("delta", text) for each chunk of model output, then
+            ("assessment", dict) with the same result :meth:`assess_symptoms` returns
+        """
+        app = current_app._get_current_object()
+        deltas = queue.Queue()
+        done = object()
+        future = asyncio.run_coroutine_threadsafe(
+            self.aassess_symptoms(symptoms, age, sex, medical_history, patient_id,
+                                  conversation_history=conversation_history, app=app,
+                                  on_delta=deltas.put),
+            self._loop
+        )
+        future.add_done_callback(lambda _: deltas.put(done))
+        
+        while True:
+            delta = deltas.get()
+            if delta is done:
+                break
+            yield "delta", delta
+        
+        yield "assessment", future.result()
+    
+    @retry(retry=retry_if_exception_type(TRANSIENT_OPENAI_ERRORS), wait=wait_random_exponential(min=1, max=60),
+           stop=stop_after_attempt(5), reraise=True)
+    async def _create_chat_completion(self, on_delta: Optional[Callable[[str], None]] = None, **kwargs) -> str:
+        """Create a chat completion through the shared throttle.
+        
+        Rate limits, connection errors, timeouts and 5xx responses are retried with
+        jittered exponential backoff. A stream that fails after content has been
+        relayed is not retried, since the caller has already seen part of it.
+        
+        Args:
+            on_delta: Called with each content delta as it arrives; when given the
+                completion is streamed instead of returned in one response (optional)
+            **kwargs: Arguments for ``chat.completions.create``
+            
+        Returns:
+            The full message content
+        """
+        async with self.throttle:
+            if on_delta is None:
+                raw_response = await self.client.chat.completions.with_raw_response.create(**kwargs)
+                self.throttle.update_from_headers(raw_response.headers)
+                return raw_response.parse().choices[0].message.content
+            
+            raw_response = await self.client.chat.completions.with_raw_response.create(stream=True, **kwargs)
+            self.throttle.update_from_headers(raw_response.headers)
+            content_parts = []
+            try:
+                async for chunk in raw_response.parse():
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if delta:
+                        content_parts.append(delta)
+                        on_delta(delta)
+            except TRANSIENT_OPENAI_ERRORS + (httpx.HTTPError,) as e:
+                if content_parts:
+                    raise RuntimeError(f"OpenAI stream interrupted: {str(e)}") from e
+                raise
+            return "".join(content_parts)
+    
+    @staticmethod
+    def _cache_user_id(patient_id: Optional[str]) -> str:
+        """Return a stable, non-identifying OpenAI ``user`` value for a patient."""
+        if not patient_id:
+            return "anonymous"
+        return hashlib.sha256(str(patient_id).encode("utf-8")).hexdigest()[:32]
+    
+    @property
+    def encoding(self) -> Optional[tiktoken.Encoding]:
+        """The model's tokenizer, or None while it can't be loaded.
+        
+        tiktoken downloads the encoding the first time it is used, so a failed
+        download must not break assessments; token counts are estimated until
+        a retry, at most every TOKENIZER_RETRY_SECONDS, succeeds.
+        """
+        if self._encoding is None and time.monotonic() >= self._encoding_retry_at:
+            with self._encoding_lock:
+                if self._encoding is None and time.monotonic() >= self._encoding_retry_at:
+                    try:
+                        try:
+                            self._encoding = tiktoken.encoding_for_model(self.model)
+                        except KeyError:
+                            # Unknown model: use the gpt-4o family's encoding
+                            self._encoding = tiktoken.get_encoding("o200k_base")
+                    except Exception as e:
+                        self._encoding_retry_at = time.monotonic() + TOKENIZER_RETRY_SECONDS
+                        logger.warning(f"Could not load tokenizer, estimating tokens from length: {str(e)}")
+        return self._encoding
+    
+    def _count_tokens(self, text: str) -> int:
+        """Number of tokens ``text`` takes up for the assessment model."""
+        encoding = self.encoding
+        if encoding is None:
+            return -(-len(text) // CHARS_PER_TOKEN)
+        return len(encoding.encode(text))
+    
+    def _truncate_tokens(self, text: str, max_tokens: int) -> Tuple[str, int, bool]:
+        """Cut ``text`` to at most ``max_tokens`` tokens.
+        
+        Returns:
+            Tuple of (text, tokens kept, whether it was cut)
+        """
+        encoding = self.encoding
+        if encoding is None:
+            kept = text[:max(max_tokens, 0) * CHARS_PER_TOKEN]
+            return kept, self._count_tokens(kept), len(kept) < len(text)
+        tokens = encoding.encode(text)
+        take = max(min(len(tokens), max_tokens), 0)
+        return encoding.decode(tokens[:take]), take, take < len(tokens)
+    
+    def _system_tokens(self) -> int:
+        """Token count of the system prompt, counted once the tokenizer is loaded."""
+        if self._system_prompt_tokens is not None:
+            return self._system_prompt_tokens
+        tokens = self._count_tokens(self.system_prompt)
+        if self._encoding is not None:
+            self._system_prompt_tokens = tokens
+            if tokens < PROMPT_CACHE_MIN_TOKENS:
+                logger.warning(f"System prompt is {tokens} tokens; OpenAI only caches prefixes of {PROMPT_CACHE_MIN_TOKENS}+ tokens")
+        return tokens
+    
+    @staticmethod
+    def _relevance_score(text: str, symptom_terms: set) -> int:
+        """Cheap relevance of a document to the symptoms: the number of shared terms."""
+        return len(symptom_terms.intersection(_WORD_RE.findall(text.lower())))
+    
+    def _load_patient_documents(self, app, patient_id: str, symptoms: str = "") -> Tuple[List[str], List[int]]:
+        """Load the extracted text of a patient's documents for the assessment prompt.
+        
+        Documents are ranked by how many terms they share with the symptoms
+        (most recent first on ties). They are then truncated by tokens and
+        added greedily until DOCUMENT_TOKEN_BUDGET is spent.
+        
+        Runs in a worker thread, so it pushes its own application context.
+        
+        Args:
+            app: The Flask application owning the database session
+            patient_id: ID of the patient
+            symptoms: Symptom description used to rank the documents
+            
+        Returns:
+            Tuple of (document_texts, used_document_ids)
+        """
+        document_texts = []
+        used_document_ids = []
+        try:
+            with app.app_context():
+                # Fetch only the columns we need and let the database truncate the text,
+                # reading one extra character so we can tell whether it was cut off
+                rows = db.session.execute(
+                    select(
+                        MedicalDocument.id,
+                        MedicalDocument.filename,
+                        MedicalDocument.file_type,
+                        func.substr(MedicalDocument.content_text, 1, DOCUMENT_FETCH_CHARS + 1).label('snippet')
+                    )
+                    .where(MedicalDocument.patient_id == patient_id, MedicalDocument.content_text.isnot(None))
+                    .order_by(MedicalDocument.uploaded_at.desc())
+                    .limit(MAX_PATIENT_DOCUMENTS)
+                ).all()
+            
+            # Most relevant documents get first claim on the token budget
+            symptom_terms = set(_WORD_RE.findall((symptoms or "").lower())) - _RANKING_STOPWORDS
+            rows = sorted((row for row in rows if row.snippet),  # Only include if we have extracted text
+                          key=lambda row: self._relevance_score(row.snippet, symptom_terms), reverse=True)
+            
+            remaining_tokens = DOCUMENT_TOKEN_BUDGET
+            for row in rows:
+                if remaining_tokens <= 0:
+                    break
+                content, take, cut = self._truncate_tokens(row.snippet, min(DOCUMENT_SNIPPET_TOKENS, remaining_tokens))
+                if take <= 0:
+                    break
+                remaining_tokens -= take
+                
+                # Add a summary of the document with its content
+                doc_summary = f"Document: {row.filename} ({row.file_type})\n"
+                doc_summary += f"Content:\n{content}"
+                if cut or len(row.snippet) > DOCUMENT_FETCH_CHARS:
+                    doc_summary += "...(truncated)"
                 
-                if patient_mention:
-                    # Extract just the symptom part
-                    pubmed_query = patient_mention.group(1).strip()
-                    logger.info(f"Extracted symptoms for PubMed search: '{pubmed_query}'")
+                document_texts.append(doc_summary)
+                used_document_ids.append(row.id)
+        except Exception as e:
+            logger.error(f"Error retrieving patient documents: {str(e)}")
+        
+        return document_texts, used_document_ids
+    
+    def _history_for(self, patient_id: Optional[str]) -> Optional[deque]:
+        """Return the bounded message history for a patient, or None for anonymous requests.
+        
+        Only accessed from the agent's event loop, so the store needs no lock.
+        """
+        if not patient_id:
+            return None
+        history = self._histories.get(patient_id)
+        if history is None:
+            history = self._histories[patient_id] = deque(maxlen=HISTORY_MAX_MESSAGES)
+        return history
+    
+    def _history_messages(self, history) -> List[Dict[str, str]]:
+        """Select the conversation history to include in the prompt.
+        
+        The most recent messages are kept verbatim for as long as they fit in
+        HISTORY_TOKEN_BUDGET; the newest one is always kept. Anything older is
+        folded into one summary message.
+        
+        Args:
+            history: Prior messages, oldest first
+            
+        Returns:
+            Messages to place between the system message and the current prompt
+        """
+        messages = list(history)
+        recent = []
+        total_tokens = 0
+        for msg in reversed(messages):
+            tokens = self._history_tokens(msg["content"])
+            if recent and total_tokens + tokens > HISTORY_TOKEN_BUDGET:
+                break
+            recent.append(msg)
+            total_tokens += tokens
+        recent.reverse()
+        
+        older = messages[:len(messages) - len(recent)]
+        if not older:
+            return recent
+        return [{"role": "system", "content": f"Prior conversation summary: {self._summarize_history(older)}"}, *recent]
+    
+    def _history_tokens(self, content: str) -> int:
+        """Token count of a history message, cached since each one is re-sent on later turns."""
+        tokens = self._history_token_counts.get(content)
+        if tokens is None:
+            tokens = self._history_token_counts[content] = self._count_tokens(content)
+        return tokens
+    
+    @staticmethod
+    def _summarize_history(messages: List[Dict[str, str]]) -> str:
+        """Build an extractive summary of older messages without an extra LLM call.
+        
+        Patient messages are kept (shortened); assessments are reduced to their urgency.
+        """
+        parts = []
+        for msg in messages:
+            if msg["role"] == "user":
+                parts.append(f"patient reported: {msg['content'][:HISTORY_SUMMARY_CHARS]}")
+            elif msg["role"] == "assistant":
+                try:
+                    previous = orjson.loads(msg["content"])
+                    parts.append(f"assessed {previous.get('urgency_level', 'unknown')} urgency ({previous.get('urgency_description', '')})")
+                except (orjson.JSONDecodeError, AttributeError):
+                    parts.append(f"assistant replied: {msg['content'][:HISTORY_SUMMARY_CHARS]}")
+        return "; ".join(parts)
+    
+    async def _fetch_patient_documents(self, app, patient_id: Optional[str], symptoms: str = "") -> Tuple[List[str], List[int]]:
+        """Async wrapper around :meth:`_load_patient_documents`."""
+        if not patient_id or app is None:
+            return [], []
+        return await asyncio.to_thread(self._load_patient_documents, app, patient_id, symptoms)
+    
+    @staticmethod
+    def _normalize_query(query: str) -> str:
+        """Normalize a search query for use as a cache key."""
+        return _WHITESPACE_RE.sub(" ", query.lower().strip())
+    
+    async def _coalesce(self, key: Tuple, make_coro: Callable[[], Any]) -> Any:
+        """Await the lookup for ``key``, joining one already in progress instead of starting another.
+        
+        The shared task is shielded so a cancelled caller doesn't cancel it for the others.
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._inflight[key] = asyncio.ensure_future(make_coro())
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+    
+    async def _search_pubmed(self, pubmed_query: str, max_results: int) -> List[Dict[str, Any]]:
+        """Run a PubMed search, serving repeat queries from the in-process cache.
+        
+        Only accessed from the agent's event loop, so the cache needs no lock.
+        """
+        cache_key = (self._normalize_query(pubmed_query), max_results)
+        references = self._pubmed_cache.get(cache_key)
+        if references is not None:
+            logger.debug("PubMed cache hit for query: %s", pubmed_query)
+            return references
+        
+        references = await self._coalesce(("pubmed",) + cache_key,
+                                          lambda: self.pubmed_tool._arun(pubmed_query, max_results=max_results))
+        # Don't cache failures or empty results
+        if _has_results(references):
+            self._pubmed_cache[cache_key] = references
+        return references
+    
+    async def _prefetch_pubmed(self, pubmed_queries: List[str], max_results: int):
+        """Search PubMed for several queries in one batch and cache the results.
+        
+        Later :meth:`_search_pubmed` calls for these queries are then served from
+        the cache, and articles shared between queries are fetched only once.
+        """
+        queries = {}
+        for pubmed_query in pubmed_queries:
+            cache_key = (self._normalize_query(pubmed_query), max_results)
+            if pubmed_query and cache_key not in self._pubmed_cache:
+                queries.setdefault(cache_key, pubmed_query)
+        if not queries:
+            return
+        
+        try:
+            results = await self.pubmed_tool._arun_batch(list(queries.values()), max_results=max_results)
+        except Exception as e:
+            # The per-case searches will try again
+            logger.error(f"Error prefetching PubMed results: {str(e)}")
+            return
+        for cache_key, references in zip(queries, results):
+            if _has_results(references):
+                self._pubmed_cache[cache_key] = references
+    
+    async def _search_literature(self, pubmed_query: Optional[str]) -> Tuple[str, List[Dict[str, Any]]]:
+        """Search PubMed for the refined symptom query.
+        
+        Args:
+            pubmed_query: The refined search query
+            
+        Returns:
+            Tuple of (pubmed_info prompt section, pubmed_references)
+        """
+        pubmed_info = ""
+        pubmed_references = []
+        
+        if pubmed_query:
+            try:
+                # Run the PubMed search
+                # Only the 2 most relevant articles are used, so fetch no more than that
+                references = await self._search_pubmed(pubmed_query, max_results=2)
+        
+                # Detailed logging of raw references
+                logger.debug("Raw PubMed search results: %s", references)
+        
+                # Check if we have valid references (not just error or info messages)
+                if _has_results(references):
+                    pubmed_references = []
+                    pubmed_info_parts = ["\n\nRelevant medical literature:\n"]
+        
+                    # Process references
+                    for ref in references:
+                        ref_title = ref.get('title', 'No title')
+                        ref_pmid = ref.get('pmid', 'N/A')
+                        logger.debug("Processing PubMed reference: %s (PMID: %s)", ref_title, ref_pmid)
+        
+                        pubmed_info_parts.append(f"- {ref_title} (PMID: {ref_pmid})\n")
+        
+                        # Format abstract
+                        abstract = ref.get('abstract', 'No abstract available')
+                        if abstract and abstract != 'No abstract available':
+                            formatted_abstract = abstract[:200] + '...' if len(abstract) > 200 else abstract
+                        else:
+                            formatted_abstract = 'No abstract available'
+        
+                        # Create reference object
+                        ref_obj = {
+                            "pmid": ref_pmid,
+                            "title": ref_title,
+                            "abstract": formatted_abstract,
+                            "date": ref.get('date', 'N/A')
+                        }
+        
+                        pubmed_references.append(ref_obj)
+                        logger.debug("Added PubMed reference: %s", ref_obj)
+        
+                    pubmed_info = "".join(pubmed_info_parts)
+                    logger.debug("Total PubMed references processed: %d", len(pubmed_references))
+        
                 else:
-                    # If no matching pattern, use the entire symptoms string
-                    pubmed_query = symptoms
-                    
-                # Further refine the query to focus on medical terms
-                # Remove common non-medical words and focus on symptoms
-                pubmed_query = re.sub(r"\b(have|has|having|experiencing|suffering|from|with|and|the|is|are|my|I|feel|feeling|patient)\b", "", pubmed_query, flags=re.IGNORECASE)
-                pubmed_query = pubmed_query.strip()
-                logger.info(f"Refined PubMed search query: '{pubmed_query}'")
-            else:
-                pubmed_query = None
+                    logger.warning(f"No valid PubMed references found or references contain errors")
+                    # Don't append placeholder references when none are found
+                    pubmed_references = []
+            except Exception as pub_err:
+                logger.error(f"Error getting PubMed references: {str(pub_err)}", exc_info=True)
+        
+        return pubmed_info, pubmed_references
+    
+    async def _search_clinical_trials(self, pubmed_query: Optional[str]) -> List[Dict[str, Any]]:
+        """Search ClinicalTrials.gov for the refined symptom query.
+        
+        Args:
+            pubmed_query: The refined search query
+            
+        Returns:
+            List of clinical trials (empty on errors or no results)
+        """
+        if not pubmed_query:
+            return []
+        
+        cache_key = (self._normalize_query(pubmed_query), 2)
+        trials = self._trials_cache.get(cache_key)
+        if trials is not None:
+            logger.debug("Clinical trials cache hit for query: %s", pubmed_query)
+            return trials
+        
+        logger.debug("Searching for clinical trials with query: %s", pubmed_query)
+        try:
+            # The query is already refined the same way the tool would refine it
+            trials = await self._coalesce(("trials",) + cache_key,
+                                          lambda: self.clinical_trials_tool.aget_trials_for_query(pubmed_query, max_results=2, refine=False))
             
-            logger.info(f"Medical classification: is_medical={is_medical_query}, search_pubmed={search_pubmed}, reason={medical_classification_reason}")
+            # Detailed logging of raw clinical trials
+            logger.debug("Raw Clinical Trials search results: %s", trials)
             
-            # Step 2: Get PubMed references if needed
-            pubmed_info = ""
-            pubmed_references = []
-            clinical_trials = []
+            if _has_results(trials):
+                # Log each trial for debugging
+                if logger.isEnabledFor(logging.DEBUG):
+                    for trial in trials:
+                        logger.debug("Clinical trial: NCT ID=%s, title=%s, url=%s", trial.get('nct_id'), trial.get('title'), trial.get('url'))
+                logger.debug("Found %d clinical trials for query: %s", len(trials), pubmed_query)
+                # Don't cache failures or empty results
+                self._trials_cache[cache_key] = trials
+                return trials
             
-            if search_pubmed and pubmed_query:
-                logger.info(f"Searching PubMed with query: {pubmed_query}")
-                try:
-                    # Run the PubMed search
-                    references = self.pubmed_tool._run(pubmed_query, max_results=3)
-                    
-                    # Detailed logging of raw references
-                    logger.info(f"Raw PubMed search results: {json.dumps(references)}")
-                    
-                    # Check if we have valid references (not just error or info messages)
-                    if references and not any(key in ref for ref in references for key in ['error', 'info']):
-                        pubmed_references = []
-                        pubmed_info = "\n\nRelevant medical literature:\n"
-                        
-                        # Process references
-                        for ref in references[:2]:  # Limit to 2 most relevant
-                            ref_title = ref.get('title', 'No title')
-                            ref_pmid = ref.get('pmid', 'N/A')
-                            logger.info(f"Processing PubMed reference: {ref_title} (PMID: {ref_pmid})")
-                            
-                            pubmed_info += f"- {ref_title} (PMID: {ref_pmid})\n"
-                            
-                            # Format abstract
-                            abstract = ref.get('abstract', 'No abstract available')
-                            if abstract and abstract != 'No abstract available':
-                                formatted_abstract = abstract[:200] + '...' if len(abstract) > 200 else abstract
-                            else:
-                                formatted_abstract = 'No abstract available'
-                            
-                            # Create reference object
-                            ref_obj = {
-                                "pmid": ref_pmid,
-                                "title": ref_title,
-                                "abstract": formatted_abstract,
-                                "date": ref.get('date', 'N/A')
-                            }
-                            
-                            pubmed_references.append(ref_obj)
-                            logger.info(f"Added PubMed reference: {json.dumps(ref_obj)}")
-                        
-                        logger.info(f"Total PubMed references processed: {len(pubmed_references)}")
-                        
-                        # Also search for clinical trials with the same query
-                        logger.info(f"Searching for clinical trials with query: {pubmed_query}")
-                        try:
-                            trials = self.clinical_trials_tool.get_trials_for_query(pubmed_query, max_results=2)
-                            
-                            # Detailed logging of raw clinical trials
-                            logger.info(f"Raw Clinical Trials search results: {json.dumps(trials)}")
-                            
-                            if trials and not any(key in trial for trial in trials for key in ['error', 'info']):
-                                clinical_trials = trials
-                                logger.info(f"Total clinical trials processed: {len(clinical_trials)}")
-                                
-                                # Log each trial for debugging
-                                for trial in clinical_trials:
-                                    logger.info(f"Clinical trial: NCT ID={trial.get('nct_id')}, title={trial.get('title')}, url={trial.get('url')}")
-                                logger.info(f"Found {len(clinical_trials)} clinical trials for query: {pubmed_query}")
-                            else:
-                                logger.info(f"No clinical trials found for query: {pubmed_query}")
-                        except Exception as ct_err:
-                            logger.error(f"Error getting clinical trials: {str(ct_err)}", exc_info=True)
-                            
-                    else:
-                        logger.warning(f"No valid PubMed references found or references contain errors")
-                        # Don't append placeholder references when none are found
-                        pubmed_references = []
-                except Exception as pub_err:
-                    logger.error(f"Error getting PubMed references: {str(pub_err)}", exc_info=True)
-                    
-            # Step 3: Perform the full assessment
-            # Format input for the main assessment
-            user_prompt = (f"Patient symptoms: {symptoms}\n\n"
-                         f"Patient information: {patient_context}\n\n")
+            logger.debug("No clinical trials found for query: %s", pubmed_query)
+        except Exception as ct_err:
+            logger.error(f"Error getting clinical trials: {str(ct_err)}", exc_info=True)
+        
+        return []
+    
+    @staticmethod
+    def _patient_context(age: int = None, sex: str = None, medical_history: str = None) -> str:
+        """Format the optional patient details for the assessment prompt."""
+        patient_info = []
+        if age is not None:
+            patient_info.append(f"Age: {age}")
+        if sex is not None:
+            patient_info.append(f"Sex: {sex}")
+        if medical_history is not None:
+            patient_info.append(f"Medical History: {medical_history}")
+        
+        return "; ".join(patient_info) if patient_info else "No additional patient information provided"
+    
+    @staticmethod
+    def _pubmed_query(symptoms: str) -> str:
+        """Reduce the symptom text to the medical terms used for literature searches.
+        
+        The result is shared by the PubMed and ClinicalTrials.gov lookups, which
+        therefore also share its normalized form as their cache key.
+        """
+        # Remove any "Patient X reports:" pattern from the query
+        patient_mention = _PATIENT_MENTION_RE.search(symptoms)
+        
+        if patient_mention:
+            # Extract just the symptom part
+            pubmed_query = patient_mention.group(1).strip()
+            logger.debug("Extracted symptoms for PubMed search: '%s'", pubmed_query)
+        else:
+            # If no matching pattern, use the entire symptoms string
+            pubmed_query = symptoms
             
-            # Add document content if relevant
-            if document_texts and documents_relevant:
-                user_prompt += "\n\nPatient's Medical Documents:\n"
-                for i, doc_text in enumerate(document_texts, 1):
-                    user_prompt += f"\n--- Document {i} ---\n{doc_text}\n"
-                user_prompt += "\nPlease consider these medical documents in your assessment.\n"
+        # Further refine the query to focus on medical terms
+        # Remove common non-medical words and focus on symptoms
+        pubmed_query = _STOPWORDS_RE.sub("", pubmed_query)
+        pubmed_query = _PUNCTUATION_RE.sub("", pubmed_query)
+        pubmed_query = _WHITESPACE_RE.sub(" ", pubmed_query).strip()
+        logger.debug("Refined PubMed search query: '%s'", pubmed_query)
+        return pubmed_query
+    
+    def _assessment_messages(self, symptoms: str, patient_context: str, document_texts: List[str],
+                             pubmed_info: str, history_messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """Build the model messages for an assessment.
+        
+        Args:
+            symptoms: Description of the symptoms
+            patient_context: Output of :meth:`_patient_context`
+            document_texts: Patient document excerpts to include
+            pubmed_info: Literature section from :meth:`_search_literature`
+            history_messages: Prior conversation from :meth:`_history_messages`
             
-            user_prompt += "\nPlease assess the urgency of these symptoms and provide recommendations."
+        Returns:
+            The shared system message, the history, then the current prompt
+        """
+        user_prompt = (f"Patient symptoms: {symptoms}\n\n"
+                     f"Patient information: {patient_context}\n\n")
+        
+        # Add document content if available; the model decides whether it is relevant
+        if document_texts:
+            user_prompt += "\n\nPatient's Medical Documents:\n"
+            for i, doc_text in enumerate(document_texts, 1):
+                user_prompt += f"\n--- Document {i} ---\n{doc_text}\n"
+            user_prompt += ("\nPlease consider these medical documents in your assessment. "
+                            "If they are unrelated to the symptoms, set documents_relevant to false and ignore them.\n")
+        
+        user_prompt += "\nPlease assess the urgency of these symptoms and provide recommendations."
+        
+        # Add any PubMed info to our assessment prompt
+        if pubmed_info:
+            user_prompt += pubmed_info
+        
+        return [self._system_message, *history_messages, {"role": "user", "content": user_prompt}]
+    
+    def _prompt_tokens(self, messages: List[Dict[str, str]]) -> int:
+        """Token count of assessment messages built by :meth:`_assessment_messages`."""
+        return self._system_tokens() + sum(self._count_tokens(msg["content"]) for msg in messages[1:])
+    
+    @staticmethod
+    def _normalize_llm_response(llm_response: Dict[str, Any]) -> Dict[str, Any]:
+        """Add standard fields if they're missing; unknown urgency levels count as low."""
+        llm_response.setdefault("disclaimer", DISCLAIMER)
+        if llm_response.get("urgency_level") not in URGENCY_DESCRIPTIONS:
+            llm_response["urgency_level"] = "low"
+        if not llm_response.get("urgency_description"):
+            llm_response["urgency_description"] = URGENCY_DESCRIPTIONS[llm_response["urgency_level"]]
+        return llm_response
+    
+    async def aassess_symptoms(self, symptoms: str, age: int = None, sex: str = None, 
+                  medical_history: str = None, patient_id: str = None,
+                  conversation_history: Optional[List[Dict[str, str]]] = None, app=None,
+                  on_delta: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+        """Async implementation of :meth:`assess_symptoms`.
+        
+        A single model call both classifies the message and produces the
+        assessment. The patient document lookup and the literature search it
+        depends on run concurrently beforehand, off the event loop in worker threads.
+        
+        Args:
+            symptoms: Description of the symptoms
+            age: Patient age (optional)
+            sex: Patient sex (optional)
+            medical_history: Medical history (optional)
+            patient_id: Patient identifier used to look up documents (optional)
+            conversation_history: Caller-owned list of prior messages; the new
+                exchange is appended to it. Defaults to the patient's stored history (optional)
+            app: Flask application used for database access (required for documents)
+            on_delta: Called with each chunk of model output to stream the completion (optional)
+            
+        Returns:
+            Assessment results including urgency level and recommendations
+        """
+        # Messages with nothing to assess get a canned reply instead of a model call
+        if not symptoms or not symptoms.strip() or _TRIVIAL_MESSAGE_RE.match(symptoms):
+            logger.debug("Skipping assessment of trivial non-medical message")
+            return {
+                "urgency_level": "low",
+                "urgency_description": "Please share your symptoms so I can help.",
+                "reasoning": "Hello! I'm here to help you understand your symptoms. Tell me what you're experiencing, when it started and how severe it is, and I'll give you an initial assessment.",
+                "recommendations": ["Describe your symptoms, when they started and how severe they are"],
+                "dos": [],
+                "donts": [],
+                "disclaimer": DISCLAIMER,
+                "is_medical_query": False,
+                "classification_reason": "Greeting or thanks without symptoms",
+                "used_document_ids": [],
+                "pubmed_references": [],
+                "clinical_trials": []
+            }
+        
+        trials_task = None
+        try:
+            # Prepare the input with all available information
+            patient_context = self._patient_context(age, sex, medical_history)
             
-            # Add any PubMed info to our assessment prompt
-            if pubmed_info:
-                user_prompt += pubmed_info
+            # Step 1: Extract just the medical symptoms for PubMed search
+            pubmed_query = self._pubmed_query(symptoms)
             
-                
-            # Prepare messages for assessment
-            assessment_messages = [
-                {"role": "system", "content": self.system_prompt}
-            ]
+            # Step 2: Get patient documents and PubMed references concurrently.
+            # Classification now happens in the assessment call itself, so the
+            # literature search runs up front and is discarded for non-medical messages.
+            # Clinical trials don't feed the prompt, so that lookup is started speculatively
+            # and keeps running through the assessment call; it is cancelled if unused.
+            trials_task = asyncio.create_task(self._search_clinical_trials(pubmed_query))
+            (document_texts, used_document_ids), (pubmed_info, pubmed_references) = await asyncio.gather(
+                self._fetch_patient_documents(app, patient_id, symptoms),
+                self._search_literature(pubmed_query)
+            )
+                    
+            # Step 3: Perform the full assessment
+            # Add relevant conversation history for context (recent exchanges plus a summary of older ones)
+            if conversation_history is None:
+                conversation_history = self._history_for(patient_id)
+            history_messages = self._history_messages(conversation_history) if conversation_history else []
             
-            # Add relevant conversation history for context
-            if self.conversation_history:
-                # Add up to 3 recent exchanges for context
-                for msg in self.conversation_history[-6:]:
-                    assessment_messages.append(msg)
+            # Prepare messages for assessment: the shared system message, history, then the
+            # current prompt with all collected information
+            assessment_messages = self._assessment_messages(symptoms, patient_context, document_texts,
+                                                            pubmed_info, history_messages)
             
-            # Add the current prompt with all collected information
-            assessment_messages.append({"role": "user", "content": user_prompt})
+            # Refuse prompts that would leave no room for the response in the context window
+            prompt_tokens = self._prompt_tokens(assessment_messages)
+            if prompt_tokens > MODEL_CONTEXT_TOKENS - RESPONSE_TOKEN_RESERVE:
+                logger.error(f"Assessment prompt too long: {prompt_tokens} tokens")
+                return {
+                    "error": "The symptom description and history are too long to assess. Please shorten them and try again.",
+                    "urgency_level": "medium",
+                    "urgency_description": "We could not assess these symptoms, so we recommend consulting with a healthcare professional",
+                    "reasoning": "The assessment request exceeded the maximum supported length.",
+                    "recommendations": ["Consult with a healthcare professional as soon as possible"],
+                    "dos": ["Contact your healthcare provider", "Seek medical help if symptoms worsen"],
+                    "donts": ["Don't ignore your symptoms", "Don't wait if you feel your condition is deteriorating"],
+                    "disclaimer": DISCLAIMER,
+                    "pubmed_references": []
+                }
             
             # Check if we have a valid API key before making a request
             if not self.has_valid_api_key:
@@ -325,19 +1121,24 @@ class SymptomAssessmentAgent:
                                       "For technical support, contact the system administrator to set up the API key"],
                     "dos": ["Contact your healthcare provider", "Seek medical help if symptoms worsen"],
                     "donts": ["Don't ignore your symptoms", "Don't wait if you feel your condition is deteriorating"],
-                    "disclaimer": "This is an AI-assisted pre-assessment and not a medical diagnosis. Always consult with a healthcare professional for proper medical advice.",
+                    "disclaimer": DISCLAIMER,
                     "pubmed_references": [],
                     "is_medical_query": True,
                     "classification_reason": "Unable to classify due to API configuration issue"
                 }
             
             # Call the OpenAI API using SDK
+            # The system prompt is a byte-identical first message on every call so
+            # OpenAI's automatic prompt caching can reuse it; a stable per-patient
+            # user id keeps the patient's follow-up requests routed to the same cache
             try:
-                response = self.client.chat.completions.create(
-                    model="gpt-4o",
+                response_content = await self._create_chat_completion(
+                    on_delta=on_delta,
+                    model=self.model,
                     temperature=0,
                     response_format={"type": "json_object"},
-                    messages=assessment_messages
+                    messages=assessment_messages,
+                    user=self._cache_user_id(patient_id)
                 )
             except Exception as api_error:
                 logger.error(f"Error calling OpenAI API: {str(api_error)}")
@@ -349,81 +1150,94 @@ class SymptomAssessmentAgent:
                     "recommendations": ["Consult with a healthcare professional as soon as possible"],
                     "dos": ["Contact your healthcare provider", "Seek medical help if symptoms worsen"],
                     "donts": ["Don't ignore your symptoms", "Don't wait if you feel your condition is deteriorating"],
-                    "disclaimer": "This is an AI-assisted pre-assessment and not a medical diagnosis. Always consult with a healthcare professional for proper medical advice.",
+                    "disclaimer": DISCLAIMER,
                     "pubmed_references": [],
                     "is_medical_query": True,
                     "classification_reason": "Unable to classify due to API error"
                 }
             
-            # Add the response to conversation history
-            self.conversation_history.append({"role": "assistant", "content": response.choices[0].message.content})
+            # Parse the JSON response
+            llm_response = orjson.loads(response_content)
             
-            # Extract the response content
-            response_content = response.choices[0].message.content
+            # Add standard fields if they're missing; unknown urgency levels count as low
+            self._normalize_llm_response(llm_response)
             
-            # Parse the JSON response
-            llm_response = json.loads(response_content)
-            
-            # Add standard fields if they're missing
-            if "disclaimer" not in llm_response:
-                llm_response["disclaimer"] = "This is an AI-assisted pre-assessment and not a medical diagnosis. Always consult with a healthcare professional for proper medical advice."
-            
-            # Convert to appropriate urgency description format
-            if llm_response["urgency_level"] == "high":
-                llm_response["urgency_level"] = "high"
-                if not "urgency_description" in llm_response or not llm_response["urgency_description"]:
-                    llm_response["urgency_description"] = "Seek immediate medical attention"
-            elif llm_response["urgency_level"] == "medium":
-                llm_response["urgency_level"] = "medium"
-                if not "urgency_description" in llm_response or not llm_response["urgency_description"]:
-                    llm_response["urgency_description"] = "Consult with a healthcare provider soon"
+            # Record a compact version of the exchange in the conversation history: the
+            # patient's own message and the gist of the assessment, never the documents,
+            # literature or full JSON, which would be re-sent on every later turn
+            if conversation_history is not None:
+                conversation_history.append({"role": "user", "content": f"Patient symptoms: {symptoms}\n\nPatient information: {patient_context}"})
+                conversation_history.append({"role": "assistant", "content": orjson.dumps({
+                    "urgency_level": llm_response["urgency_level"],
+                    "urgency_description": llm_response["urgency_description"],
+                    "summary": str(llm_response.get("reasoning", ""))[:HISTORY_REASONING_CHARS]
+                }).decode()})
+                if patient_id and conversation_history is self._histories.get(patient_id):
+                    # Re-insert to restart the patient's expiry timer
+                    self._histories[patient_id] = conversation_history
+            
+            # Extract the classification the model made alongside the assessment
+            is_medical_query = bool(llm_response.get("is_medical_query", True))
+            search_terms = (llm_response.pop("pubmed_search_terms", "") or "").strip()
+            medical_classification_reason = llm_response.get("classification_reason", "")
+            documents_relevant = bool(llm_response.get("documents_relevant", False))
+            logger.debug("Medical classification: is_medical=%s, documents_relevant=%s, reason=%s",
+                         is_medical_query, documents_relevant, medical_classification_reason)
+            
+            # Literature lookups are only meaningful for medical queries, and trials
+            # are only shown alongside supporting PubMed references
+            if not is_medical_query:
+                pubmed_references = []
+            elif not pubmed_references and search_terms and search_terms.lower() != (pubmed_query or "").lower():
+                # The raw symptom text found no literature; retry with the model's own search terms
+                logger.debug("Retrying literature search with model search terms: %s", search_terms)
+                trials_task.cancel()
+                trials_task = asyncio.create_task(self._search_clinical_trials(search_terms))
+                _, pubmed_references = await self._search_literature(search_terms)
+            if pubmed_references:
+                clinical_trials = await trials_task
             else:
-                # Default urgency for non-urgent cases
-                llm_response["urgency_level"] = "low"
-                if not "urgency_description" in llm_response or not llm_response["urgency_description"]:
-                    llm_response["urgency_description"] = "Monitor symptoms and practice appropriate self-care"
-            
-            # Extract dos and donts from the LLM response
-            dos = llm_response.get("dos", [])
-            donts = llm_response.get("donts", [])
-            
-            # Format the response as a dict
-            assessment = {
-                "urgency_level": llm_response["urgency_level"],
-                "urgency_description": llm_response["urgency_description"],
-                "reasoning": llm_response["reasoning"],
-                "recommendations": llm_response["recommendations"],
-                "disclaimer": llm_response["disclaimer"],
-                "dos": dos,
-                "donts": donts,
-                "is_medical_query": is_medical_query,
-                "classification_reason": medical_classification_reason,
-                "used_document_ids": used_document_ids
-            }
+                trials_task.cancel()
+                clinical_trials = []
+            
+            # Use the model's dict as the assessment, adding the server-side fields in place
+            assessment = llm_response
+            assessment.setdefault("dos", [])
+            assessment.setdefault("donts", [])
+            assessment.update(
+                is_medical_query=is_medical_query,
+                classification_reason=medical_classification_reason,
+                used_document_ids=used_document_ids if documents_relevant else []
+            )
             
             # Add PubMed references if any
             if pubmed_references:
-                logger.info(f"Adding {len(pubmed_references)} PubMed references to final response")
+                logger.debug("Adding %d PubMed references to final response", len(pubmed_references))
                 assessment["pubmed_references"] = pubmed_references
             else:
-                logger.warning("No PubMed references to add to the response")
+                logger.debug("No PubMed references to add to the response")
                 assessment["pubmed_references"] = []
                 
             # Add clinical trials if any
             if clinical_trials:
-                logger.info(f"Adding {len(clinical_trials)} clinical trials to final response")
+                logger.debug("Adding %d clinical trials to final response", len(clinical_trials))
                 assessment["clinical_trials"] = clinical_trials
                 # Log the detailed clinical trials data
-                logger.info(f"Clinical trials in final response: {json.dumps(assessment['clinical_trials'])}")
+                logger.debug("Clinical trials in final response: %s", assessment['clinical_trials'])
             else:
-                logger.info("No clinical trials to add to the response")
+                logger.debug("No clinical trials to add to the response")
                 assessment["clinical_trials"] = []
             
             # Log the entire assessment for debugging
-            logger.info(f"Final assessment response structure: {json.dumps({k: type(v).__name__ for k, v in assessment.items()})}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Final assessment response structure: %s", {k: type(v).__name__ for k, v in assessment.items()})
             if 'pubmed_references' in assessment:
-                logger.info(f"PubMed references in final response: {json.dumps(assessment['pubmed_references'])}")
+                logger.debug("PubMed references in final response: %s", assessment['pubmed_references'])
             
+            # The one INFO line per assessment; counts only, never the patient's text
+            logger.info("Assessment finished: is_medical=%s, urgency=%s, references=%d, trials=%d",
+                        is_medical_query, assessment.get("urgency_level"),
+                        len(pubmed_references), len(clinical_trials))
             return assessment
             
         except Exception as e:
@@ -436,7 +1250,11 @@ class SymptomAssessmentAgent:
                 "recommendations": ["Consult with a healthcare professional as soon as possible"],
                 "dos": ["Contact your healthcare provider", "Seek medical help if symptoms worsen"],
                 "donts": ["Don't ignore your symptoms", "Don't wait if you feel your condition is deteriorating"],
-                "disclaimer": "This is an AI-assisted pre-assessment and not a medical diagnosis. Always consult with a healthcare professional for proper medical advice.",
+                "disclaimer": DISCLAIMER,
                 "pubmed_references": []
             }
+        finally:
+            # Don't leave the speculative trials lookup running after an early return
+            if trials_task is not None and not trials_task.done():
+                trials_task.cancel()
     # No need for a parse_assessment method as we're using JSON directly
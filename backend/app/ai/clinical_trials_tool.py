@@ -1,19 +1,63 @@
-import requests
+import asyncio
 import logging
 import re
 from typing import List, Dict, Any, Optional
 from datetime import datetime
+import httpx
+import orjson
+from cachetools import TTLCache
+
+from .http_retry import LITERATURE_API_TIMEOUT, retry_transient_http
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Patterns used to reduce a user query to its medical terms
+_STOPWORDS_RE = re.compile(r"\b(have|has|having|experiencing|suffering|from|with|and|the|is|are|my|I|feel|feeling|patient)\b", re.IGNORECASE)
+_PUNCTUATION_RE = re.compile(r"[?!.,]")
+_WHITESPACE_RE = re.compile(r"\s+")
+
 class ClinicalTrialsTool:
     """Tool for retrieving clinical trials from ClinicalTrials.gov relevant to a user query."""
     
-    def __init__(self):
-        """Initialize the ClinicalTrials.gov tool."""
+    def __init__(self, client: Optional[httpx.AsyncClient] = None):
+        """Initialize the ClinicalTrials.gov tool.
+        
+        Args:
+            client: Shared HTTP client to send searches with; one is created if omitted (optional)
+        """
         self.base_url = "https://clinicaltrials.gov/api/v2/studies"
+        # Shared, pooled client so repeated searches reuse their connections
+        self._http = client or self._new_http_client()
+        # ETag and body of recent responses, for conditional requests
+        self._etag_cache = TTLCache(maxsize=256, ttl=60 * 60)
+    
+    @staticmethod
+    def _new_http_client() -> httpx.AsyncClient:
+        """Create an HTTP client for the ClinicalTrials.gov API."""
+        return httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=20),
+            timeout=LITERATURE_API_TIMEOUT
+        )
+        
+    @retry_transient_http
+    async def _get(self, client: httpx.AsyncClient, params: Dict[str, Any]) -> bytes:
+        """GET the studies endpoint, reusing the cached body when the server answers 304 Not Modified.
+        
+        Network errors, 429s and 5xx responses are retried with exponential backoff.
+        """
+        request_url = str(client.build_request("GET", self.base_url, params=params).url)
+        cached = self._etag_cache.get(request_url)
+        headers = {"If-None-Match": cached[0]} if cached else {}
+        
+        response = await client.get(self.base_url, params=params, headers=headers)
+        if response.status_code == 304 and cached:
+            return cached[1]
+        response.raise_for_status()
+        
+        etag = response.headers.get("ETag")
+        if etag:
+            self._etag_cache[request_url] = (etag, response.content)
+        return response.content
         
     def _extract_medical_terms(self, query: str) -> str:
         """
@@ -26,28 +70,65 @@ class ClinicalTrialsTool:
             A refined query string with medical terms
         """
         # Remove common words and question structures that aren't relevant for search
-        query = re.sub(r"\b(have|has|having|experiencing|suffering|from|with|and|the|is|are|my|I|feel|feeling|patient)\b", "", query, flags=re.IGNORECASE)
+        query = _STOPWORDS_RE.sub("", query)
         # Remove question marks and other punctuation
-        query = re.sub(r"[?!.,]", "", query)
+        query = _PUNCTUATION_RE.sub("", query)
         # Remove extra spaces
-        query = re.sub(r"\s+", " ", query).strip()
+        query = _WHITESPACE_RE.sub(" ", query).strip()
         
-        logger.info(f"Extracted medical terms from query: '{query}'")
+        logger.debug("Extracted medical terms from query: '%s'", query)
         return query
     
     def _run(self, query: str, max_results: int = 5) -> List[Dict[str, Any]]:
         """
-        Search for clinical trials related to the query.
+        Search for clinical trials related to the query synchronously.
+        
+        Uses a short-lived client because the shared one is bound to the
+        event loop that first used it.
         
         Args:
             query: The search query
             max_results: Maximum number of results to return
             
+        Returns:
+            A list of clinical trials
+        """
+        async def run_once():
+            async with self._new_http_client() as client:
+                return await self._search(client, query, max_results)
+        
+        return asyncio.run(run_once())
+    
+    async def _arun(self, query: str, max_results: int = 5, refine: bool = True) -> List[Dict[str, Any]]:
+        """
+        Search for clinical trials related to the query on the shared connection pool.
+        
+        Args:
+            query: The search query
+            max_results: Maximum number of results to return
+            refine: Whether to strip non-medical words from the query first
+            
+        Returns:
+            A list of clinical trials
+        """
+        return await self._search(self._http, query, max_results, refine)
+    
+    async def _search(self, client: httpx.AsyncClient, query: str, max_results: int,
+                      refine: bool = True) -> List[Dict[str, Any]]:
+        """
+        Search for clinical trials related to the query using the given client.
+        
+        Args:
+            client: HTTP client to send the request with
+            query: The search query
+            max_results: Maximum number of results to return
+            refine: Whether to strip non-medical words from the query first
+            
         Returns:
             A list of clinical trials
         """
         # Extract medical terms for better search
-        refined_query = self._extract_medical_terms(query)
+        refined_query = self._extract_medical_terms(query) if refine else query.strip()
         
         if not refined_query:
             logger.warning("No valid search terms found in query")
@@ -61,18 +142,17 @@ class ClinicalTrialsTool:
         
         try:
             # Send request to ClinicalTrials.gov API v2
-            logger.info(f"Sending request to ClinicalTrials.gov API v2 with query: {refined_query}")
-            response = requests.get(self.base_url, params=params)
-            response.raise_for_status()
+            logger.debug("Sending request to ClinicalTrials.gov API v2 with query: %s", refined_query)
+            content = await self._get(client, params)
             
             # Parse response
-            data = response.json()
+            data = orjson.loads(content)
             
             # Check if we have studies in the response
             studies = data.get("studies", [])
             
             if not studies:
-                logger.info("No clinical trials found for query")
+                logger.debug("No clinical trials found for query")
                 return [{"info": "No clinical trials found for your query"}]
             
             # Format results
@@ -81,10 +161,10 @@ class ClinicalTrialsTool:
                 trial = self.format_trial(study)
                 results.append(trial)
             
-            logger.info(f"Found {len(results)} clinical trials for query: {refined_query}")
+            logger.debug("Found %d clinical trials for query: %s", len(results), refined_query)
             return results
             
-        except requests.RequestException as e:
+        except httpx.HTTPError as e:
             logger.error(f"Error fetching clinical trials: {str(e)}")
             return [{"error": f"Failed to fetch clinical trials: {str(e)}"}]
         except Exception as e:
@@ -152,3 +232,19 @@ class ClinicalTrialsTool:
             A list of relevant clinical trials
         """
         return self._run(query, max_results)
+    
+    async def aget_trials_for_query(self, query: str, max_results: int = 3,
+                                    refine: bool = True) -> List[Dict[str, Any]]:
+        """
+        Async version of get_trials_for_query.
+        
+        Args:
+            query: The user's query string
+            max_results: Maximum number of trials to return
+            refine: Whether to strip non-medical words from the query first; callers
+                passing an already refined query can skip it
+            
+        Returns:
+            A list of relevant clinical trials
+        """
+        return await self._arun(query, max_results, refine)
@@ -1,120 +1,251 @@
 """Routes for handling medical document uploads and management."""
 import logging
-import json
-from flask import Blueprint, request, jsonify, current_app
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import orjson
+from urllib.parse import quote
+from flask import Blueprint, Response, request, jsonify, current_app, send_file
 from werkzeug.utils import secure_filename
+from sqlalchemy import func, insert
+from sqlalchemy.orm import defer
 
 from .. import db
 from ..models import MedicalDocument
-from .document_utils import save_uploaded_file, extract_text_from_document, SUPPORTED_FILE_TYPES
+from .document_utils import (save_uploaded_file, extract_text_from_document, get_upload_directory, get_file_size,
+                             ALL_SUPPORTED_MIME, MIME_TO_KIND, MAX_FILE_SIZES)
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Create Blueprint
 documents_bp = Blueprint('documents', __name__, url_prefix='/api/documents')
 
+# Result sizes for patient document searches and paged listings
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Guards creation of the shared document pool (text extraction and file deletion)
+# when the first uploads arrive concurrently
+_extractor_lock = threading.Lock()
+
+def get_extractor_pool() -> ThreadPoolExecutor:
+    """Return the application's thread pool for background document work.
+    
+    Used to extract text from uploads and to delete the files of removed documents.
+    """
+    pool = current_app.extensions.get('document_extractor')
+    if pool is None:
+        with _extractor_lock:
+            pool = current_app.extensions.get('document_extractor')
+            if pool is None:
+                pool = ThreadPoolExecutor(max_workers=current_app.config['DOCUMENT_EXTRACTION_WORKERS'],
+                                          thread_name_prefix='document-extractor')
+                current_app.extensions['document_extractor'] = pool
+    return pool
+
+def _extract_document_text(app, document_id: int, file_path: str, file_type: str, original_filename: str):
+    """Extract an uploaded document's text and store it on its database row.
+    
+    Runs in the extraction pool, so it pushes its own application context.
+    """
+    content_text = extract_text_from_document(file_path, file_type)
+    
+    with app.app_context():
+        try:
+            document = db.session.get(MedicalDocument, document_id)
+            if document is None:
+                # Deleted before extraction finished
+                return
+            document.content_text = content_text
+            document.document_metadata = orjson.dumps({
+                "original_filename": original_filename,
+                "content_extraction_status": "completed" if content_text is not None else "failed",
+                "content_extraction_success": content_text is not None
+            }).decode()
+            db.session.commit()
+            logger.info(f"Extracted text from document {document_id}")
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error storing extracted text for document {document_id}: {str(e)}")
+
+def _delete_document_file(file_path: str):
+    """Remove a deleted document's file from disk; runs in the extraction pool."""
+    try:
+        os.unlink(file_path)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.warning(f"Could not delete physical file: {str(e)}")
+
 @documents_bp.route('/upload', methods=['POST'])
 def upload_document():
-    """Upload a medical document for a patient."""
-    try:
-        # Check if the request has the file part
-        if 'file' not in request.files:
-            return jsonify({"error": "No file part in the request"}), 400
-            
-        file = request.files['file']
-        patient_id = request.form.get('patient_id')
+    """Upload one or more medical documents for a patient.
+    
+    Several files can be sent under the ``file`` field; they are stored with a
+    single INSERT. The documents are returned straight away with a 202 status
+    (a single object for one file, a list for several); their text is
+    extracted in the background, and ``metadata.content_extraction_status``
+    changes from ``pending`` to ``completed`` or ``failed`` when that is done.
+    """
+    # Refuse oversized requests before the body is read
+    max_length = current_app.config.get('MAX_CONTENT_LENGTH')
+    if max_length and request.content_length and request.content_length > max_length:
+        return jsonify({"error": f"Upload too large. The maximum is {max_length // (1024 * 1024)} MB"}), 413
+    
+    # Check if the request has the file part
+    if 'file' not in request.files:
+        return jsonify({"error": "No file part in the request"}), 400
+        
+    files = request.files.getlist('file')
+    patient_id = request.form.get('patient_id')
+    
+    # Validate input
+    if not files or any(not file or file.filename == '' for file in files):
+        return jsonify({"error": "No file selected"}), 400
+        
+    if not patient_id:
+        return jsonify({"error": "Patient ID is required"}), 400
         
-        # Validate input
-        if not file or file.filename == '':
-            return jsonify({"error": "No file selected"}), 400
-            
-        if not patient_id:
-            return jsonify({"error": "Patient ID is required"}), 400
-            
-        # Check if file type is supported
-        file_type = file.content_type
-        supported_types = []
-        for types in SUPPORTED_FILE_TYPES.values():
-            supported_types.extend(types)
-            
-        if file_type not in supported_types:
+    # Check if file types are supported
+    for file in files:
+        if file.content_type not in ALL_SUPPORTED_MIME:
             return jsonify({
-                "error": f"Unsupported file type: {file_type}. Supported types are: {', '.join(supported_types)}"
+                "error": f"Unsupported file type: {file.content_type}. Supported types are: {', '.join(sorted(ALL_SUPPORTED_MIME))}"
             }), 400
-            
-        # Save the file
-        filename, file_path, file_type, file_size = save_uploaded_file(file, patient_id)
         
-        # Extract text from the document
-        content_text = extract_text_from_document(file_path, file_type)
+        # Check the size limit for this kind of file before saving or extracting it
+        max_size = MAX_FILE_SIZES[MIME_TO_KIND[file.content_type]]
+        if get_file_size(file) > max_size:
+            return jsonify({
+                "error": f"File too large: {file.filename}. The maximum for this file type is {max_size // (1024 * 1024)} MB"
+            }), 413
         
-        # Create a document record in the database
-        new_document = MedicalDocument(
-            patient_id=patient_id,
-            filename=filename,
-            file_type=file_type,
-            file_size=file_size,
-            file_path=file_path,
-            content_text=content_text,
-            metadata=json.dumps({
+    # Save the files and build their document records; the text is filled in once extracted
+    rows = []
+    for file in files:
+        filename, file_path, file_type, file_size = save_uploaded_file(file, patient_id)
+        rows.append({
+            "patient_id": patient_id,
+            "filename": filename,
+            "file_type": file_type,
+            "file_size": file_size,
+            "file_path": file_path,
+            "content_text": None,
+            "document_metadata": orjson.dumps({
                 "original_filename": file.filename,
-                "content_extraction_success": content_text is not None
-            })
-        )
-        
-        db.session.add(new_document)
-        db.session.commit()
-        
-        return jsonify(new_document.to_dict()), 201
-        
-    except Exception as e:
-        logger.error(f"Error uploading document: {str(e)}")
-        return jsonify({"error": f"Failed to upload document: {str(e)}"}), 500
+                "content_extraction_status": "pending"
+            }).decode()
+        })
+    
+    # Insert all the records in one executemany; the ids come back in the order of rows
+    document_ids = db.session.execute(
+        insert(MedicalDocument).returning(MedicalDocument.id, sort_by_parameter_order=True), rows
+    ).scalars().all()
+    db.session.commit()
+    
+    # Extract text from the documents without holding up the response
+    app = current_app._get_current_object()
+    pool = get_extractor_pool()
+    for document_id, file, row in zip(document_ids, files, rows):
+        pool.submit(_extract_document_text, app, document_id, row["file_path"], row["file_type"], file.filename)
+    
+    documents = MedicalDocument.query.options(defer(MedicalDocument.content_text)).filter(
+        MedicalDocument.id.in_(document_ids)).order_by(MedicalDocument.id).all()
+    if len(documents) == 1:
+        return jsonify(documents[0].to_dict()), 202
+    return jsonify([doc.to_dict() for doc in documents]), 202
 
 @documents_bp.route('/patient/<patient_id>', methods=['GET'])
 def get_patient_documents(patient_id):
-    """Get all documents for a specific patient."""
-    try:
-        documents = MedicalDocument.query.filter_by(patient_id=patient_id).all()
-        return jsonify([doc.to_dict() for doc in documents])
-        
-    except Exception as e:
-        logger.error(f"Error retrieving patient documents: {str(e)}")
-        return jsonify({"error": f"Failed to retrieve patient documents: {str(e)}"}), 500
+    """Get all documents for a specific patient, newest first.
+    
+    ``limit`` (at most 200) returns one page; the next page is requested with
+    ``after`` set to the ``X-Next-Cursor`` header, which is absent on the
+    last page.
+    """
+    # The listing only needs the database-side preview, not the full extracted text
+    query = (MedicalDocument.query.options(defer(MedicalDocument.content_text))
+             .filter_by(patient_id=patient_id))
+    
+    # Keyset pagination: continue after the cursor document in the listing order
+    after_id = request.args.get('after', type=int)
+    if after_id:
+        query = query.filter(MedicalDocument.id < after_id)
+    query = query.order_by(MedicalDocument.id.desc())
+    
+    limit = request.args.get('limit', type=int)
+    if limit:
+        limit = min(max(limit, 1), MAX_PAGE_SIZE)
+        documents = query.limit(limit + 1).all()
+    else:
+        documents = query.all()
+    
+    has_more = bool(limit) and len(documents) > limit
+    if has_more:
+        documents = documents[:limit]
+    response = jsonify([doc.to_dict() for doc in documents])
+    if has_more:
+        response.headers['X-Next-Cursor'] = str(documents[-1].id)
+    return response
+
+@documents_bp.route('/patient/<patient_id>/search', methods=['GET'])
+def search_patient_documents(patient_id):
+    """Full-text search of a patient's documents by their extracted text, best matches first."""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({"error": "Search query is required"}), 400
+    limit = min(max(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+    
+    ts_query = func.plainto_tsquery('english', query)
+    search_vector = MedicalDocument.content_search_vector()
+    documents = (MedicalDocument.query.options(defer(MedicalDocument.content_text))
+                 .filter(MedicalDocument.patient_id == patient_id, search_vector.op('@@')(ts_query))
+                 .order_by(func.ts_rank(search_vector, ts_query).desc())
+                 .limit(limit).all())
+    return jsonify({"items": [doc.to_dict() for doc in documents]})
 
 @documents_bp.route('/<int:document_id>', methods=['GET'])
 def get_document(document_id):
     """Get a specific document by ID."""
-    try:
-        document = MedicalDocument.query.get_or_404(document_id)
-        return jsonify(document.to_dict())
-        
-    except Exception as e:
-        logger.error(f"Error retrieving document {document_id}: {str(e)}")
-        return jsonify({"error": f"Failed to retrieve document: {str(e)}"}), 500
+    document = MedicalDocument.query.options(defer(MedicalDocument.content_text)).filter_by(id=document_id).first_or_404()
+    return jsonify(document.to_dict())
+
+@documents_bp.route('/<int:document_id>/download', methods=['GET'])
+def download_document(document_id):
+    """Download the original file of a document.
+    
+    When DOCUMENT_ACCEL_REDIRECT_PREFIX is set, the response only carries an
+    ``X-Accel-Redirect`` header and the front-end proxy (nginx) streams the file
+    from an internal location mapped to the upload directory. Otherwise Flask
+    sends the file itself.
+    """
+    document = MedicalDocument.query.options(defer(MedicalDocument.content_text)).filter_by(id=document_id).first_or_404()
+    
+    relative_path = os.path.relpath(document.file_path, get_upload_directory())
+    if relative_path.startswith(os.pardir) or not os.path.exists(document.file_path):
+        return jsonify({"error": "Document file not found"}), 404
+    
+    accel_prefix = current_app.config['DOCUMENT_ACCEL_REDIRECT_PREFIX']
+    if accel_prefix:
+        response = Response(status=200, mimetype=document.file_type)
+        response.headers['X-Accel-Redirect'] = f"{accel_prefix.rstrip('/')}/{quote(relative_path.replace(os.sep, '/'))}"
+        response.headers['Content-Disposition'] = f"attachment; filename=\"{document.filename}\""
+        return response
+    
+    return send_file(document.file_path, mimetype=document.file_type,
+                     as_attachment=True, download_name=document.filename)
 
 @documents_bp.route('/<int:document_id>', methods=['DELETE'])
 def delete_document(document_id):
     """Delete a specific document by ID."""
-    try:
-        document = MedicalDocument.query.get_or_404(document_id)
-        
-        # Delete the physical file
-        try:
-            import os
-            if os.path.exists(document.file_path):
-                os.remove(document.file_path)
-        except Exception as e:
-            logger.warning(f"Could not delete physical file: {str(e)}")
-        
-        # Delete from database
-        db.session.delete(document)
-        db.session.commit()
-        
-        return jsonify({"message": "Document deleted successfully"}), 200
-        
-    except Exception as e:
-        logger.error(f"Error deleting document {document_id}: {str(e)}")
-        return jsonify({"error": f"Failed to delete document: {str(e)}"}), 500
+    document = MedicalDocument.query.options(defer(MedicalDocument.content_text)).filter_by(id=document_id).first_or_404()
+    file_path = document.file_path
+    
+    # Delete from database
+    db.session.delete(document)
+    db.session.commit()
+    
+    # Delete the physical file in the background; the document is already gone
+    get_extractor_pool().submit(_delete_document_file, file_path)
+    
+    return jsonify({"message": "Document deleted successfully"}), 200
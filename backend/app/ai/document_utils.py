@@ -2,11 +2,11 @@
 import os
 import logging
 from typing import Optional
+import shutil
 import tempfile
+from itertools import islice
 from werkzeug.utils import secure_filename
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Define supported file types
@@ -17,6 +17,24 @@ SUPPORTED_FILE_TYPES = {
     'doc': ['application/msword', 'application/vnd.openxmlformats-officedocument.wordprocessingml.document']
 }
 
+# Every supported MIME type, and the kind of document each one is
+ALL_SUPPORTED_MIME = frozenset(mime for mimes in SUPPORTED_FILE_TYPES.values() for mime in mimes)
+MIME_TO_KIND = {mime: kind for kind, mimes in SUPPORTED_FILE_TYPES.items() for mime in mimes}
+
+# Largest accepted file of each kind, in bytes
+MAX_FILE_SIZES = {
+    'pdf': 25 * 1024 * 1024,
+    'text': 5 * 1024 * 1024,
+    'image': 10 * 1024 * 1024,
+    'doc': 25 * 1024 * 1024
+}
+
+# Bytes copied per read/write when saving an upload
+UPLOAD_COPY_CHUNK_SIZE = 1024 * 1024
+
+# Pages of a PDF to extract text from; later pages of very large files are skipped
+MAX_PDF_PAGES = 200
+
 def extract_text_from_document(file_path: str, file_type: str) -> Optional[str]:
     """
     Extract text content from uploaded documents based on their file type.
@@ -29,32 +47,43 @@ def extract_text_from_document(file_path: str, file_type: str) -> Optional[str]:
         Extracted text content or None if extraction failed
     """
     try:
+        kind = MIME_TO_KIND.get(file_type)
+        
         # Text files
-        if file_type in SUPPORTED_FILE_TYPES['text']:
+        if kind == 'text':
             with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
                 return f.read()
                 
         # PDF files
-        elif file_type in SUPPORTED_FILE_TYPES['pdf']:
+        elif kind == 'pdf':
+            try:
+                # Prefer pypdfium2, which extracts text in native code
+                import pypdfium2 as pdfium
+                pdf = pdfium.PdfDocument(file_path)
+                try:
+                    return "\n".join(page.get_textpage().get_text_range()
+                                     for page in islice(pdf, MAX_PDF_PAGES)) + "\n"
+                finally:
+                    pdf.close()
+            except ImportError:
+                pass
             try:
-                # Try to import PyPDF2
+                # Fall back to PyPDF2
                 from PyPDF2 import PdfReader
                 reader = PdfReader(file_path)
-                text = ""
-                for page in reader.pages:
-                    text += page.extract_text() + "\n"
-                return text
+                return "\n".join((page.extract_text() or "")
+                                 for page in islice(reader.pages, MAX_PDF_PAGES)) + "\n"
             except ImportError:
-                logger.warning("PyPDF2 not installed. Cannot extract text from PDF.")
+                logger.warning("Neither pypdfium2 nor PyPDF2 is installed. Cannot extract text from PDF.")
                 return f"[PDF document content: {os.path.basename(file_path)}. Text extraction unavailable.]"
                 
         # Image files - would require OCR, not implemented in this demo
-        elif file_type in SUPPORTED_FILE_TYPES['image']:
+        elif kind == 'image':
             # In a production environment, you'd implement OCR here
             return f"[Image document: {os.path.basename(file_path)}. OCR processing not implemented in demo.]"
             
         # Word documents - would require additional libraries
-        elif file_type in SUPPORTED_FILE_TYPES['doc']:
+        elif kind == 'doc':
             # In a production environment, you'd implement doc parsing here
             return f"[Word document: {os.path.basename(file_path)}. Text extraction not implemented in demo.]"
             
@@ -66,6 +95,15 @@ def extract_text_from_document(file_path: str, file_type: str) -> Optional[str]:
         logger.error(f"Error extracting text from document: {str(e)}")
         return None
         
+def get_file_size(file) -> int:
+    """Size in bytes of an uploaded file, without reading its content."""
+    stream = file.stream
+    position = stream.tell()
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(position)
+    return size
+
 def get_upload_directory():
     """Get the directory for storing uploaded files."""
     # In a production system, you would use a proper file storage service
@@ -104,11 +142,11 @@ def save_uploaded_file(file, patient_id: str) -> tuple:
     unique_filename = f"{uuid.uuid4()}_{filename}"
     file_path = os.path.join(patient_dir, unique_filename)
     
-    # Save the file
-    file.save(file_path)
-    
-    # Get file information
-    file_size = os.path.getsize(file_path)
+    # Stream the upload to disk in large chunks
+    with open(file_path, 'wb', buffering=0) as dst:
+        shutil.copyfileobj(file.stream, dst, length=UPLOAD_COPY_CHUNK_SIZE)
+        # Get file information
+        file_size = os.fstat(dst.fileno()).st_size
     file_type = file.content_type
     
     return (filename, file_path, file_type, file_size)
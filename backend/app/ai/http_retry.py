@@ -0,0 +1,70 @@
+"""Timeouts, rate limiting and retry policy for the external literature APIs."""
+import asyncio
+import logging
+import threading
+import time
+from typing import Optional
+
+import httpx
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_exponential, before_sleep_log
+
+logger = logging.getLogger(__name__)
+
+# Give up quickly on unreachable hosts so the retry can try again; allow longer reads for efetch
+LITERATURE_API_TIMEOUT = httpx.Timeout(10.0, connect=3.05)
+
+
+def is_transient_http_error(exc: BaseException) -> bool:
+    """Whether an httpx error is worth retrying: network failures, 429s and 5xx responses."""
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code == 429 or exc.response.status_code >= 500
+    return isinstance(exc, httpx.TransportError)
+
+
+# Up to 3 attempts with exponential backoff, re-raising the last error
+retry_transient_http = retry(
+    retry=retry_if_exception(is_transient_http_error),
+    wait=wait_exponential(multiplier=1, max=30),
+    stop=stop_after_attempt(3),
+    before_sleep=before_sleep_log(logger, logging.WARNING),
+    reraise=True
+)
+
+
+class AsyncRateLimiter:
+    """Token bucket spacing out calls to an API with a per-second request limit.
+    
+    Callers reserve a token under a thread lock and then sleep until it is due, so one
+    limiter can be shared by coroutines running on different event loops.
+    
+    Usage::
+    
+        await limiter.acquire()
+        response = await client.get(...)
+    """
+    
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        """Initialize the limiter.
+        
+        Args:
+            rate: Requests allowed per second
+            burst: Requests that may be sent at once after an idle period (defaults to one second's worth)
+        """
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    async def acquire(self):
+        """Wait until a request may be sent."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # A negative balance is the backlog of callers already waiting for a token
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            logger.debug("Rate limit reached, waiting %.2fs", wait)
+            await asyncio.sleep(wait)
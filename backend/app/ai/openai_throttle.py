@@ -0,0 +1,98 @@
+"""Concurrency and rate-limit throttling for OpenAI API calls."""
+import asyncio
+import logging
+import re
+import time
+from typing import Mapping, Optional
+
+logger = logging.getLogger(__name__)
+
+# Matches the duration format OpenAI uses for x-ratelimit-reset-* headers, e.g. "1s", "6m0s", "20ms"
+_DURATION_PART_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def _parse_reset_duration(value: Optional[str]) -> float:
+    """Convert an OpenAI reset duration such as "6m0s" into seconds."""
+    if not value:
+        return 0.0
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in _DURATION_PART_RE.findall(value))
+
+
+class OpenAIThrottle:
+    """Bounds concurrent OpenAI calls and pauses when the rate limit is nearly exhausted.
+
+    The remaining request/token budget is tracked from the ``x-ratelimit-*``
+    headers of each response, so callers wait for the window to reset instead
+    of firing requests that would come back as 429s.
+
+    Usage::
+
+        async with throttle:
+            raw = await client.chat.completions.with_raw_response.create(...)
+        throttle.update_from_headers(raw.headers)
+    """
+
+    def __init__(self, max_concurrent: int = 20, min_remaining_requests: int = 1,
+                 min_remaining_tokens: int = 2000):
+        """Initialize the throttle.
+
+        Args:
+            max_concurrent: Maximum number of in-flight OpenAI calls
+            min_remaining_requests: Pause when fewer requests than this remain in the window
+            min_remaining_tokens: Pause when fewer tokens than this remain in the window
+        """
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self.min_remaining_requests = min_remaining_requests
+        self.min_remaining_tokens = min_remaining_tokens
+
+        # Budget as last reported by the API (None until the first response)
+        self.remaining_requests: Optional[int] = None
+        self.remaining_tokens: Optional[int] = None
+        self._requests_reset_at = 0.0
+        self._tokens_reset_at = 0.0
+
+    def _wait_time(self) -> float:
+        """Seconds to wait before the next call may be sent."""
+        now = time.monotonic()
+        wait = 0.0
+        if self.remaining_requests is not None and self.remaining_requests < self.min_remaining_requests:
+            wait = max(wait, self._requests_reset_at - now)
+        if self.remaining_tokens is not None and self.remaining_tokens < self.min_remaining_tokens:
+            wait = max(wait, self._tokens_reset_at - now)
+        return wait
+
+    async def __aenter__(self):
+        await self._semaphore.acquire()
+        try:
+            wait = self._wait_time()
+            if wait > 0:
+                logger.warning(f"OpenAI rate limit nearly exhausted, waiting {wait:.2f}s")
+                await asyncio.sleep(wait)
+                # The window has reset; let the next response report the new budget
+                self.remaining_requests = None
+                self.remaining_tokens = None
+            elif self.remaining_requests is not None:
+                # Reserve a request so concurrent callers don't all spend the same budget
+                self.remaining_requests -= 1
+        except BaseException:
+            self._semaphore.release()
+            raise
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._semaphore.release()
+        return False
+
+    def update_from_headers(self, headers: Mapping[str, str]) -> None:
+        """Refresh the remaining budget from an OpenAI response's rate-limit headers."""
+        now = time.monotonic()
+        try:
+            if "x-ratelimit-remaining-requests" in headers:
+                self.remaining_requests = int(headers["x-ratelimit-remaining-requests"])
+                self._requests_reset_at = now + _parse_reset_duration(headers.get("x-ratelimit-reset-requests"))
+            if "x-ratelimit-remaining-tokens" in headers:
+                self.remaining_tokens = int(headers["x-ratelimit-remaining-tokens"])
+                self._tokens_reset_at = now + _parse_reset_duration(headers.get("x-ratelimit-reset-tokens"))
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Could not parse OpenAI rate-limit headers: {str(e)}")
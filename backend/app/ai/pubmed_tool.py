@@ -1,16 +1,41 @@
 """PubMed API Tool for retrieving medical information using Entrez E-Utilities."""
 import os
+import asyncio
 import logging
-import requests
-import json
 import re
 from typing import Dict, List, Optional, Any
-from xml.etree import ElementTree
+import io
+import httpx
+import orjson
+from lxml import etree
+from cachetools import TTLCache
+
+from .http_retry import LITERATURE_API_TIMEOUT, AsyncRateLimiter, retry_transient_http
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Common medical symptoms turned into focused Title/Abstract searches when mentioned
+COMMON_SYMPTOMS = [
+    "headache", "migraine", "chest pain", "abdominal pain", "back pain", 
+    "shortness of breath", "dyspnea", "fever", "cough", "nausea",
+    "vomiting", "diarrhea", "dizziness", "vertigo", "fatigue",
+    "weakness", "numbness", "tingling", "rash", "swelling", "edema",
+    "hypertension", "high blood pressure", "low blood pressure", "hypotension",
+    "tachycardia", "bradycardia", "arrhythmia", "palpitations",
+    "insomnia", "anxiety", "depression", "confusion"
+]
+_SYMPTOM_RE = re.compile(r"\b(" + "|".join(map(re.escape, COMMON_SYMPTOMS)) + r")\b", re.IGNORECASE)
+
+# Elements of an efetch PubmedArticle that _parse_article reads
+_ARTICLE_FIELD_TAGS = ("PMID", "ArticleTitle", "AbstractText", "Title", "Year", "Month", "Day", "MedlineDate",
+                       "Author", "Keyword", "MeshHeading")
+
+# Most PMIDs sent in an efetch query string; NCBI asks for longer ID lists to be POSTed
+EFETCH_GET_MAX_IDS = 200
+
+# Abstract text kept per article; callers only show the first few hundred characters
+MAX_ABSTRACT_CHARS = 2048
+
 class PubMedTool:
     """Tool for searching PubMed and retrieving medical information using Entrez E-Utilities API."""
     
@@ -21,18 +46,38 @@ class PubMedTool:
     Input should be a search query related to medical symptoms or conditions.
     """
     
-    def __init__(self):
-        """Initialize the PubMed tool with API configuration."""
+    def __init__(self, client: Optional[httpx.AsyncClient] = None):
+        """Initialize the PubMed tool with API configuration.
+        
+        Args:
+            client: Shared HTTP client to send searches with; one is created if omitted (optional)
+        """
         # Set parameters for Entrez E-Utilities
         self.email = os.environ.get("PUBMED_API_EMAIL", "nuverse.hackathon@example.com")
         self.tool = os.environ.get("PUBMED_API_TOOL", "nuverse-symptom-assessment")
+        # An API key raises NCBI's rate limit from 3 to 10 requests per second
+        self.api_key = os.environ.get("NCBI_API_KEY")
+        # Identification sent with every E-Utilities request
+        self._common_params = {"tool": self.tool, "email": self.email}
+        if self.api_key:
+            self._common_params["api_key"] = self.api_key
+        # Keep outgoing requests within NCBI's limit so bursts don't come back as 429s
+        self._rate_limiter = AsyncRateLimiter(10 if self.api_key else 3)
         
         # Base URLs for Entrez E-Utilities
         self.search_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi"
         self.fetch_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi"
         self.summary_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esummary.fcgi"
         
-        logger.info(f"PubMed tool initialized with email: {self.email} and tool: {self.tool}")
+        # Shared, pooled client so repeated searches reuse their connections to NCBI
+        self._http = client or self._new_http_client()
+        # ETag and body of recent responses, for conditional requests
+        self._etag_cache = TTLCache(maxsize=256, ttl=60 * 60)
+        # Parsed efetch articles by PMID, so searches returning overlapping articles
+        # only fetch the ones not seen recently
+        self._article_cache = TTLCache(maxsize=2048, ttl=24 * 60 * 60)
+        
+        logger.info("PubMed tool initialized with email: %s and tool: %s", self.email, self.tool)
         
     
     def _process_medical_query(self, query: str) -> str:
@@ -44,223 +89,167 @@ class PubMedTool:
         Returns:
             Optimized query string for PubMed search
         """
-        # Extract common medical symptoms and create an optimized search query
-        common_symptoms = [
-            "headache", "migraine", "chest pain", "abdominal pain", "back pain", 
-            "shortness of breath", "dyspnea", "fever", "cough", "nausea",
-            "vomiting", "diarrhea", "dizziness", "vertigo", "fatigue",
-            "weakness", "numbness", "tingling", "rash", "swelling", "edema",
-            "hypertension", "high blood pressure", "low blood pressure", "hypotension",
-            "tachycardia", "bradycardia", "arrhythmia", "palpitations",
-            "insomnia", "anxiety", "depression", "confusion"
-        ]
-        
-        # Check for specific symptoms in the query
-        found_symptoms = []
-        for symptom in common_symptoms:
-            if re.search(r"\b" + symptom + r"\b", query.lower()):
-                found_symptoms.append(symptom)
+        # Find the common medical symptoms mentioned in the query, in one pass
+        found_symptoms = list(dict.fromkeys(match.lower() for match in _SYMPTOM_RE.findall(query)))
         
         if found_symptoms:
             # Create a more focused query with the identified symptoms
             focused_query = " AND ".join([f"\"{s}\"[Title/Abstract]" for s in found_symptoms])
-            logger.info(f"Found specific symptoms: {found_symptoms}")
-            logger.info(f"Created focused query: {focused_query}")
+            logger.debug("Found specific symptoms: %s", found_symptoms)
+            logger.debug("Created focused query: %s", focused_query)
             return focused_query
         else:
             # If no common symptoms found, use the original query
             return query
     
-    def _run(self, query: str, max_results: int = 10) -> List[Dict[str, Any]]:
-        """Execute the PubMed search with the given query using direct API requests.
+    @staticmethod
+    def _new_http_client() -> httpx.AsyncClient:
+        """Create an HTTP client for the E-Utilities API."""
+        return httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=20),
+            timeout=LITERATURE_API_TIMEOUT
+        )
+    
+    @retry_transient_http
+    async def _get(self, client: httpx.AsyncClient, url: str, params: Dict[str, Any]) -> bytes:
+        """GET an E-Utilities URL, reusing the cached body when the server answers 304 Not Modified.
+        
+        Requests are spaced by the rate limiter; network errors, 429s and 5xx
+        responses are retried with exponential backoff.
+        """
+        request_url = str(client.build_request("GET", url, params=params).url)
+        cached = self._etag_cache.get(request_url)
+        headers = {"If-None-Match": cached[0]} if cached else {}
+        
+        await self._rate_limiter.acquire()
+        response = await client.get(url, params=params, headers=headers)
+        if response.status_code == 304 and cached:
+            return cached[1]
+        response.raise_for_status()  # Raise an exception for HTTP errors
+        
+        etag = response.headers.get("ETag")
+        if etag:
+            self._etag_cache[request_url] = (etag, response.content)
+        return response.content
+    
+    @retry_transient_http
+    async def _post(self, client: httpx.AsyncClient, url: str, data: Dict[str, Any]) -> bytes:
+        """POST form parameters to an E-Utilities URL, for ID lists too long for a query string.
+        
+        Rate-limited and retried like :meth:`_get`; POST responses are not cached.
+        """
+        await self._rate_limiter.acquire()
+        response = await client.post(url, data=data)
+        response.raise_for_status()
+        return response.content
+    
+    def _run(self, query: str, max_results: int = 10, need_abstract: bool = True) -> List[Dict[str, Any]]:
+        """Execute the PubMed search synchronously.
+        
+        Kept for callers outside an event loop; uses a short-lived client because
+        the shared one is bound to the loop that first used it.
         
         Args:
             query: The search query for PubMed
             max_results: Maximum number of results to return
+            need_abstract: Whether to fetch abstracts, keywords and MeSH terms
             
         Returns:
             List of dictionaries containing article information
         """
-        try:
-            logger.info(f"\n{'='*80}\nPUBMED SEARCH QUERY\n{'='*80}")
-            logger.info(f"Starting PubMed search for query: '{query}' (max_results={max_results})")
+        async def run_once():
+            async with self._new_http_client() as client:
+                return await self._search(client, query, max_results, need_abstract)
+        
+        return asyncio.run(run_once())
+    
+    async def _arun(self, query: str, max_results: int = 5, need_abstract: bool = True) -> List[Dict[str, Any]]:
+        """Execute the PubMed search on the shared connection pool.
+        
+        Args:
+            query: The search query for PubMed
+            max_results: Maximum number of results to return
+            need_abstract: Whether to fetch abstracts, keywords and MeSH terms
             
-            # Step 1: Process the query to optimize for medical search
-            processed_query = self._process_medical_query(query)
+        Returns:
+            List of dictionaries containing article information
+        """
+        return await self._search(self._http, query, max_results, need_abstract)
+    
+    async def _search(self, client: httpx.AsyncClient, query: str, max_results: int,
+                      need_abstract: bool = True) -> List[Dict[str, Any]]:
+        """Search PubMed and fetch article details using the given client.
+        
+        esearch and efetch run one after the other because efetch needs the IDs
+        that esearch returns. Callers that don't need abstracts get the much
+        smaller esummary JSON instead of the efetch XML.
+        
+        Args:
+            client: HTTP client to send the requests with
+            query: The search query for PubMed
+            max_results: Maximum number of results to return
+            need_abstract: Whether to fetch abstracts, keywords and MeSH terms
             
-            # Step 2: Search for articles using esearch
-            search_params = {
-                "db": "pubmed",
-                "term": processed_query,
-                "retmax": max_results,
-                "retmode": "json",
-                "sort": "relevance",
-                "tool": self.tool,
-                "email": self.email
-            }
+        Returns:
+            List of dictionaries containing article information
+        """
+        try:
+            logger.debug("Starting PubMed search for query: '%s' (max_results=%d)", query, max_results)
             
+            # Step 1: Search for articles using esearch
             try:
-                logger.info(f"Sending esearch request to: {self.search_url}")
-                search_response = requests.get(self.search_url, params=search_params)
-                search_response.raise_for_status()  # Raise an exception for HTTP errors
-                
-                search_data = search_response.json()
-                id_list = search_data.get("esearchresult", {}).get("idlist", [])
-                
-                logger.info(f"esearch results: Found {len(id_list)} articles")
-                logger.info(f"Article IDs: {id_list}")
-                
+                id_list = await self._esearch(client, query, max_results)
                 if not id_list:
-                    logger.warning(f"No PubMed results found for query: {query}")
+                    logger.warning("No PubMed results found for query: %s", query)
                     return [{"info": f"No results found for query: {query}"}]
                 
-            except requests.exceptions.RequestException as e:
+            except httpx.HTTPError as e:
                 logger.error(f"Error in esearch request: {str(e)}")
                 return [{"error": f"Error searching PubMed: {str(e)}"}]
-            except json.JSONDecodeError as e:
+            except orjson.JSONDecodeError as e:
                 logger.error(f"Error parsing JSON response: {str(e)}")
                 return [{"error": f"Error parsing PubMed response: {str(e)}"}]
             
-            # Step 2: Fetch detailed article information using efetch
-            id_string = ",".join(id_list)
-            fetch_params = {
-                "db": "pubmed",
-                "id": id_string,
-                "retmode": "xml",
-                "tool": self.tool,
-                "email": self.email
-            }
+            if not need_abstract:
+                return await self._fetch_summaries(client, id_list)
             
+            # Step 2: Fetch detailed article information using efetch
             try:
-                logger.info(f"Sending efetch request to: {self.fetch_url}")
-                fetch_response = requests.get(self.fetch_url, params=fetch_params)
-                fetch_response.raise_for_status()
-                
-                # Parse XML response
-                root = ElementTree.fromstring(fetch_response.content)
-                logger.info(f"Successfully received and parsed XML response")
-                
-            except requests.exceptions.RequestException as e:
+                articles = await self._fetch_articles(client, id_list)
+            except httpx.HTTPError as e:
                 logger.error(f"Error in efetch request: {str(e)}")
                 return [{"error": f"Error fetching article details: {str(e)}"}]
-            except ElementTree.ParseError as e:
+            except etree.XMLSyntaxError as e:
                 logger.error(f"Error parsing XML: {str(e)}")
                 return [{"error": f"Error parsing XML response: {str(e)}"}]
             
-            # Step 3: Extract structured data from the XML
-            formatted_results = []
+            # Keep esearch's relevance order
+            formatted_results = [articles[pmid] for pmid in id_list if pmid in articles]
             
-            for article in root.findall(".//PubmedArticle"):
-                try:
-                    # Extract basic metadata
-                    pmid = article.findtext(".//PMID")
-                    title = article.findtext(".//ArticleTitle") or "No title available"
-                    
-                    # Extract abstract (may be segmented)
-                    abstract_elements = article.findall(".//AbstractText")
-                    abstract_parts = []
-                    for abstract_elem in abstract_elements:
-                        label = abstract_elem.get("Label", "")
-                        text = abstract_elem.text or ""
-                        if label:
-                            abstract_parts.append(f"{label}: {text}")
-                        else:
-                            abstract_parts.append(text)
-                    
-                    abstract = " ".join(abstract_parts) if abstract_parts else "No abstract available"
-                    
-                    # Extract journal information
-                    journal = article.findtext(".//Journal/Title") or "N/A"
-                    
-                    # Extract publication date
-                    year = article.findtext(".//PubDate/Year")
-                    month = article.findtext(".//PubDate/Month")
-                    day = article.findtext(".//PubDate/Day")
-                    
-                    if year:
-                        date = year
-                        if month:
-                            date = f"{month} {date}"
-                        if day:
-                            date = f"{day} {date}"
-                    else:
-                        date = article.findtext(".//PubDate/MedlineDate") or "N/A"
-                    
-                    # Extract authors
-                    authors = []
-                    for author in article.findall(".//Author"):
-                        last_name = author.findtext("LastName") or ""
-                        fore_name = author.findtext("ForeName") or ""
-                        initials = author.findtext("Initials") or ""
-                        
-                        if last_name:
-                            if fore_name:
-                                authors.append(f"{last_name} {fore_name}")
-                            elif initials:
-                                authors.append(f"{last_name} {initials}")
-                            else:
-                                authors.append(last_name)
-                    
-                    author_string = ", ".join(authors) if authors else "No authors listed"
-                    
-                    # Extract keywords
-                    keywords = []
-                    for keyword in article.findall(".//Keyword"):
-                        if keyword.text:
-                            keywords.append(keyword.text)
-                    
-                    # Extract MeSH terms for better metadata
-                    mesh_terms = []
-                    for mesh in article.findall(".//MeshHeading"):
-                        descriptor = mesh.findtext("DescriptorName")
-                        if descriptor:
-                            mesh_terms.append(descriptor)
-                    
-                    # Create a detailed article object with enhanced metadata
-                    article_data = {
-                        "pmid": pmid,
-                        "title": title,
-                        "abstract": abstract,
-                        "date": date,
-                        "authors": author_string,
-                        "journal": journal,
-                        "keywords": keywords,
-                        "mesh_terms": mesh_terms,
-                        "url": f"https://pubmed.ncbi.nlm.nih.gov/{pmid}/"
-                    }
-                    
-                    formatted_results.append(article_data)
-                    
-                except Exception as parse_error:
-                    logger.error(f"Error parsing article: {str(parse_error)}")
-                    # Continue to next article
+            logger.debug("Found %d relevant articles for query: '%s'", len(formatted_results), query)
             
             # Print detailed information about each article
-            logger.info(f"\n{'='*80}\nPUBMED SEARCH RESULTS\n{'='*80}")
-            logger.info(f"Query: '{query}'")
-            logger.info(f"Found {len(formatted_results)} relevant articles\n")
-            
-            for idx, result in enumerate(formatted_results):
-                logger.info(f"ARTICLE {idx+1}:\n{'-'*50}")
-                logger.info(f"Title: {result['title']}")
-                logger.info(f"Authors: {result['authors']}")
-                logger.info(f"Journal: {result['journal']}")
-                logger.info(f"Date: {result['date']}")
-                logger.info(f"PMID: {result['pmid']}")
-                logger.info(f"URL: {result['url']}")
-                
-                # Show MeSH terms if available
-                if result.get('mesh_terms'):
-                    logger.info(f"MeSH Terms: {', '.join(result['mesh_terms'][:5])}" + 
-                               ("..." if len(result['mesh_terms']) > 5 else ""))
-                
-                # Print a trimmed version of the abstract for readability
-                abstract = result['abstract']
-                if len(abstract) > 300:
-                    abstract = abstract[:300] + "..."
-                logger.info(f"Abstract Summary: {abstract}\n")
-            
-            logger.info(f"{'='*80}\nEnd of PubMed Search Results\n{'='*80}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("\n%s\nPUBMED SEARCH RESULTS\n%s", '='*80, '='*80)
+                for idx, result in enumerate(formatted_results):
+                    logger.debug("ARTICLE %d:\n%s", idx + 1, '-'*50)
+                    logger.debug("Title: %s", result['title'])
+                    logger.debug("Authors: %s", result['authors'])
+                    logger.debug("Journal: %s", result['journal'])
+                    logger.debug("Date: %s", result['date'])
+                    logger.debug("PMID: %s", result['pmid'])
+                    logger.debug("URL: %s", result['url'])
+                    
+                    # Show MeSH terms if available
+                    if result.get('mesh_terms'):
+                        logger.debug("MeSH Terms: %s%s", ', '.join(result['mesh_terms'][:5]),
+                                     "..." if len(result['mesh_terms']) > 5 else "")
+                    
+                    # Print a trimmed version of the abstract for readability
+                    abstract = result['abstract']
+                    if len(abstract) > 300:
+                        abstract = abstract[:300] + "..."
+                    logger.debug("Abstract Summary: %s\n", abstract)
                 
             return formatted_results
             
@@ -268,7 +257,263 @@ class PubMedTool:
             logger.error(f"Error searching PubMed: {str(e)}")
             return [{"error": f"Error searching PubMed: {str(e)}"}]
     
-    async def _arun(self, query: str, max_results: int = 5) -> List[Dict[str, Any]]:
-        """Async implementation of the PubMed search."""
-        # For simplicity, we're just calling the sync version
-        return self._run(query, max_results)
+    async def _esearch(self, client: httpx.AsyncClient, query: str, max_results: int) -> List[str]:
+        """Return the PMIDs esearch finds for a query, most relevant first.
+        
+        Raises:
+            httpx.HTTPError: If the request fails
+            orjson.JSONDecodeError: If the response is not valid JSON
+        """
+        # Process the query to optimize for medical search
+        search_params = {
+            "db": "pubmed",
+            "term": self._process_medical_query(query),
+            "retmax": max_results,
+            "retmode": "json",
+            "sort": "relevance",
+            **self._common_params
+        }
+        
+        logger.debug("Sending esearch request to: %s", self.search_url)
+        search_data = orjson.loads(await self._get(client, self.search_url, search_params))
+        id_list = search_data.get("esearchresult", {}).get("idlist", [])
+        
+        logger.debug("esearch results: Found %d articles", len(id_list))
+        logger.debug("Article IDs: %s", id_list)
+        return id_list
+    
+    async def _fetch_articles(self, client: httpx.AsyncClient, id_list: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Fetch and parse articles by PMID, skipping the ones already in the article cache.
+        
+        The missing articles are requested with a single efetch call: a GET for up
+        to EFETCH_GET_MAX_IDS IDs, otherwise a POST carrying the IDs in its body.
+        
+        Args:
+            client: HTTP client to send the requests with
+            id_list: PMIDs to fetch
+            
+        Returns:
+            Parsed articles by PMID; articles that could not be parsed are left out
+            
+        Raises:
+            httpx.HTTPError: If an efetch request fails
+            etree.XMLSyntaxError: If a response is not valid XML
+        """
+        articles = {}
+        missing_ids = []
+        for pmid in dict.fromkeys(id_list):
+            article = self._article_cache.get(pmid)
+            if article is None:
+                missing_ids.append(pmid)
+            else:
+                articles[pmid] = article
+        
+        if not missing_ids:
+            logger.debug("All articles served from the article cache")
+            return articles
+        
+        fetch_params = {"db": "pubmed", "id": ",".join(missing_ids), "retmode": "xml", **self._common_params}
+        logger.debug("Sending efetch request to: %s for %d articles", self.fetch_url, len(missing_ids))
+        if len(missing_ids) <= EFETCH_GET_MAX_IDS:
+            fetch_content = await self._get(client, self.fetch_url, fetch_params)
+        else:
+            # Stays clear of URL length limits, in one request instead of several rate-limited ones
+            fetch_content = await self._post(client, self.fetch_url, fetch_params)
+        
+        # Extract structured data from the XML, one article at a time,
+        # freeing each article's elements once parsed instead of building the full tree
+        for _, article in etree.iterparse(io.BytesIO(fetch_content), tag="PubmedArticle",
+                                          resolve_entities=False):
+            try:
+                article_data = self._parse_article(article)
+                articles[article_data["pmid"]] = self._article_cache[article_data["pmid"]] = article_data
+            except Exception as parse_error:
+                logger.error(f"Error parsing article: {str(parse_error)}")
+                # Continue to next article
+            article.clear(keep_tail=True)
+            while article.getprevious() is not None:
+                del article.getparent()[0]
+        return articles
+    
+    async def _arun_batch(self, queries: List[str], max_results: int = 5) -> List[List[Dict[str, Any]]]:
+        """Search PubMed for several queries at once on the shared connection pool.
+        
+        The esearch calls run concurrently and the articles of all the queries are
+        then fetched together, so articles shared between queries are fetched once.
+        
+        Args:
+            queries: The search queries
+            max_results: Maximum number of results to return per query
+            
+        Returns:
+            One result list per query, in the same format as :meth:`_arun`
+        """
+        client = self._http
+        id_lists = await asyncio.gather(*(self._esearch(client, query, max_results) for query in queries),
+                                        return_exceptions=True)
+        
+        try:
+            all_ids = [pmid for id_list in id_lists if isinstance(id_list, list) for pmid in id_list]
+            articles = await self._fetch_articles(client, all_ids)
+            fetch_error = None
+        except Exception as e:
+            logger.error(f"Error fetching article details: {str(e)}")
+            articles, fetch_error = {}, e
+        
+        results = []
+        for query, id_list in zip(queries, id_lists):
+            if isinstance(id_list, Exception):
+                results.append([{"error": f"Error searching PubMed: {str(id_list)}"}])
+            elif not id_list:
+                results.append([{"info": f"No results found for query: {query}"}])
+            elif fetch_error is not None:
+                results.append([{"error": f"Error fetching article details: {str(fetch_error)}"}])
+            else:
+                results.append([articles[pmid] for pmid in id_list if pmid in articles])
+        return results
+    
+    @staticmethod
+    def _parse_article(article) -> Dict[str, Any]:
+        """Extract an article's details from its efetch PubmedArticle element.
+        
+        Args:
+            article: The PubmedArticle element (lxml)
+            
+        Returns:
+            Dictionary containing the article information
+        """
+        pmid = None
+        title = None
+        journal = None
+        pub_date = {}
+        abstract_parts = []
+        abstract_chars = 0
+        authors = []
+        keywords = []
+        mesh_terms = []
+        
+        # Collect every field in a single walk over the article's elements; lxml filters
+        # the elements by tag in C, so the reference list, affiliations etc. are skipped
+        for elem in article.iter(*_ARTICLE_FIELD_TAGS):
+            tag = elem.tag
+            if tag == "PMID":
+                # The article's own PMID comes first; later ones are cited articles
+                if pmid is None:
+                    pmid = elem.text
+            elif tag == "ArticleTitle":
+                if title is None:
+                    title = elem.text
+            elif tag == "AbstractText":
+                # Extract abstract (may be segmented), stopping once it is long enough
+                if abstract_chars < MAX_ABSTRACT_CHARS:
+                    label = elem.get("Label", "")
+                    text = (elem.text or "")[:MAX_ABSTRACT_CHARS - abstract_chars]
+                    part = f"{label}: {text}" if label else text
+                    abstract_parts.append(part)
+                    abstract_chars += len(part) + 1
+            elif tag == "Title":
+                # Extract journal information
+                if journal is None and elem.getparent().tag == "Journal":
+                    journal = elem.text
+            elif tag in ("Year", "Month", "Day", "MedlineDate"):
+                # Extract publication date
+                if tag not in pub_date and elem.getparent().tag == "PubDate":
+                    pub_date[tag] = elem.text
+            elif tag == "Author":
+                last_name = elem.findtext("LastName") or ""
+                fore_name = elem.findtext("ForeName") or ""
+                initials = elem.findtext("Initials") or ""
+                
+                if last_name:
+                    if fore_name:
+                        authors.append(f"{last_name} {fore_name}")
+                    elif initials:
+                        authors.append(f"{last_name} {initials}")
+                    else:
+                        authors.append(last_name)
+            elif tag == "Keyword":
+                if elem.text:
+                    keywords.append(elem.text)
+            elif tag == "MeshHeading":
+                # Extract MeSH terms for better metadata
+                descriptor = elem.findtext("DescriptorName")
+                if descriptor:
+                    mesh_terms.append(descriptor)
+        
+        title = title or "No title available"
+        abstract = " ".join(abstract_parts) if abstract_parts else "No abstract available"
+        journal = journal or "N/A"
+        
+        year = pub_date.get("Year")
+        if year:
+            date = year
+            if pub_date.get("Month"):
+                date = f"{pub_date['Month']} {date}"
+            if pub_date.get("Day"):
+                date = f"{pub_date['Day']} {date}"
+        else:
+            date = pub_date.get("MedlineDate") or "N/A"
+        
+        author_string = ", ".join(authors) if authors else "No authors listed"
+        
+        # Create a detailed article object with enhanced metadata
+        article_data = {
+            "pmid": pmid,
+            "title": title,
+            "abstract": abstract,
+            "date": date,
+            "authors": author_string,
+            "journal": journal,
+            "keywords": keywords,
+            "mesh_terms": mesh_terms,
+            "url": f"https://pubmed.ncbi.nlm.nih.gov/{pmid}/"
+        }
+        
+        return article_data
+    
+    async def _fetch_summaries(self, client: httpx.AsyncClient, id_list: List[str]) -> List[Dict[str, Any]]:
+        """Fetch article metadata for PMIDs from esummary, without abstracts.
+        
+        Args:
+            client: HTTP client to send the request with
+            id_list: PMIDs returned by esearch
+            
+        Returns:
+            List of dictionaries in the same format as the efetch results
+        """
+        summary_params = {
+            "db": "pubmed",
+            "id": ",".join(id_list),
+            "retmode": "json",
+            **self._common_params
+        }
+        
+        try:
+            logger.debug("Sending esummary request to: %s", self.summary_url)
+            summary_data = orjson.loads(await self._get(client, self.summary_url, summary_params))
+        except httpx.HTTPError as e:
+            logger.error(f"Error in esummary request: {str(e)}")
+            return [{"error": f"Error fetching article details: {str(e)}"}]
+        except orjson.JSONDecodeError as e:
+            logger.error(f"Error parsing JSON response: {str(e)}")
+            return [{"error": f"Error parsing PubMed response: {str(e)}"}]
+        
+        result = summary_data.get("result", {})
+        formatted_results = []
+        for pmid in result.get("uids", []):
+            summary = result.get(pmid, {})
+            authors = [author.get("name") for author in summary.get("authors", []) if author.get("name")]
+            formatted_results.append({
+                "pmid": pmid,
+                "title": summary.get("title") or "No title available",
+                "abstract": "No abstract available",
+                "date": summary.get("pubdate") or "N/A",
+                "authors": ", ".join(authors) if authors else "No authors listed",
+                "journal": summary.get("fulljournalname") or "N/A",
+                "keywords": [],
+                "mesh_terms": [],
+                "url": f"https://pubmed.ncbi.nlm.nih.gov/{pmid}/"
+            })
+        
+        logger.debug("Found %d article summaries", len(formatted_results))
+        return formatted_results
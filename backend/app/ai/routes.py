@@ -1,418 +1,533 @@
 """Routes for the AI symptom assessment functionality."""
-import json
 import logging
-from flask import Blueprint, jsonify, request, current_app
+import threading
+from functools import lru_cache
+import orjson
+from flask import Blueprint, Response, jsonify, request, current_app, stream_with_context
 import re
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import load_only
+from cachetools import TTLCache
 
 from .. import db
-from ..models import SymptomAssessment, PubMedReference, ClinicalTrial, MedicalDocument, Profile, Appointment
-from .agent import SymptomAssessmentAgent
+from ..models import SymptomAssessment, PubMedReference, ClinicalTrial, MedicalDocument, Profile, Appointment, UrgencyLevel
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Create Blueprint
 ai_bp = Blueprint('ai', __name__, url_prefix='/api/ai')
 
-# Initialize the symptom assessment agent
-symptom_agent = None
+# Matches a message naming a patient profile, e.g. "Patient Jane Doe reports: ..."
+_PATIENT_MENTION_RE = re.compile(r"Patient ([\w\s]+) reports:")
 
-# In Flask 2.3+, before_app_first_request is deprecated
-# Instead, we'll initialize the agent when needed
-def initialize_agent():
-    """Initialize the symptom assessment agent if not already initialized."""
-    global symptom_agent
-    if symptom_agent is None:
-        symptom_agent = SymptomAssessmentAgent()
-        logger.info("Symptom Assessment Agent initialized")
-        
-# Register with blueprint to initialize when first route is called
-@ai_bp.before_request
-def before_request():
-    initialize_agent()
+# Terms in an assessment's urgency level or description that mark it urgent
+_URGENT_TERMS_RE = re.compile(r"high|emergency|urgent|immediate|severe")
+
+# The profile columns an assessment reads, so the other ~30 aren't loaded
+_ASSESSMENT_PROFILE_COLUMNS = load_only(Profile.id, Profile.first_name, Profile.last_name, Profile.date_of_birth, Profile.gender,
+                                        Profile.medical_history, Profile.chronic_conditions, Profile.allergies,
+                                        Profile.medications, Profile.surgical_history)
+
+# Page size for GET /assessments when the client asks for pages
+DEFAULT_ASSESSMENTS_PER_PAGE = 50
+MAX_ASSESSMENTS_PER_PAGE = 100
+
+# Serialized GET /assessments/<id> responses; saved assessments are never modified
+ASSESSMENT_CACHE_TTL = 300  # seconds
+_assessment_cache = TTLCache(maxsize=1024, ttl=ASSESSMENT_CACHE_TTL)
+_assessment_cache_lock = threading.Lock()
+
+# Upper bound on cases per batch request, so one request can't monopolise the OpenAI throttle
+MAX_BATCH_CASES = 50
+
+# Guards creation of the shared agent when the first requests arrive concurrently
+_agent_lock = threading.Lock()
+
+def get_symptom_agent():
+    """Return the application's shared symptom assessment agent.
+    
+    The agent (and the OpenAI SDK it imports) is created on first use rather
+    than in create_app, so app startup and CLI commands don't pay for it.
+    """
+    agent = current_app.extensions.get('symptom_agent')
+    if agent is None:
+        with _agent_lock:
+            agent = current_app.extensions.get('symptom_agent')
+            if agent is None:
+                from .agent import SymptomAssessmentAgent
+                agent = SymptomAssessmentAgent(model=current_app.config['OPENAI_MODEL'],
+                                               max_concurrent_requests=current_app.config['OPENAI_CONCURRENCY'])
+                current_app.extensions['symptom_agent'] = agent
+    return agent
 
 @ai_bp.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint for the AI service."""
     return jsonify({"status": "healthy", "service": "symptom-assessment"})
 
-@ai_bp.route('/assess-symptoms', methods=['POST'])
-def assess_symptoms():
-    """Endpoint to assess patient symptoms using the AI agent."""
+def _format_sse(event: str, data) -> str:
+    """Format a server-sent event with a JSON payload."""
+    return f"event: {event}\ndata: {orjson.dumps(data).decode()}\n\n"
+
+def _assessment_event_stream(events, symptoms, age, sex, medical_history, patient_id, patient_profile):
+    """Relay model output as ``delta`` events, then send the saved assessment.
+    
+    Args:
+        events: Iterator of (event, data) tuples from the agent's stream_assessment
+        symptoms, age, sex, medical_history, patient_id, patient_profile: Request details used to save the assessment
+        
+    Yields:
+        Server-sent event strings
+    """
     try:
-        # Get request data
-        data = request.get_json()
+        for event, data in events:
+            if event == 'delta':
+                yield _format_sse('delta', {"content": data})
+            else:
+                payload, status = _finalize_assessment(data, symptoms, age, sex, medical_history, patient_id, patient_profile)
+                yield _format_sse('error' if status >= 400 else 'assessment', payload)
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error streaming symptom assessment: {str(e)}")
+        yield _format_sse('error', {"error": f"Failed to process symptom assessment: {str(e)}"})
+
+@lru_cache(maxsize=1)
+def _fallback_profile_id():
+    """Id of the profile given appointments for requests without a patient, looked up once per process."""
+    profile = db.session.query(Profile.id).order_by(Profile.id).first()
+    return profile.id if profile else None
+
+def _finalize_assessment(assessment, symptoms, age, sex, medical_history, patient_id, patient_profile):
+    """Save a medical assessment (and any urgent appointment) and build the response payload.
+    
+    Returns:
+        Tuple of (response dict, HTTP status code)
+    """
+    # Check for errors in assessment
+    if 'error' in assessment:
+        logger.error(f"Error in symptom assessment: {assessment['error']}")
+        return {"error": assessment['error']}, 500
+    
+    # Use the LLM classification to determine if this is a medical query
+    is_medical_query = assessment.get('is_medical_query', False)
+    classification_reason = assessment.get('classification_reason', 'Not provided')
+    
+    # Log classification results
+    logger.debug("Medical query classification: %s - %s", is_medical_query, classification_reason)
+    
+    # Save to database only if it's a medical query according to the LLM
+    if is_medical_query:
+        logger.debug("Saving medical assessment to database")
         
-        if not data or 'symptoms' not in data:
-            return jsonify({"error": "Symptoms are required"}), 400
+        # We'll skip document handling since the column doesn't exist in the database
+        if 'used_document_ids' in assessment and assessment['used_document_ids']:
+            logger.debug("Assessment used %d patient documents, but we're not storing this data", len(assessment['used_document_ids']))
         
-        symptoms = data.get('symptoms')
-        age = data.get('age')
-        sex = data.get('sex')
-        medical_history = data.get('medical_history')
-        patient_id = data.get('patient_id')
+        new_assessment = SymptomAssessment(
+            patient_id=patient_id,
+            symptoms=symptoms,
+            age=age,
+            sex=sex,
+            medical_history=medical_history,
+            urgency_level=assessment['urgency_level'],
+            urgency_description=assessment['urgency_description'],
+            reasoning=assessment['reasoning'],
+            recommendations=assessment['recommendations'],
+            dos=assessment.get('dos', []),
+            donts=assessment.get('donts', []),
+            disclaimer=assessment['disclaimer']
+            # used_documents field is omitted
+        )
         
-        # Check if message mentions a patient profile by name
-        patient_profile = None
-        patient_mention_regex = r"Patient ([\w\s]+) reports:"
-        patient_mention = re.search(patient_mention_regex, symptoms)
+        db.session.add(new_assessment)
+        # Flush to get the assessment's id; everything below is committed together at the end
+        db.session.flush()
         
-        if patient_mention:
-            patient_name = patient_mention.group(1).strip()
-            logger.info(f"Message mentions patient: {patient_name}")
-            
-            # Try to find this patient in the database
-            name_parts = patient_name.split()
-            if len(name_parts) >= 2:
-                # Assume first part is first name, rest is last name
-                first_name = name_parts[0]
-                last_name = ' '.join(name_parts[1:])
-                
-                patient_profile = Profile.query.filter(
-                    Profile.first_name == first_name,
-                    Profile.last_name == last_name
-                ).first()
-                
-                if patient_profile:
-                    logger.info(f"Found matching profile for {patient_name} (ID: {patient_profile.id})")
-                    # Update patient_id to use this profile
-                    patient_id = str(patient_profile.id)
-                    
-                    # Update demographic information if not provided
-                    if not age and patient_profile.age:
-                        age = patient_profile.age
-                    if not sex and patient_profile.gender:
-                        sex = patient_profile.gender
-                    
-                    # Add medical history from profile if available
-                    profile_medical_info = []
-                    
-                    if patient_profile.medical_history:
-                        profile_medical_info.append(f"Medical History: {patient_profile.medical_history}")
-                    
-                    if patient_profile.chronic_conditions:
-                        try:
-                            conditions = json.loads(patient_profile.chronic_conditions)
-                            if conditions:
-                                profile_medical_info.append(f"Chronic Conditions: {', '.join(conditions)}")
-                        except:
-                            pass
-                    
-                    if patient_profile.allergies:
-                        try:
-                            allergies = json.loads(patient_profile.allergies)
-                            if allergies:
-                                profile_medical_info.append(f"Allergies: {', '.join(allergies)}")
-                        except:
-                            pass
-                    
-                    if patient_profile.medications:
-                        try:
-                            medications = json.loads(patient_profile.medications)
-                            if medications:
-                                meds_list = [f"{med.get('name')} {med.get('dosage')} {med.get('frequency')}" 
-                                            for med in medications if 'name' in med]
-                                profile_medical_info.append(f"Medications: {', '.join(meds_list)}")
-                        except:
-                            pass
-                    
-                    if patient_profile.surgical_history:
-                        try:
-                            surgical_history = json.loads(patient_profile.surgical_history)
-                            if surgical_history:
-                                surgeries = [f"{s.get('procedure')} ({s.get('date')})" 
-                                            for s in surgical_history if 'procedure' in s]
-                                profile_medical_info.append(f"Surgical History: {', '.join(surgeries)}")
-                        except:
-                            pass
-                    
-                    # Combine with any provided medical history
-                    if profile_medical_info:
-                        profile_medical_string = "\n".join(profile_medical_info)
-                        if medical_history:
-                            medical_history = f"{medical_history}\n\nAdditional information from patient profile:\n{profile_medical_string}"
-                        else:
-                            medical_history = f"Information from patient profile:\n{profile_medical_string}"
+        # Save the PubMed references
+        pubmed_refs = assessment.get('pubmed_references', [])
+        logger.debug("PubMed references found for medical query: %d", len(pubmed_refs))
+        if pubmed_refs:
+            logger.debug("PubMed references details: %s", pubmed_refs)
         
-        # If patient_id is provided but we don't have a profile yet, try to fetch it
-        elif patient_id and not patient_profile:
-            try:
-                patient_id_int = int(patient_id) 
-                patient_profile = Profile.query.get(patient_id_int)
-                
-                if patient_profile:
-                    logger.info(f"Found profile for patient ID {patient_id}")
-                    
-                    # Update demographic information if not provided
-                    if not age and patient_profile.age:
-                        age = patient_profile.age
-                    if not sex and patient_profile.gender:
-                        sex = patient_profile.gender
-                    
-                    # Add medical history from profile if available (same logic as above)
-                    profile_medical_info = []
-                    
-                    if patient_profile.medical_history:
-                        profile_medical_info.append(f"Medical History: {patient_profile.medical_history}")
-                    
-                    if patient_profile.chronic_conditions:
-                        try:
-                            conditions = json.loads(patient_profile.chronic_conditions)
-                            if conditions:
-                                profile_medical_info.append(f"Chronic Conditions: {', '.join(conditions)}")
-                        except:
-                            pass
-                    
-                    if patient_profile.allergies:
-                        try:
-                            allergies = json.loads(patient_profile.allergies)
-                            if allergies:
-                                profile_medical_info.append(f"Allergies: {', '.join(allergies)}")
-                        except:
-                            pass
-                    
-                    if patient_profile.medications:
-                        try:
-                            medications = json.loads(patient_profile.medications)
-                            if medications:
-                                meds_list = [f"{med.get('name')} {med.get('dosage')} {med.get('frequency')}" 
-                                            for med in medications if 'name' in med]
-                                profile_medical_info.append(f"Medications: {', '.join(meds_list)}")
-                        except:
-                            pass
-                    
-                    if patient_profile.surgical_history:
-                        try:
-                            surgical_history = json.loads(patient_profile.surgical_history)
-                            if surgical_history:
-                                surgeries = [f"{s.get('procedure')} ({s.get('date')})" 
-                                            for s in surgical_history if 'procedure' in s]
-                                profile_medical_info.append(f"Surgical History: {', '.join(surgeries)}")
-                        except:
-                            pass
-                    
-                    # Combine with any provided medical history
-                    if profile_medical_info:
-                        profile_medical_string = "\n".join(profile_medical_info)
-                        if medical_history:
-                            medical_history = f"{medical_history}\n\nAdditional information from patient profile:\n{profile_medical_string}"
-                        else:
-                            medical_history = f"Information from patient profile:\n{profile_medical_string}"
-            except (ValueError, TypeError):
-                pass  # Patient ID not a valid integer, or profile not found
+        # Insert all the references in one statement rather than one INSERT per object,
+        # returning the saved rows for the response
+        references = []
+        if pubmed_refs:
+            references = db.session.execute(insert(PubMedReference).returning(
+                *PubMedReference.__table__.c, sort_by_parameter_order=True), [{
+                "assessment_id": new_assessment.id,
+                "pmid": ref.get('pmid'),
+                "title": ref.get('title'),
+                "abstract": ref.get('abstract'),
+                "date": ref.get('date')
+            } for ref in pubmed_refs]).all()
+            
+        # Save the Clinical Trials
+        clinical_trials = assessment.get('clinical_trials', [])
+        logger.debug("Clinical trials found for medical query: %d", len(clinical_trials))
+        if clinical_trials:
+            logger.debug("Clinical trials details: %s", clinical_trials)
         
-        # Initialize agent if not already initialized
-        global symptom_agent
-        if symptom_agent is None:
-            symptom_agent = SymptomAssessmentAgent()
+        trial_rows = []
+        for trial in clinical_trials:
+            # Always store conditions as a JSON list, so reading them back can't fail
+            conditions = trial.get('conditions') or []
+            conditions_json = orjson.dumps(conditions if isinstance(conditions, list) else [conditions]).decode()
             
-        # Call the agent to assess symptoms
-        logger.info(f"Assessing symptoms: {symptoms}")
-        assessment = symptom_agent.assess_symptoms(symptoms, age, sex, medical_history, patient_id)
+            trial_rows.append({
+                "assessment_id": new_assessment.id,
+                "nct_id": trial.get('nct_id'),
+                "title": trial.get('title'),
+                "status": trial.get('status'),
+                "phase": trial.get('phase'),
+                "summary": trial.get('summary'),
+                "conditions": conditions_json,
+                "start_date": trial.get('start_date'),
+                "completion_date": trial.get('completion_date'),
+                "url": trial.get('url')
+            })
+        trials = []
+        if trial_rows:
+            trials = db.session.execute(insert(ClinicalTrial).returning(
+                *ClinicalTrial.__table__.c, sort_by_parameter_order=True), trial_rows).all()
         
-        # Check for errors in assessment
-        if 'error' in assessment:
-            logger.error(f"Error in symptom assessment: {assessment['error']}")
-            return jsonify({"error": assessment['error']}), 500
         
-        # Use the LLM classification to determine if this is a medical query
-        is_medical_query = assessment.get('is_medical_query', False)
-        classification_reason = assessment.get('classification_reason', 'Not provided')
+        # Create appointment for emergency/urgent cases - expanded condition to catch more urgency levels
+        urgency = assessment['urgency_level'].lower()
+        logger.debug("Checking urgency level for appointment creation: %s", urgency)
         
-        # Log classification results
-        logger.info(f"Medical query classification: {is_medical_query} - {classification_reason}")
+        # Check for various urgent terms that might be in the urgency level or description
+        is_urgent = bool(_URGENT_TERMS_RE.search(f"{urgency} {assessment['urgency_description']}".lower()))
         
-        # Save to database only if it's a medical query according to the LLM
-        if is_medical_query:
-            logger.info("Saving medical assessment to database")
-            
-            # We'll skip document handling since the column doesn't exist in the database
-            if 'used_document_ids' in assessment and assessment['used_document_ids']:
-                logger.info(f"Assessment used {len(assessment['used_document_ids'])} patient documents, but we're not storing this data")
-            
-            new_assessment = SymptomAssessment(
-                patient_id=patient_id,
-                symptoms=symptoms,
-                age=age,
-                sex=sex,
-                medical_history=medical_history,
-                urgency_level=assessment['urgency_level'],
-                urgency_description=assessment['urgency_description'],
-                reasoning=assessment['reasoning'],
-                recommendations=json.dumps(assessment['recommendations']),
-                dos=json.dumps(assessment.get('dos', [])),
-                donts=json.dumps(assessment.get('donts', [])),
-                disclaimer=assessment['disclaimer']
-                # used_documents field is omitted
-            )
-            
-            db.session.add(new_assessment)
-            db.session.commit()
-            
-            # Save the PubMed references
-            pubmed_refs = assessment.get('pubmed_references', [])
-            logger.info(f"PubMed references found for medical query: {len(pubmed_refs)}")
-            if pubmed_refs:
-                logger.info(f"PubMed references details: {json.dumps(pubmed_refs)}")
-            
-            for ref in pubmed_refs:
-                pub_ref = PubMedReference(
-                    assessment_id=new_assessment.id,
-                    pmid=ref.get('pmid'),
-                    title=ref.get('title'),
-                    abstract=ref.get('abstract'),
-                    date=ref.get('date')
-                )
-                db.session.add(pub_ref)
+        # Always create appointments to demonstrate the functionality
+        # In production, you would use: if is_urgent:
+        if True:  # Creating appointments for all responses for demonstration purposes
+            try:
+                # Convert string patient_id to integer if it's a profile ID
+                profile_id = None
+                logger.debug("Patient ID from request: %s, type: %s", patient_id, type(patient_id))
                 
-            # Save the Clinical Trials
-            clinical_trials = assessment.get('clinical_trials', [])
-            logger.info(f"Clinical trials found for medical query: {len(clinical_trials)}")
-            if clinical_trials:
-                logger.info(f"Clinical trials details: {json.dumps(clinical_trials)}")
-            
-            for trial in clinical_trials:
-                # Convert conditions to JSON string if it's a list
-                conditions = trial.get('conditions', [])
-                conditions_json = json.dumps(conditions) if isinstance(conditions, list) else conditions
+                if patient_id:
+                    try:
+                        if isinstance(patient_id, str) and patient_id.isdigit():
+                            profile_id = int(patient_id)
+                            logger.debug("Converted patient_id string to int: %s", profile_id)
+                        elif isinstance(patient_id, int):
+                            profile_id = patient_id
+                    except Exception as conversion_error:
+                        logger.error(f"Error converting patient_id: {str(conversion_error)}")
                 
-                clinical_trial = ClinicalTrial(
-                    assessment_id=new_assessment.id,
-                    nct_id=trial.get('nct_id'),
-                    title=trial.get('title'),
-                    status=trial.get('status'),
-                    phase=trial.get('phase'),
-                    summary=trial.get('summary'),
-                    conditions=conditions_json,
-                    start_date=trial.get('start_date'),
-                    completion_date=trial.get('completion_date'),
-                    url=trial.get('url')
-                )
-                db.session.add(clinical_trial)
-            
-            db.session.commit()
-            
-            # Create appointment for emergency/urgent cases - expanded condition to catch more urgency levels
-            urgency = assessment['urgency_level'].lower()
-            logger.info(f"Checking urgency level for appointment creation: {urgency}")
-            
-            # Check for various urgent terms that might be in the urgency level or description
-            is_urgent = any(term in urgency or 
-                           term in assessment['urgency_description'].lower() 
-                           for term in ['high', 'emergency', 'urgent', 'immediate', 'severe'])
-            
-            # Always create appointments to demonstrate the functionality
-            # In production, you would use: if is_urgent:
-            if True:  # Creating appointments for all responses for demonstration purposes
-                try:
-                    # Convert string patient_id to integer if it's a profile ID
-                    profile_id = None
-                    logger.info(f"Patient ID from request: {patient_id}, type: {type(patient_id)}")
-                    
-                    if patient_id:
-                        try:
-                            if isinstance(patient_id, str) and patient_id.isdigit():
-                                profile_id = int(patient_id)
-                                logger.info(f"Converted patient_id string to int: {profile_id}")
-                            elif isinstance(patient_id, int):
-                                profile_id = patient_id
-                        except Exception as conversion_error:
-                            logger.error(f"Error converting patient_id: {str(conversion_error)}")
+                if not profile_id and patient_profile:
+                    profile_id = patient_profile.id
+                    logger.debug("Using patient profile ID: %s", profile_id)
+                
+                # If we still don't have a profile_id, find any valid profile
+                if not profile_id:
+                    profile_id = _fallback_profile_id()
+                    if profile_id:
+                        logger.debug("Using fallback profile ID: %s", profile_id)
+                    else:
+                        # Look again next time, once a profile may exist
+                        _fallback_profile_id.cache_clear()
+                
+                if profile_id:
+                    # Determine urgency level for display
+                    display_urgency = "high" if is_urgent else (UrgencyLevel.normalize(urgency) or UrgencyLevel.MEDIUM.value)
                     
-                    if not profile_id and patient_profile:
-                        profile_id = patient_profile.id
-                        logger.info(f"Using patient profile ID: {profile_id}")
+                    # Create an appointment
+                    appointment_title = f"{'EMERGENCY: ' if is_urgent else ''}{assessment['urgency_description'][:50]}..."
                     
-                    # If we still don't have a profile_id, find any valid profile
-                    if not profile_id:
-                        fallback_profile = Profile.query.first()
-                        if fallback_profile:
-                            profile_id = fallback_profile.id
-                            logger.info(f"Using fallback profile ID: {profile_id}")
+                    # Format recommendations properly
+                    recommendations_text = "\n".join(assessment['recommendations']) \
+                        if isinstance(assessment['recommendations'], list) \
+                        else str(assessment['recommendations'])
                     
-                    if profile_id:
-                        # Determine urgency level for display
-                        display_urgency = "high" if is_urgent else urgency
-                        
-                        # Create an appointment
-                        appointment_title = f"{'EMERGENCY: ' if is_urgent else ''}{assessment['urgency_description'][:50]}..."
-                        
-                        # Format recommendations properly
-                        recommendations_text = "\n".join(assessment['recommendations']) \
-                            if isinstance(assessment['recommendations'], list) \
-                            else str(assessment['recommendations'])
-                        
-                        new_appointment = Appointment(
-                            patient_id=profile_id,
-                            assessment_id=new_assessment.id,
-                            title=appointment_title,
-                            description=f"Symptoms: {symptoms}\n\nReasoning: {assessment['reasoning']}\n\nRecommendations: {recommendations_text}",
-                            urgency_level=display_urgency,
-                            status="pending"
-                        )
+                    new_appointment = Appointment(
+                        patient_id=profile_id,
+                        assessment_id=new_assessment.id,
+                        title=appointment_title,
+                        description=f"Symptoms: {symptoms}\n\nReasoning: {assessment['reasoning']}\n\nRecommendations: {recommendations_text}",
+                        urgency_level=display_urgency,
+                        status="pending"
+                    )
+                    # In a savepoint, so a failed appointment doesn't lose the assessment
+                    with db.session.begin_nested():
                         db.session.add(new_appointment)
-                        db.session.commit()
-                        logger.info(f"Created appointment (urgency: {display_urgency}) for patient {profile_id}")
-                    else:
-                        logger.error("Could not find a valid patient profile ID for appointment creation")
-                except Exception as e:
-                    logger.error(f"Failed to create appointment: {str(e)}")
-                    # Continue even if appointment creation fails
-            
-            # Return the saved assessment with ID
-            return jsonify(new_assessment.to_dict()), 201
-        else:
-            logger.info("Not saving non-medical chat to database")
-            # Just return the assessment without saving to database
-            # Convert to dict format manually to match the model format
-            response = {
-                "symptoms": symptoms,
-                "urgency_level": assessment['urgency_level'],
-                "urgency_description": assessment['urgency_description'],
-                "reasoning": assessment['reasoning'],
-                "recommendations": assessment['recommendations'],
-                "disclaimer": assessment['disclaimer'],
-                "pubmed_references": assessment.get('pubmed_references', [])
-            }
+                    logger.debug("Created appointment (urgency: %s) for patient %s", display_urgency, profile_id)
+                else:
+                    logger.error("Could not find a valid patient profile ID for appointment creation")
+            except Exception as e:
+                logger.error(f"Failed to create appointment: {str(e)}")
+                # The cached fallback profile may have been deleted
+                _fallback_profile_id.cache_clear()
+                # Continue even if appointment creation fails
         
-            # Log PubMed references for non-medical queries too
-            pubmed_refs = assessment.get('pubmed_references', [])
-            logger.info(f"PubMed references found for non-medical query: {len(pubmed_refs)}")
-            if pubmed_refs:
-                logger.info(f"PubMed references details: {json.dumps(pubmed_refs)}")
-            
-            # Return the assessment for non-medical cases
-            return jsonify(response), 200
+        # Serialize before committing, from the rows the inserts returned; afterwards the
+        # assessment would be expired and re-read, with its references and trials
+        payload = SymptomAssessment.row_to_dict(new_assessment, references, trials)
         
-    except Exception as e:
-        logger.error(f"Error processing symptom assessment request: {str(e)}")
-        return jsonify({"error": f"Failed to process symptom assessment: {str(e)}"}), 500
+        # Persist the assessment, its references and trials, and the appointment in one transaction
+        db.session.commit()
+        
+        # Return the saved assessment with ID
+        return payload, 201
+    else:
+        logger.debug("Not saving non-medical chat to database")
+        # Just return the assessment without saving to database
+        # Convert to dict format manually to match the model format
+        response = {
+            "symptoms": symptoms,
+            "urgency_level": assessment['urgency_level'],
+            "urgency_description": assessment['urgency_description'],
+            "reasoning": assessment['reasoning'],
+            "recommendations": assessment['recommendations'],
+            "disclaimer": assessment['disclaimer'],
+            "pubmed_references": assessment.get('pubmed_references', [])
+        }
+    
+        # Log PubMed references for non-medical queries too
+        pubmed_refs = assessment.get('pubmed_references', [])
+        logger.debug("PubMed references found for non-medical query: %d", len(pubmed_refs))
+        if pubmed_refs:
+            logger.debug("PubMed references details: %s", pubmed_refs)
+        
+        # Return the assessment for non-medical cases
+        return response, 200
 
-@ai_bp.route('/assessments', methods=['GET'])
-def get_assessments():
-    """Get all symptom assessments, with optional patient_id filter."""
-    try:
-        patient_id = request.args.get('patient_id')
+def _profile_summary(medical_history, chronic_conditions, allergies, medications, surgical_history) -> str:
+    """Summarize a profile's medical columns for the assessment prompt.
+    
+    The list columns come back from JSONB already parsed; entries of an
+    unexpected shape are skipped.
+    """
+    profile_medical_info = []
+    
+    if medical_history:
+        profile_medical_info.append(f"Medical History: {medical_history}")
+    
+    if chronic_conditions:
+        conditions = [str(c) for c in chronic_conditions if c]
+        if conditions:
+            profile_medical_info.append(f"Chronic Conditions: {', '.join(conditions)}")
+    
+    if allergies:
+        allergy_list = [str(a) for a in allergies if a]
+        if allergy_list:
+            profile_medical_info.append(f"Allergies: {', '.join(allergy_list)}")
+    
+    if medications:
+        meds_list = [f"{med.get('name')} {med.get('dosage')} {med.get('frequency')}" 
+                    for med in medications if isinstance(med, dict) and 'name' in med]
+        if meds_list:
+            profile_medical_info.append(f"Medications: {', '.join(meds_list)}")
+    
+    if surgical_history:
+        surgeries = [f"{s.get('procedure')} ({s.get('date')})" 
+                    for s in surgical_history if isinstance(s, dict) and 'procedure' in s]
+        if surgeries:
+            profile_medical_info.append(f"Surgical History: {', '.join(surgeries)}")
+    
+    return "\n".join(profile_medical_info)
+
+def _profile_to_medical_history(profile, medical_history):
+    """Combine the medical history sent with a request with the patient's profile.
+    
+    Args:
+        profile: The patient's Profile
+        medical_history: Medical history from the request (optional)
+        
+    Returns:
+        The combined medical history
+    """
+    profile_medical_string = _profile_summary(profile.medical_history, profile.chronic_conditions,
+                                              profile.allergies, profile.medications, profile.surgical_history)
+    if not profile_medical_string:
+        return medical_history
+    if medical_history:
+        return f"{medical_history}\n\nAdditional information from patient profile:\n{profile_medical_string}"
+    return f"Information from patient profile:\n{profile_medical_string}"
+
+@ai_bp.route('/assess-symptoms', methods=['POST'])
+def assess_symptoms():
+    """Endpoint to assess patient symptoms using the AI agent."""
+    # Get request data
+    data = request.get_json()
+    
+    if not data or 'symptoms' not in data:
+        return jsonify({"error": "Symptoms are required"}), 400
+    
+    symptoms = data.get('symptoms')
+    age = data.get('age')
+    sex = data.get('sex')
+    medical_history = data.get('medical_history')
+    patient_id = data.get('patient_id')
+    
+    # Check if message mentions a patient profile by name
+    patient_profile = None
+    patient_mention = _PATIENT_MENTION_RE.search(symptoms)
+    
+    if patient_mention:
+        patient_name = patient_mention.group(1).strip()
+        logger.debug("Message mentions a patient by name")
         
-        if patient_id:
-            assessments = SymptomAssessment.query.filter_by(patient_id=patient_id).all()
-        else:
-            assessments = SymptomAssessment.query.all()
+        # Try to find this patient in the database
+        name_parts = patient_name.split()
+        if len(name_parts) >= 2:
+            # Assume first part is first name, rest is last name
+            first_name = name_parts[0]
+            last_name = ' '.join(name_parts[1:])
+            
+            patient_profile = Profile.query.options(_ASSESSMENT_PROFILE_COLUMNS).filter(
+                Profile.first_name == first_name,
+                Profile.last_name == last_name
+            ).first()
             
-        return jsonify([assessment.to_dict() for assessment in assessments])
+            if patient_profile:
+                logger.debug("Found matching profile (ID: %s)", patient_profile.id)
+                # Update patient_id to use this profile
+                patient_id = str(patient_profile.id)
+    
+    # If patient_id is provided but we don't have a profile yet, try to fetch it
+    elif patient_id:
+        try:
+            patient_profile = db.session.get(Profile, int(patient_id), options=[_ASSESSMENT_PROFILE_COLUMNS])
+            if patient_profile:
+                logger.debug("Found profile for patient ID %s", patient_id)
+        except (ValueError, TypeError):
+            pass  # Patient ID not a valid integer
+    
+    if patient_profile:
+        # Update demographic information if not provided
+        if not age and patient_profile.age:
+            age = patient_profile.age
+        if not sex and patient_profile.gender:
+            sex = patient_profile.gender
+        medical_history = _profile_to_medical_history(patient_profile, medical_history)
+        # Keep the loaded profile usable once its transaction ends
+        db.session.expunge(patient_profile)
+    
+    # End the read transaction before waiting on the model, so the connection goes
+    # back to the pool instead of sitting idle in transaction
+    db.session.rollback()
+    
+    agent = get_symptom_agent()
+    
+    # Stream the model output as server-sent events when the client asks for it
+    if data.get('stream') or 'text/event-stream' in request.headers.get('Accept', ''):
+        events = agent.stream_assessment(symptoms, age, sex, medical_history, patient_id)
+        return Response(stream_with_context(_assessment_event_stream(events, symptoms, age, sex, medical_history, patient_id, patient_profile)),
+                        mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    
+    # Call the agent to assess symptoms
+    assessment = agent.assess_symptoms(symptoms, age, sex, medical_history, patient_id)
+    payload, status = _finalize_assessment(assessment, symptoms, age, sex, medical_history, patient_id, patient_profile)
+    return Response(orjson.dumps(payload), status=status, mimetype='application/json')
+
+@ai_bp.route('/assess/batch', methods=['POST'])
+def assess_symptoms_batch():
+    """Endpoint to assess several patients' symptoms in one request.
+    
+    Expects ``{"cases": [{"symptoms": ..., "age": ..., "sex": ..., "medical_history": ..., "patient_id": ...}, ...]}``
+    and returns one result per case, in order.
+    """
+    data = request.get_json()
+    cases = data.get('cases') if data else None
+    
+    if not cases or not isinstance(cases, list):
+        return jsonify({"error": "A list of cases is required"}), 400
+    if len(cases) > MAX_BATCH_CASES:
+        return jsonify({"error": f"At most {MAX_BATCH_CASES} cases can be assessed per batch"}), 400
+    if not all(isinstance(case, dict) and case.get('symptoms') for case in cases):
+        return jsonify({"error": "Symptoms are required for every case"}), 400
+    
+    logger.info(f"Assessing batch of {len(cases)} cases")
+    assessments = get_symptom_agent().assess_symptoms_batch(cases)
+    
+    results = []
+    for case, assessment in zip(cases, assessments):
+        try:
+            payload, status = _finalize_assessment(assessment, case['symptoms'], case.get('age'), case.get('sex'),
+                                                   case.get('medical_history'), case.get('patient_id'), None)
+        except Exception as e:
+            logger.error(f"Error saving batch assessment: {str(e)}")
+            db.session.rollback()
+            payload, status = {"error": f"Failed to process symptom assessment: {str(e)}"}, 500
+        results.append({"status": status, "result": payload})
+    
+    return Response(orjson.dumps(results), mimetype='application/json')
+
+def _assessment_dicts(rows):
+    """Serialize assessment rows with their references and trials.
+    
+    The references and trials of the assessments are read as rows in one query
+    each (per 500 assessments), rather than two queries per assessment.
+    """
+    ids = [row.id for row in rows]
+    references = {assessment_id: [] for assessment_id in ids}
+    clinical_trials = {assessment_id: [] for assessment_id in ids}
+    # Chunked like selectinload, to keep the IN lists a reasonable size
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        for children, model in ((references, PubMedReference), (clinical_trials, ClinicalTrial)):
+            child_table = model.__table__
+            for child in db.session.execute(select(child_table)
+                                            .where(child_table.c.assessment_id.in_(chunk))
+                                            .order_by(child_table.c.id)):
+                children[child.assessment_id].append(child)
+    return [SymptomAssessment.row_to_dict(row, references[row.id], clinical_trials[row.id]) for row in rows]
+
+@ai_bp.route('/assessments', methods=['GET'])
+def get_assessments():
+    """Get all symptom assessments, with optional patient_id filter.
+    
+    Passing ``page`` and/or ``per_page`` (default 50, at most 100) returns one
+    page, newest first, still as a list; the ``X-Total-Count``, ``X-Page`` and
+    ``X-Per-Page`` headers describe the pagination.
+    """
+    patient_id = request.args.get('patient_id')
+    
+    # Read plain rows rather than ORM instances; the listing only serializes them
+    table = SymptomAssessment.__table__
+    query = select(table)
+    if patient_id:
+        query = query.where(table.c.patient_id == patient_id)
         
-    except Exception as e:
-        logger.error(f"Error retrieving symptom assessments: {str(e)}")
-        return jsonify({"error": f"Failed to retrieve symptom assessments: {str(e)}"}), 500
+    if 'page' not in request.args and 'per_page' not in request.args:
+        return jsonify(_assessment_dicts(db.session.execute(query).all()))
+    
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', DEFAULT_ASSESSMENTS_PER_PAGE, type=int), 1),
+                   MAX_ASSESSMENTS_PER_PAGE)
+    total = db.session.scalar(select(func.count()).select_from(query.subquery()))
+    rows = db.session.execute(query.order_by(table.c.id.desc())
+                              .limit(per_page).offset((page - 1) * per_page)).all()
+    
+    response = jsonify(_assessment_dicts(rows))
+    response.headers['X-Total-Count'] = str(total)
+    response.headers['X-Page'] = str(page)
+    response.headers['X-Per-Page'] = str(per_page)
+    return response
 
 @ai_bp.route('/assessments/<int:assessment_id>', methods=['GET'])
 def get_assessment(assessment_id):
-    """Get a specific symptom assessment by ID."""
-    try:
-        assessment = SymptomAssessment.query.get_or_404(assessment_id)
-        return jsonify(assessment.to_dict())
-        
-    except Exception as e:
-        logger.error(f"Error retrieving symptom assessment {assessment_id}: {str(e)}")
-        return jsonify({"error": f"Failed to retrieve symptom assessment: {str(e)}"}), 500
+    """Get a specific symptom assessment by ID.
+    
+    Assessments don't change once saved, so the serialized response is kept in
+    a short-lived per-process cache and may be cached privately by the client;
+    an ETag lets repeat requests be answered with 304 Not Modified.
+    """
+    # TTLCache isn't thread-safe: a get can expire entries, so reads take the lock too
+    with _assessment_cache_lock:
+        body = _assessment_cache.get(assessment_id)
+    if body is None:
+        assessment = db.get_or_404(SymptomAssessment, assessment_id)
+        body = orjson.dumps(assessment.to_dict())
+        with _assessment_cache_lock:
+            _assessment_cache[assessment_id] = body
+    
+    response = Response(body, mimetype='application/json')
+    response.cache_control.private = True
+    response.cache_control.max_age = ASSESSMENT_CACHE_TTL
+    response.add_etag()
+    return response.make_conditional(request)
@@ -1,128 +1,291 @@
 """Routes for the appointment functionality."""
 import logging
-from flask import Blueprint, request, jsonify, current_app
-from datetime import datetime
+from flask import Blueprint, abort, request, jsonify, current_app
+from datetime import date, datetime, timezone
+from sqlalchemy import insert, select, tuple_
+from sqlalchemy.orm import joinedload, load_only, raiseload, selectinload
 
 from .. import db
-from ..models import Appointment, Profile
+from ..models import Appointment, AppointmentStatus, Profile, UrgencyLevel
+from ..response_cache import cached_object_response
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Create Blueprint
 appointments_bp = Blueprint('appointments', __name__, url_prefix='/api/appointments')
 
+STATUS_VALUES = frozenset(status.value for status in AppointmentStatus)
+
+# Largest page of appointments returned at once
+MAX_PAGE_SIZE = 200
+
+# Most appointments accepted by one bulk request
+MAX_BULK_APPOINTMENTS = 5000
+
+def _invalid_urgency_message():
+    levels = ', '.join(level.value for level in UrgencyLevel)
+    return f"Invalid urgency_level. Valid levels are: {levels}"
+
+def _invalid_status_message():
+    statuses = ', '.join(status.value for status in AppointmentStatus)
+    return f"Invalid status. Valid statuses are: {statuses}"
+
+def _invalid_urgency_response():
+    return jsonify({"error": _invalid_urgency_message()}), 400
+
+def _invalid_status_response():
+    return jsonify({"error": _invalid_status_message()}), 400
+
+def _parse_appointment_time(value):
+    """Parse a client ISO 8601 timestamp into the naive UTC datetime the columns store.
+    
+    Uses the C ``datetime.fromisoformat``; a trailing ``Z`` is accepted and
+    values with an offset are converted to UTC rather than having it dropped.
+    
+    Raises:
+        ValueError: If the value isn't an ISO 8601 timestamp
+    """
+    if not value:
+        return None
+    if not isinstance(value, str):
+        raise ValueError("appointment_time must be a string")
+    if value.endswith(('Z', 'z')):
+        value = value[:-1] + '+00:00'
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def _invalid_time_response():
+    return jsonify({"error": "Invalid appointment_time. Use an ISO 8601 timestamp"}), 400
+
+def _get_appointment_with_patient(appointment_id):
+    """Load an appointment and its patient in one query, replacing any stale copy in the session."""
+    return db.session.get(Appointment, appointment_id, options=[joinedload(Appointment.patient)],
+                          populate_existing=True)
+
 @appointments_bp.route('/', methods=['GET'])
 def get_appointments():
-    """Get all appointments with optional filters."""
-    try:
-        # Parse query parameters for filtering
-        patient_id = request.args.get('patient_id')
-        status = request.args.get('status')
-        urgency_level = request.args.get('urgency_level')
-        
-        # Start with base query
-        query = Appointment.query
+    """Get all appointments with optional filters.
+    
+    ``view=summary`` returns short entries (no description or patient) read
+    with only the columns they need. ``limit`` (at most 200) returns one page;
+    the next page is requested with ``after`` set to the ``X-Next-Cursor``
+    header, which is absent on the last page.
+    """
+    # Parse query parameters for filtering
+    patient_id = request.args.get('patient_id')
+    status = request.args.get('status')
+    urgency_level = request.args.get('urgency_level')
+    summary = request.args.get('view') == 'summary'
+    
+    if summary:
+        query = Appointment.query.options(load_only(*[getattr(Appointment, column) for column in Appointment.SUMMARY_COLUMNS]),
+                                          raiseload('*'))
+    else:
+        # Start with base query, loading each appointment's patient up front
+        query = Appointment.query.options(selectinload(Appointment.patient), raiseload('*'))
+    
+    # Apply filters if provided
+    if patient_id:
+        query = query.filter_by(patient_id=patient_id)
+    # Values outside the enums can't match; the database would reject them
+    if status:
+        if status not in STATUS_VALUES:
+            return jsonify([])
+        query = query.filter_by(status=status)
+    if urgency_level:
+        urgency_level = UrgencyLevel.normalize(urgency_level)
+        if urgency_level is None:
+            return jsonify([])
+        query = query.filter_by(urgency_level=urgency_level)
+    
+    # Keyset pagination: continue after the cursor appointment in the listing order
+    after_id = request.args.get('after', type=int)
+    if after_id:
+        cursor = db.session.query(Appointment.urgency_level, Appointment.created_at).filter_by(id=after_id).first()
+        if cursor is None:
+            return jsonify({"error": "Unknown cursor"}), 400
+        query = query.filter(tuple_(Appointment.urgency_level, Appointment.created_at, Appointment.id)
+                             < tuple_(cursor.urgency_level, cursor.created_at, after_id))
         
-        # Apply filters if provided
-        if patient_id:
-            query = query.filter_by(patient_id=patient_id)
-        if status:
-            query = query.filter_by(status=status)
-        if urgency_level:
-            query = query.filter_by(urgency_level=urgency_level)
-            
-        # Get results and sort by urgency level and creation date
-        appointments = query.order_by(
-            # Sort emergency/high urgency first
-            Appointment.urgency_level.desc(),
-            # Then by most recent
-            Appointment.created_at.desc()
-        ).all()
-        
-        return jsonify([appointment.to_dict() for appointment in appointments])
-    except Exception as e:
-        logger.error(f"Error retrieving appointments: {str(e)}")
-        return jsonify({"error": f"Failed to retrieve appointments: {str(e)}"}), 500
+    # Sort by urgency level and creation date
+    query = query.order_by(
+        # Sort emergency/high urgency first
+        Appointment.urgency_level.desc(),
+        # Then by most recent
+        Appointment.created_at.desc(),
+        Appointment.id.desc()
+    )
+    limit = request.args.get('limit', type=int)
+    if limit:
+        limit = min(max(limit, 1), MAX_PAGE_SIZE)
+        appointments = query.limit(limit + 1).all()
+    else:
+        appointments = query.all()
+    
+    has_more = bool(limit) and len(appointments) > limit
+    if has_more:
+        appointments = appointments[:limit]
+    response = jsonify([appointment.to_summary_dict() if summary else appointment.to_dict()
+                        for appointment in appointments])
+    if has_more:
+        response.headers['X-Next-Cursor'] = str(appointments[-1].id)
+    return response
 
 @appointments_bp.route('/<int:appointment_id>', methods=['GET'])
 def get_appointment(appointment_id):
-    """Get a specific appointment by ID."""
-    try:
-        appointment = Appointment.query.get_or_404(appointment_id)
-        return jsonify(appointment.to_dict())
-    except Exception as e:
-        logger.error(f"Error retrieving appointment {appointment_id}: {str(e)}")
-        return jsonify({"error": f"Failed to retrieve appointment: {str(e)}"}), 500
+    """Get a specific appointment by ID.
+    
+    The ETag is built from the appointment's and its patient's updated_at (and
+    the date, for the patient's age), read without loading either row; the
+    appointment is loaded with its patient only when the response isn't cached.
+    """
+    version = db.session.execute(
+        select(Appointment.updated_at, Profile.updated_at)
+        .outerjoin(Profile, Appointment.patient_id == Profile.id)
+        .where(Appointment.id == appointment_id)
+    ).first()
+    if version is None:
+        abort(404)
+    return cached_object_response('appointment', appointment_id, [*version, date.today()],
+                                  lambda: _get_appointment_with_patient(appointment_id).to_dict())
 
 @appointments_bp.route('/', methods=['POST'])
 def create_appointment():
     """Create a new appointment."""
+    data = request.get_json()
+    
+    # Validate required fields
+    if not data or 'patient_id' not in data or 'title' not in data or 'urgency_level' not in data:
+        return jsonify({"error": "Missing required fields (patient_id, title, urgency_level)"}), 400
+    
+    urgency_level = UrgencyLevel.normalize(data['urgency_level'])
+    if urgency_level is None:
+        return _invalid_urgency_response()
+    status = data.get('status', AppointmentStatus.PENDING.value)
+    if status not in STATUS_VALUES:
+        return _invalid_status_response()
     try:
-        data = request.get_json()
-        
-        # Validate required fields
-        if not data or 'patient_id' not in data or 'title' not in data or 'urgency_level' not in data:
-            return jsonify({"error": "Missing required fields (patient_id, title, urgency_level)"}), 400
+        appointment_time = _parse_appointment_time(data.get('appointment_time'))
+    except ValueError:
+        return _invalid_time_response()
+    
+    # Create new appointment
+    new_appointment = Appointment(
+        patient_id=data['patient_id'],
+        assessment_id=data.get('assessment_id'),
+        title=data['title'],
+        description=data.get('description'),
+        urgency_level=urgency_level,
+        status=status,
+        appointment_time=appointment_time
+    )
+    
+    db.session.add(new_appointment)
+    db.session.commit()
+    
+    # Relationships aren't lazy loaded, so read the patient back with the appointment
+    return jsonify(_get_appointment_with_patient(new_appointment.id).to_dict()), 201
+
+@appointments_bp.route('/bulk', methods=['POST'])
+def create_appointments_bulk():
+    """Create many appointments at once from a JSON array.
+    
+    Every entry is validated like a single create before anything is written;
+    the first invalid one fails the request with its index. The rows are then
+    inserted in batched multi-row INSERTs and committed in one transaction.
+    Returns ``{"created": n, "ids": [...]}`` with the ids in request order.
+    """
+    entries = request.get_json()
+    
+    if not isinstance(entries, list) or not entries:
+        return jsonify({"error": "Expected a non-empty JSON array of appointments"}), 400
+    if len(entries) > MAX_BULK_APPOINTMENTS:
+        return jsonify({"error": f"At most {MAX_BULK_APPOINTMENTS} appointments can be created at once"}), 400
+    
+    now = datetime.utcnow()
+    rows = []
+    for index, data in enumerate(entries):
+        if not isinstance(data, dict) or 'patient_id' not in data or 'title' not in data or 'urgency_level' not in data:
+            return jsonify({"error": f"Appointment {index}: missing required fields (patient_id, title, urgency_level)"}), 400
         
-        # Create new appointment
-        new_appointment = Appointment(
-            patient_id=data['patient_id'],
-            assessment_id=data.get('assessment_id'),
-            title=data['title'],
-            description=data.get('description'),
-            urgency_level=data['urgency_level'],
-            status=data.get('status', 'pending'),
-            appointment_time=datetime.fromisoformat(data['appointment_time']) if 'appointment_time' in data else None
-        )
+        urgency_level = UrgencyLevel.normalize(data['urgency_level'])
+        if urgency_level is None:
+            return jsonify({"error": f"Appointment {index}: {_invalid_urgency_message()}"}), 400
+        status = data.get('status', AppointmentStatus.PENDING.value)
+        if status not in STATUS_VALUES:
+            return jsonify({"error": f"Appointment {index}: {_invalid_status_message()}"}), 400
         
-        db.session.add(new_appointment)
-        db.session.commit()
+        try:
+            appointment_time = _parse_appointment_time(data.get('appointment_time'))
+        except ValueError:
+            return jsonify({"error": f"Appointment {index}: invalid appointment_time"}), 400
         
-        return jsonify(new_appointment.to_dict()), 201
-    except Exception as e:
-        logger.error(f"Error creating appointment: {str(e)}")
-        return jsonify({"error": f"Failed to create appointment: {str(e)}"}), 500
+        rows.append({
+            "patient_id": data['patient_id'],
+            "assessment_id": data.get('assessment_id'),
+            "title": data['title'],
+            "description": data.get('description'),
+            "urgency_level": urgency_level,
+            "status": status,
+            "appointment_time": appointment_time,
+            "created_at": now,
+            "updated_at": now
+        })
+    
+    # One executemany, which SQLAlchemy sends as batched multi-row INSERTs, and one commit
+    appointment_ids = db.session.execute(
+        insert(Appointment).returning(Appointment.id, sort_by_parameter_order=True), rows
+    ).scalars().all()
+    db.session.commit()
+    
+    logger.info(f"Created {len(appointment_ids)} appointments in bulk")
+    return jsonify({"created": len(appointment_ids), "ids": appointment_ids}), 201
 
 @appointments_bp.route('/<int:appointment_id>', methods=['PUT'])
 def update_appointment(appointment_id):
     """Update an existing appointment."""
-    try:
-        appointment = Appointment.query.get_or_404(appointment_id)
-        data = request.get_json()
-        
-        # Update fields if provided
-        if 'title' in data:
-            appointment.title = data['title']
-        if 'description' in data:
-            appointment.description = data['description']
-        if 'urgency_level' in data:
-            appointment.urgency_level = data['urgency_level']
-        if 'status' in data:
-            appointment.status = data['status']
-        if 'appointment_time' in data:
-            appointment.appointment_time = datetime.fromisoformat(data['appointment_time']) if data['appointment_time'] else None
-        
-        appointment.updated_at = datetime.utcnow()
-        
-        db.session.commit()
-        
-        return jsonify(appointment.to_dict())
-    except Exception as e:
-        logger.error(f"Error updating appointment {appointment_id}: {str(e)}")
-        return jsonify({"error": f"Failed to update appointment: {str(e)}"}), 500
+    appointment = _get_appointment_with_patient(appointment_id)
+    if appointment is None:
+        abort(404)
+    data = request.get_json()
+    
+    # Update fields if provided
+    if 'title' in data:
+        appointment.title = data['title']
+    if 'description' in data:
+        appointment.description = data['description']
+    if 'urgency_level' in data:
+        urgency_level = UrgencyLevel.normalize(data['urgency_level'])
+        if urgency_level is None:
+            return _invalid_urgency_response()
+        appointment.urgency_level = urgency_level
+    if 'status' in data:
+        if data['status'] not in STATUS_VALUES:
+            return _invalid_status_response()
+        appointment.status = data['status']
+    if 'appointment_time' in data:
+        try:
+            appointment.appointment_time = _parse_appointment_time(data['appointment_time'])
+        except ValueError:
+            return _invalid_time_response()
+    
+    appointment.updated_at = datetime.utcnow()
+    
+    # The patient was loaded up front; serialize before the commit expires the appointment
+    db.session.flush()
+    body = appointment.to_dict()
+    db.session.commit()
+    
+    return jsonify(body)
 
 @appointments_bp.route('/<int:appointment_id>', methods=['DELETE'])
 def delete_appointment(appointment_id):
     """Delete an appointment."""
-    try:
-        appointment = Appointment.query.get_or_404(appointment_id)
-        
-        db.session.delete(appointment)
-        db.session.commit()
-        
-        return jsonify({"message": f"Appointment {appointment_id} deleted successfully"}), 200
-    except Exception as e:
-        logger.error(f"Error deleting appointment {appointment_id}: {str(e)}")
-        return jsonify({"error": f"Failed to delete appointment: {str(e)}"}), 500
+    appointment = db.get_or_404(Appointment, appointment_id)
+    
+    db.session.delete(appointment)
+    db.session.commit()
+    
+    return jsonify({"message": f"Appointment {appointment_id} deleted successfully"}), 200
@@ -0,0 +1,27 @@
+"""orjson-backed JSON provider for Flask."""
+import orjson
+from flask.json.provider import JSONProvider, _default
+
+
+class OrjsonProvider(JSONProvider):
+    """JSON provider that serializes with orjson, several times faster than the stdlib.
+    
+    Installed as ``app.json``, so ``jsonify`` and ``request.get_json`` use it.
+    Types orjson can't serialize itself (Decimal, UUID-like and ``__html__``
+    objects) fall back to Flask's default conversion. Keys are not sorted.
+    Dates and datetimes are written as ISO 8601 strings by orjson itself, so
+    the models' ``to_dict`` methods return them unconverted.
+    """
+    
+    option = orjson.OPT_NON_STR_KEYS
+    
+    def dumps(self, obj, **kwargs) -> str:
+        return orjson.dumps(obj, default=_default, option=self.option).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj, default=_default, option=self.option),
+                                        mimetype="application/json")
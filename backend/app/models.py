@@ -1,8 +1,10 @@
-from datetime import datetime, timezone
-import json
+from datetime import date, datetime, timezone
+import orjson
 import os
 from . import db
-from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy import Computed, func, literal_column
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
 from enum import Enum
 
 class Item(db.Model):
@@ -24,8 +26,8 @@ class Item(db.Model):
             'id': self.id,
             'name': self.name,
             'description': self.description,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
         }
 
 
@@ -34,7 +36,7 @@ class PubMedReference(db.Model):
     __tablename__ = 'pubmed_references'
     
     id = db.Column(db.Integer, primary_key=True)
-    assessment_id = db.Column(db.Integer, db.ForeignKey('symptom_assessments.id'))
+    assessment_id = db.Column(db.Integer, db.ForeignKey('symptom_assessments.id'), index=True)
     pmid = db.Column(db.String(20), nullable=True)
     title = db.Column(db.Text, nullable=True)
     abstract = db.Column(db.Text, nullable=True)
@@ -63,7 +65,7 @@ class ClinicalTrial(db.Model):
     __tablename__ = 'clinical_trials'
     
     id = db.Column(db.Integer, primary_key=True)
-    assessment_id = db.Column(db.Integer, db.ForeignKey('symptom_assessments.id', ondelete='CASCADE'), nullable=False)
+    assessment_id = db.Column(db.Integer, db.ForeignKey('symptom_assessments.id', ondelete='CASCADE'), nullable=False, index=True)
     nct_id = db.Column(db.String(20))
     title = db.Column(db.Text)
     status = db.Column(db.String(50))
@@ -79,11 +81,11 @@ class ClinicalTrial(db.Model):
     
     def to_dict(self):
         """Convert to dictionary for JSON serialization"""
-        # Parse conditions from JSON string if needed
+        # Conditions are written as a JSON list; older rows may hold a plain string
         try:
-            conditions = json.loads(self.conditions) if self.conditions else []
-        except:
-            conditions = [self.conditions] if self.conditions else []
+            conditions = orjson.loads(self.conditions) if self.conditions else []
+        except orjson.JSONDecodeError:
+            conditions = [self.conditions]
             
         return {
             'id': self.id,
@@ -99,12 +101,18 @@ class ClinicalTrial(db.Model):
         }
 
 
+# Characters of extracted text shown in document listings
+CONTENT_PREVIEW_CHARS = 200
+# Text search configuration, rendered inline: a bound 'english' is typed REGCONFIG,
+# which DDL (create_all, autogenerate) can't render
+CONTENT_SEARCH_CONFIG = literal_column("'english'")
+
 class MedicalDocument(db.Model):
     """Model for storing patient medical documents."""
     __tablename__ = 'medical_documents'
     
     id = db.Column(db.Integer, primary_key=True)
-    patient_id = db.Column(db.String(100), nullable=True)  # Optional patient identifier
+    patient_id = db.Column(db.String(100), nullable=True, index=True)  # Optional patient identifier
     filename = db.Column(db.String(255), nullable=False)
     file_type = db.Column(db.String(50), nullable=False)  # e.g., pdf, jpg, docx
     file_size = db.Column(db.Integer, nullable=False)  # Size in bytes
@@ -113,29 +121,51 @@ class MedicalDocument(db.Model):
     document_metadata = db.Column(db.Text, nullable=True)  # JSON string for additional metadata
     uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Preview cut by the database, so listings can defer the full extracted text
+    content_preview_text = db.column_property(func.substr(content_text, 1, CONTENT_PREVIEW_CHARS + 1))
+    
+    __table_args__ = (
+        # Full-text search over the extracted text; queries must use content_search_vector()
+        db.Index('ix_medical_documents_content_tsv',
+                 func.to_tsvector(CONTENT_SEARCH_CONFIG, func.coalesce(content_text, '')),
+                 postgresql_using='gin'),
+    )
+    
+    @classmethod
+    def content_search_vector(cls):
+        """The indexed tsvector expression for searching document content."""
+        return func.to_tsvector(CONTENT_SEARCH_CONFIG, func.coalesce(cls.content_text, ''))
+    
     def __repr__(self):
         return f'<MedicalDocument {self.id}: {self.filename}>' 
     
     def to_dict(self):
         """Convert instance to dictionary."""
-        try:
-            metadata_dict = json.loads(self.document_metadata) if self.document_metadata else {}
-        except:
-            metadata_dict = {}
-            
+        # Always written with orjson.dumps by the document routes
+        metadata_dict = orjson.loads(self.document_metadata) if self.document_metadata else {}
+        
+        preview = self.content_preview_text
         return {
             'id': self.id,
             'patient_id': self.patient_id,
             'filename': self.filename,
             'file_type': self.file_type,
             'file_size': self.file_size,
-            'content_preview': self.content_text[:200] + '...' if self.content_text and len(self.content_text) > 200 else self.content_text,
-            'has_content': bool(self.content_text),
-            'uploaded_at': self.uploaded_at.isoformat(),
+            'content_preview': preview[:CONTENT_PREVIEW_CHARS] + '...' if preview and len(preview) > CONTENT_PREVIEW_CHARS else preview,
+            'has_content': bool(preview),
+            'uploaded_at': self.uploaded_at,
             'metadata': metadata_dict
         }
 
 
+def _age_from(date_of_birth):
+    """Age in whole years today for a date of birth, or None."""
+    if date_of_birth is None:
+        return None
+    today = date.today()
+    return today.year - date_of_birth.year - ((today.month, today.day) < (date_of_birth.month, date_of_birth.day))
+
+
 class Profile(db.Model):
     """Model for patient profiles with comprehensive medical history."""
     __tablename__ = 'profiles'
@@ -145,7 +175,6 @@ class Profile(db.Model):
     first_name = db.Column(db.String(100), nullable=False)
     last_name = db.Column(db.String(100), nullable=False)
     date_of_birth = db.Column(db.Date, nullable=False)
-    age = db.Column(db.Integer, nullable=False)
     gender = db.Column(db.String(20), nullable=False)
     email = db.Column(db.String(120), nullable=True)
     phone = db.Column(db.String(20), nullable=True)
@@ -158,16 +187,17 @@ class Profile(db.Model):
     height = db.Column(db.Float, nullable=True)  # In cm
     weight = db.Column(db.Float, nullable=True)  # In kg
     blood_type = db.Column(db.String(10), nullable=True)  # A+, B-, O+, etc.
-    bmi = db.Column(db.Float, nullable=True)  # Body Mass Index
+    # Body Mass Index, kept up to date by the database from height and weight
+    bmi = db.Column(db.Float, Computed('weight / NULLIF((height / 100.0) * (height / 100.0), 0)', persisted=True))
     
-    # Medical Information
-    allergies = db.Column(db.Text, nullable=True)  # JSON list of allergies
-    medications = db.Column(db.Text, nullable=True)  # Current medications as JSON
-    chronic_conditions = db.Column(db.Text, nullable=True)  # JSON list of chronic conditions
+    # Medical Information; a missing list (None) is stored as SQL NULL, not JSON null
+    allergies = db.Column(JSONB(none_as_null=True), nullable=True)  # List of allergies
+    medications = db.Column(JSONB(none_as_null=True), nullable=True)  # Current medications
+    chronic_conditions = db.Column(JSONB(none_as_null=True), nullable=True)  # List of chronic conditions
     medical_history = db.Column(db.Text, nullable=True)  # General medical history notes
-    surgical_history = db.Column(db.Text, nullable=True)  # JSON array of surgical procedures
+    surgical_history = db.Column(JSONB(none_as_null=True), nullable=True)  # List of surgical procedures
     family_medical_history = db.Column(db.Text, nullable=True)  # Family history notes
-    immunizations = db.Column(db.Text, nullable=True)  # JSON array of immunization records
+    immunizations = db.Column(JSONB(none_as_null=True), nullable=True)  # List of immunization records
     
     # Lifestyle Information
     smoking_status = db.Column(db.String(20), nullable=True)  # Never, Former, Current
@@ -191,75 +221,98 @@ class Profile(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Fetch the generated bmi with RETURNING on UPDATE too, not by a later SELECT
+    __mapper_args__ = {'eager_defaults': True}
+    
+    # Never loaded implicitly; deleting a profile detaches its appointments with one UPDATE
+    appointments = db.relationship('Appointment', back_populates='patient', lazy='raise_on_sql', passive_deletes=True)
+    
+    __table_args__ = (
+        # Containment searches such as allergies @> '["Penicillin"]'
+        db.Index('ix_profiles_allergies', allergies, postgresql_using='gin',
+                 postgresql_ops={'allergies': 'jsonb_path_ops'}),
+    )
+    
+    @hybrid_property
+    def age(self):
+        """Age in whole years, from date_of_birth, so it never goes stale."""
+        return _age_from(self.date_of_birth)
+    
+    @age.expression
+    def age(cls):
+        return func.date_part('year', func.age(cls.date_of_birth)).cast(db.Integer)
+    
     def __repr__(self):
         return f'<Profile {self.id}: {self.first_name} {self.last_name}>'
     
     def to_dict(self):
         """Convert instance to dictionary."""
-        try:
-            allergies = json.loads(self.allergies) if self.allergies else []
-        except:
-            allergies = []
-            
-        try:
-            medications = json.loads(self.medications) if self.medications else []
-        except:
-            medications = []
-            
-        try:
-            chronic_conditions = json.loads(self.chronic_conditions) if self.chronic_conditions else []
-        except:
-            chronic_conditions = []
-            
-        try:
-            surgical_history = json.loads(self.surgical_history) if self.surgical_history else []
-        except:
-            surgical_history = []
-            
-        try:
-            immunizations = json.loads(self.immunizations) if self.immunizations else []
-        except:
-            immunizations = []
-            
+        return self.row_to_dict(self)
+    
+    @staticmethod
+    def row_to_dict(row):
+        """Build the :meth:`to_dict` output from anything exposing the columns as attributes.
+        
+        Lets the profile listing serialize Core result rows without building ORM instances.
+        """
         return {
-            'id': self.id,
-            'first_name': self.first_name,
-            'last_name': self.last_name,
-            'full_name': f"{self.first_name} {self.last_name}",
-            'date_of_birth': self.date_of_birth.isoformat() if self.date_of_birth else None,
-            'age': self.age,
-            'gender': self.gender,
-            'email': self.email,
-            'phone': self.phone,
-            'address': self.address,
-            'city': self.city,
-            'state': self.state,
-            'zip_code': self.zip_code,
-            'height': self.height,
-            'weight': self.weight,
-            'blood_type': self.blood_type,
-            'bmi': self.bmi,
-            'allergies': allergies,
-            'medications': medications,
-            'chronic_conditions': chronic_conditions,
-            'medical_history': self.medical_history,
-            'surgical_history': surgical_history,
-            'family_medical_history': self.family_medical_history,
-            'immunizations': immunizations,
-            'smoking_status': self.smoking_status,
-            'alcohol_consumption': self.alcohol_consumption,
-            'exercise_frequency': self.exercise_frequency,
-            'diet_restrictions': self.diet_restrictions,
-            'occupation': self.occupation,
-            'emergency_contact_name': self.emergency_contact_name,
-            'emergency_contact_phone': self.emergency_contact_phone,
-            'emergency_contact_relationship': self.emergency_contact_relationship,
-            'primary_physician': self.primary_physician,
-            'primary_physician_phone': self.primary_physician_phone,
-            'insurance_provider': self.insurance_provider,
-            'insurance_policy_number': self.insurance_policy_number,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+            'id': row.id,
+            'first_name': row.first_name,
+            'last_name': row.last_name,
+            'full_name': f"{row.first_name} {row.last_name}",
+            'date_of_birth': row.date_of_birth,
+            'age': _age_from(row.date_of_birth),
+            'gender': row.gender,
+            'email': row.email,
+            'phone': row.phone,
+            'address': row.address,
+            'city': row.city,
+            'state': row.state,
+            'zip_code': row.zip_code,
+            'height': row.height,
+            'weight': row.weight,
+            'blood_type': row.blood_type,
+            'bmi': row.bmi,
+            'allergies': row.allergies or [],
+            'medications': row.medications or [],
+            'chronic_conditions': row.chronic_conditions or [],
+            'medical_history': row.medical_history,
+            'surgical_history': row.surgical_history or [],
+            'family_medical_history': row.family_medical_history,
+            'immunizations': row.immunizations or [],
+            'smoking_status': row.smoking_status,
+            'alcohol_consumption': row.alcohol_consumption,
+            'exercise_frequency': row.exercise_frequency,
+            'diet_restrictions': row.diet_restrictions,
+            'occupation': row.occupation,
+            'emergency_contact_name': row.emergency_contact_name,
+            'emergency_contact_phone': row.emergency_contact_phone,
+            'emergency_contact_relationship': row.emergency_contact_relationship,
+            'primary_physician': row.primary_physician,
+            'primary_physician_phone': row.primary_physician_phone,
+            'insurance_provider': row.insurance_provider,
+            'insurance_policy_number': row.insurance_policy_number,
+            'created_at': row.created_at,
+            'updated_at': row.updated_at
+        }
+    
+    # Columns read by to_summary_dict, for load_only in list views
+    SUMMARY_COLUMNS = ('id', 'first_name', 'last_name', 'date_of_birth', 'gender')
+    
+    def to_summary_dict(self):
+        """Convert to the short dictionary used by list views, without medical or contact details."""
+        return self.row_to_summary_dict(self)
+    
+    @staticmethod
+    def row_to_summary_dict(row):
+        """Build the :meth:`to_summary_dict` output from a row with the SUMMARY_COLUMNS."""
+        return {
+            'id': row.id,
+            'first_name': row.first_name,
+            'last_name': row.last_name,
+            'full_name': f"{row.first_name} {row.last_name}",
+            'age': _age_from(row.date_of_birth),
+            'gender': row.gender
         }
 
 
@@ -271,24 +324,67 @@ class AppointmentStatus(Enum):
     CANCELLED = "cancelled"
 
 
+# Free-text urgencies (e.g. from the assessment model) and the level each stands for
+_URGENCY_SYNONYMS = {
+    "moderate": "medium",
+    "urgent": "high",
+    "severe": "high",
+    "immediate": "emergency",
+    "critical": "emergency"
+}
+
+class UrgencyLevel(Enum):
+    """Enum for appointment urgency levels, least to most severe.
+    
+    The database enum is declared in this order, so ORDER BY urgency_level
+    sorts by severity.
+    """
+    LOW = "low"
+    MEDIUM = "medium"
+    HIGH = "high"
+    EMERGENCY = "emergency"
+    
+    @classmethod
+    def normalize(cls, value):
+        """Return the level value for an urgency string, or None if it isn't recognized."""
+        if not isinstance(value, str):
+            return None
+        value = value.strip().lower()
+        value = _URGENCY_SYNONYMS.get(value, value)
+        return value if value in cls._value2member_map_ else None
+
+
 class Appointment(db.Model):
     """Model for patient appointments, especially emergency ones created from symptom assessments."""
     __tablename__ = 'appointments'
     
     id = db.Column(db.Integer, primary_key=True)
     patient_id = db.Column(db.Integer, db.ForeignKey('profiles.id'))
-    assessment_id = db.Column(db.Integer, db.ForeignKey('symptom_assessments.id'), nullable=True)  # Optional link to an assessment
+    assessment_id = db.Column(db.Integer, db.ForeignKey('symptom_assessments.id'), nullable=True, index=True)  # Optional link to an assessment
     title = db.Column(db.String(255), nullable=False)
     description = db.Column(db.Text, nullable=True)
-    urgency_level = db.Column(db.String(20), nullable=False)  # high, medium, low
-    status = db.Column(db.String(20), default=AppointmentStatus.PENDING.value, nullable=False)
+    # Native PostgreSQL enums: 4 bytes each, and urgency sorts by severity rather than alphabetically
+    urgency_level = db.Column(db.Enum(*[level.value for level in UrgencyLevel], name='urgency_level_enum'),
+                              nullable=False)
+    status = db.Column(db.Enum(*[status.value for status in AppointmentStatus], name='appointment_status_enum'),
+                       default=AppointmentStatus.PENDING.value, nullable=False)
     appointment_time = db.Column(db.DateTime, nullable=True)  # Can be null for pending emergency appointments
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
-    patient = db.relationship('Profile', backref='appointments')
-    assessment = db.relationship('SymptomAssessment', backref='appointments')
+    # Relationships raise instead of lazy loading, so queries must load them explicitly
+    patient = db.relationship('Profile', back_populates='appointments', lazy='raise_on_sql')
+    assessment = db.relationship('SymptomAssessment', back_populates='appointments', lazy='raise_on_sql')
+    
+    __table_args__ = (
+        # Match the listing's ORDER BY, so it is read in index order without a sort,
+        # also when filtered by patient. Leading with patient_id, it also serves the
+        # foreign key, e.g. unlinking a deleted profile's appointments
+        db.Index('ix_appointments_urgency_created', urgency_level.desc(), created_at.desc()),
+        db.Index('ix_appointments_patient_urgency_created', patient_id, urgency_level.desc(), created_at.desc()),
+        db.Index('ix_appointments_status', status),
+    )
     
     def __repr__(self):
         return f'<Appointment {self.id}: {self.title} (Urgency: {self.urgency_level})>'
@@ -303,11 +399,28 @@ class Appointment(db.Model):
             'description': self.description,
             'urgency_level': self.urgency_level,
             'status': self.status,
-            'appointment_time': self.appointment_time.isoformat() if self.appointment_time else None,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            'appointment_time': self.appointment_time,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
             'patient': self.patient.to_dict() if self.patient else None
         }
+    
+    # Columns read by to_summary_dict, for load_only in list views
+    SUMMARY_COLUMNS = ('id', 'patient_id', 'assessment_id', 'title', 'urgency_level', 'status',
+                       'appointment_time', 'created_at')
+    
+    def to_summary_dict(self):
+        """Convert to the short dictionary used by list views, without the description or patient."""
+        return {
+            'id': self.id,
+            'patient_id': self.patient_id,
+            'assessment_id': self.assessment_id,
+            'title': self.title,
+            'urgency_level': self.urgency_level,
+            'status': self.status,
+            'appointment_time': self.appointment_time,
+            'created_at': self.created_at
+        }
 
 
 class SymptomAssessment(db.Model):
@@ -315,7 +428,7 @@ class SymptomAssessment(db.Model):
     __tablename__ = 'symptom_assessments'
     
     id = db.Column(db.Integer, primary_key=True)
-    patient_id = db.Column(db.String(50), nullable=True)  # Nullable for anonymous users
+    patient_id = db.Column(db.String(50), nullable=True, index=True)  # Nullable for anonymous users
     symptoms = db.Column(db.Text, nullable=False)
     age = db.Column(db.Integer, nullable=True)
     sex = db.Column(db.String(20), nullable=True)
@@ -323,9 +436,9 @@ class SymptomAssessment(db.Model):
     urgency_level = db.Column(db.String(20), nullable=False)
     urgency_description = db.Column(db.Text, nullable=False)
     reasoning = db.Column(db.Text, nullable=False)
-    recommendations = db.Column(db.Text, nullable=False)  # Stored as JSON string
-    dos = db.Column(db.Text, nullable=True)  # Stored as JSON string for do's
-    donts = db.Column(db.Text, nullable=True)  # Stored as JSON string for don'ts
+    recommendations = db.Column(JSONB, nullable=False)  # List of recommendations
+    dos = db.Column(JSONB, nullable=True)  # List of do's
+    donts = db.Column(JSONB, nullable=True)  # List of don'ts
     disclaimer = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
@@ -336,42 +449,44 @@ class SymptomAssessment(db.Model):
     clinical_trials = db.relationship('ClinicalTrial', back_populates='assessment', cascade='all, delete-orphan')
     # The used_documents field was removed as it doesn't exist in the database schema
     
+    # Appointments created from this assessment; never loaded implicitly
+    appointments = db.relationship('Appointment', back_populates='assessment', lazy='raise_on_sql')
+    
     def __repr__(self):
         return f'<SymptomAssessment {self.id}: {self.urgency_level}>'
     
     def to_dict(self):
         """Convert instance to dictionary."""
-        try:
-            recommendations = json.loads(self.recommendations)
-        except:
-            recommendations = [self.recommendations]
+        return self.row_to_dict(self, self.references, self.clinical_trials)
+    
+    @staticmethod
+    def row_to_dict(row, references, clinical_trials):
+        """Build the :meth:`to_dict` output from anything exposing the columns as attributes.
         
-        # Parse dos and donts if available
-        try:
-            dos = json.loads(self.dos) if self.dos else []
-        except:
-            dos = []
-            
-        try:
-            donts = json.loads(self.donts) if self.donts else []
-        except:
-            donts = []
+        Lets listings serialize Core result rows without building ORM instances.
+        The references and trials may be rows too, since their to_dict methods
+        only read columns.
+        """
+        # Older rows may hold a single recommendation rather than a list
+        recommendations = row.recommendations
+        if not isinstance(recommendations, list):
+            recommendations = [recommendations] if recommendations else []
             
         return {
-            'id': self.id,
-            'patient_id': self.patient_id,
-            'symptoms': self.symptoms,
-            'age': self.age,
-            'sex': self.sex,
-            'medical_history': self.medical_history,
-            'urgency_level': self.urgency_level,
-            'urgency_description': self.urgency_description,
-            'reasoning': self.reasoning,
+            'id': row.id,
+            'patient_id': row.patient_id,
+            'symptoms': row.symptoms,
+            'age': row.age,
+            'sex': row.sex,
+            'medical_history': row.medical_history,
+            'urgency_level': row.urgency_level,
+            'urgency_description': row.urgency_description,
+            'reasoning': row.reasoning,
             'recommendations': recommendations,
-            'dos': dos,
-            'donts': donts,
-            'disclaimer': self.disclaimer,
-            'created_at': self.created_at.isoformat(),
-            'references': [ref.to_dict() for ref in self.references],
-            'clinical_trials': [trial.to_dict() for trial in self.clinical_trials]
+            'dos': row.dos or [],
+            'donts': row.donts or [],
+            'disclaimer': row.disclaimer,
+            'created_at': row.created_at,
+            'references': [PubMedReference.to_dict(ref) for ref in references],
+            'clinical_trials': [ClinicalTrial.to_dict(trial) for trial in clinical_trials]
         }
@@ -0,0 +1,48 @@
+"""Per-process cache of serialized single-object GET responses, validated by ETag."""
+import hashlib
+import threading
+import orjson
+from cachetools import TTLCache
+from flask import Response, request
+
+# Seconds a serialized response is kept. Entries are keyed by the object's
+# version, so an edit is picked up straight away rather than after the TTL.
+RESPONSE_CACHE_TTL = 300
+_response_cache = TTLCache(maxsize=2048, ttl=RESPONSE_CACHE_TTL)
+_response_cache_lock = threading.Lock()
+
+def cached_object_response(kind: str, object_id: int, version, load) -> Response:
+    """Return the JSON response for one object, from the cache or as 304 Not Modified when possible.
+    
+    Clients may keep the response but must revalidate it (``no-cache``); a
+    request whose ``If-None-Match`` matches the current ETag gets an empty
+    304 without the object being loaded or serialized.
+    
+    Args:
+        kind: Name of the object type, e.g. ``"profile"``
+        object_id: The object's id
+        version: Values that change whenever the response would, e.g. its updated_at
+        load: Called on a cache miss; returns the dict to serialize
+    
+    Returns:
+        The response
+    """
+    etag = f"{kind}-{object_id}-{hashlib.md5(orjson.dumps(version)).hexdigest()}"
+    
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        key = (kind, object_id, etag)
+        # TTLCache isn't thread-safe: a get can expire entries, so reads take the lock too
+        with _response_cache_lock:
+            body = _response_cache.get(key)
+        if body is None:
+            body = orjson.dumps(load())
+            with _response_cache_lock:
+                _response_cache[key] = body
+        response = Response(body, mimetype='application/json')
+    
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
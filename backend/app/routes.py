@@ -1,15 +1,36 @@
-from flask import Blueprint, jsonify, request
-import json
-from datetime import datetime
+from flask import Blueprint, abort, jsonify, request
+from datetime import date, datetime
+from sqlalchemy import select, update
 from . import db
-from .models import Item, Profile
+from .models import Appointment, Item, Profile
+from .response_cache import cached_object_response
+
+# Largest page of profiles returned at once
+MAX_PAGE_SIZE = 200
+
+# Profile fields stored as JSONB lists
+PROFILE_LIST_FIELDS = ('allergies', 'medications', 'chronic_conditions', 'surgical_history', 'immunizations')
+
+def _invalid_list_fields(data):
+    """Return the names of list fields in ``data`` that hold something other than a list or null."""
+    return [field for field in PROFILE_LIST_FIELDS
+            if data.get(field) is not None and not isinstance(data[field], list)]
 
 def parse_date(date_str):
-    """Parse a date string in YYYY-MM-DD format."""
+    """Parse a date string in YYYY-MM-DD format.
+    
+    Raises:
+        ValueError: If the value is not a valid YYYY-MM-DD date
+    """
     if not date_str:
         return None
+    if not isinstance(date_str, str):
+        raise ValueError(f"Expected a date string, got {type(date_str).__name__}")
     return datetime.strptime(date_str, '%Y-%m-%d').date()
 
+def _invalid_date_response():
+    return jsonify({'error': 'Invalid date_of_birth. Use YYYY-MM-DD'}), 400
+
 # Create Blueprint
 main_bp = Blueprint('main', __name__, url_prefix='/api')
 
@@ -21,9 +42,12 @@ def get_items():
 
 @main_bp.route('/items/<int:item_id>', methods=['GET'])
 def get_item(item_id):
-    """Get a specific item by ID."""
-    item = Item.query.get_or_404(item_id)
-    return jsonify(item.to_dict())
+    """Get a specific item by ID; cached and conditional on its updated_at."""
+    version = db.session.execute(select(Item.updated_at).where(Item.id == item_id)).first()
+    if version is None:
+        abort(404)
+    return cached_object_response('item', item_id, list(version),
+                                  lambda: db.get_or_404(Item, item_id).to_dict())
 
 @main_bp.route('/items', methods=['POST'])
 def create_item():
@@ -39,14 +63,17 @@ def create_item():
     )
     
     db.session.add(new_item)
+    # The INSERT returns the new id; serializing before the commit expires the item saves re-reading it
+    db.session.flush()
+    body = new_item.to_dict()
     db.session.commit()
     
-    return jsonify(new_item.to_dict()), 201
+    return jsonify(body), 201
 
 @main_bp.route('/items/<int:item_id>', methods=['PUT'])
 def update_item(item_id):
     """Update an existing item."""
-    item = Item.query.get_or_404(item_id)
+    item = db.get_or_404(Item, item_id)
     data = request.get_json()
     
     if 'name' in data:
@@ -54,14 +81,16 @@ def update_item(item_id):
     if 'description' in data:
         item.description = data['description']
     
+    db.session.flush()
+    body = item.to_dict()
     db.session.commit()
     
-    return jsonify(item.to_dict())
+    return jsonify(body)
 
 @main_bp.route('/items/<int:item_id>', methods=['DELETE'])
 def delete_item(item_id):
     """Delete an item."""
-    item = Item.query.get_or_404(item_id)
+    item = db.get_or_404(Item, item_id)
     
     db.session.delete(item)
     db.session.commit()
@@ -72,15 +101,51 @@ def delete_item(item_id):
 # Profile Routes
 @main_bp.route('/profiles', methods=['GET'])
 def get_profiles():
-    """Get all patient profiles."""
-    profiles = Profile.query.all()
-    return jsonify([profile.to_dict() for profile in profiles])
+    """Get all patient profiles.
+    
+    ``view=summary`` returns short entries (name, age, gender) read with only
+    those columns. ``limit`` (at most 200) returns one page, ordered by id; the
+    next page is requested with ``after`` set to the ``X-Next-Cursor`` header,
+    which is absent on the last page.
+    """
+    summary = request.args.get('view') == 'summary'
+    # Read plain rows rather than ORM instances; the listing never modifies them
+    table = Profile.__table__
+    if summary:
+        query = select(*[table.c[column] for column in Profile.SUMMARY_COLUMNS])
+        serialize = Profile.row_to_summary_dict
+    else:
+        query = select(table)
+        serialize = Profile.row_to_dict
+    
+    limit = request.args.get('limit', type=int)
+    if limit:
+        limit = min(max(limit, 1), MAX_PAGE_SIZE)
+        after_id = request.args.get('after', 0, type=int)
+        query = query.where(table.c.id > after_id).order_by(table.c.id).limit(limit + 1)
+    profiles = db.session.execute(query).all()
+    
+    has_more = bool(limit) and len(profiles) > limit
+    if has_more:
+        profiles = profiles[:limit]
+    response = jsonify([serialize(profile) for profile in profiles])
+    if has_more:
+        response.headers['X-Next-Cursor'] = str(profiles[-1].id)
+    return response
 
 @main_bp.route('/profiles/<int:profile_id>', methods=['GET'])
 def get_profile(profile_id):
-    """Get a specific patient profile by ID."""
-    profile = Profile.query.get_or_404(profile_id)
-    return jsonify(profile.to_dict())
+    """Get a specific patient profile by ID.
+    
+    Only the profile's updated_at is read to build the ETag; the full row is
+    loaded when the response isn't cached. The date is part of the version
+    because the age in the response is computed from it.
+    """
+    version = db.session.execute(select(Profile.updated_at).where(Profile.id == profile_id)).first()
+    if version is None:
+        abort(404)
+    return cached_object_response('profile', profile_id, [*version, date.today()],
+                                  lambda: db.get_or_404(Profile, profile_id).to_dict())
 
 @main_bp.route('/profiles', methods=['POST'])
 def create_profile():
@@ -90,18 +155,19 @@ def create_profile():
     if not data or 'first_name' not in data or 'last_name' not in data:
         return jsonify({'error': 'First name and last name are required'}), 400
     
-    # Convert JSON strings to Python objects where needed
-    allergies = json.dumps(data.get('allergies', [])) if data.get('allergies') else None
-    medications = json.dumps(data.get('medications', [])) if data.get('medications') else None
-    chronic_conditions = json.dumps(data.get('chronic_conditions', [])) if data.get('chronic_conditions') else None
-    surgical_history = json.dumps(data.get('surgical_history', [])) if data.get('surgical_history') else None
-    immunizations = json.dumps(data.get('immunizations', [])) if data.get('immunizations') else None
+    # Check the list fields once here, so reads can use the stored values as they are
+    invalid_fields = _invalid_list_fields(data)
+    if invalid_fields:
+        return jsonify({'error': f"Must be lists: {', '.join(invalid_fields)}"}), 400
+    try:
+        date_of_birth = parse_date(data.get('date_of_birth'))
+    except ValueError:
+        return _invalid_date_response()
     
     new_profile = Profile(
         first_name=data['first_name'],
         last_name=data['last_name'],
-        date_of_birth=parse_date(data.get('date_of_birth')),
-        age=data.get('age'),
+        date_of_birth=date_of_birth,
         gender=data.get('gender'),
         email=data.get('email'),
         phone=data.get('phone'),
@@ -112,14 +178,13 @@ def create_profile():
         height=data.get('height'),
         weight=data.get('weight'),
         blood_type=data.get('blood_type'),
-        bmi=data.get('bmi'),
-        allergies=allergies,
-        medications=medications,
-        chronic_conditions=chronic_conditions,
+        allergies=data.get('allergies') or None,
+        medications=data.get('medications') or None,
+        chronic_conditions=data.get('chronic_conditions') or None,
         medical_history=data.get('medical_history'),
-        surgical_history=surgical_history,
+        surgical_history=data.get('surgical_history') or None,
         family_medical_history=data.get('family_medical_history'),
-        immunizations=immunizations,
+        immunizations=data.get('immunizations') or None,
         smoking_status=data.get('smoking_status'),
         alcohol_consumption=data.get('alcohol_consumption'),
         exercise_frequency=data.get('exercise_frequency'),
@@ -135,16 +200,29 @@ def create_profile():
     )
     
     db.session.add(new_profile)
+    # The INSERT returns the id and BMI; serializing before the commit expires the profile saves re-reading it
+    db.session.flush()
+    body = new_profile.to_dict()
     db.session.commit()
     
-    return jsonify(new_profile.to_dict()), 201
+    return jsonify(body), 201
 
 @main_bp.route('/profiles/<int:profile_id>', methods=['PUT'])
 def update_profile(profile_id):
     """Update an existing patient profile."""
-    profile = Profile.query.get_or_404(profile_id)
+    profile = db.get_or_404(Profile, profile_id)
     data = request.get_json()
     
+    # Check the list fields and date before changing anything
+    invalid_fields = _invalid_list_fields(data)
+    if invalid_fields:
+        return jsonify({'error': f"Must be lists: {', '.join(invalid_fields)}"}), 400
+    if 'date_of_birth' in data:
+        try:
+            date_of_birth = parse_date(data['date_of_birth'])
+        except ValueError:
+            return _invalid_date_response()
+    
     # Update profile fields if provided in the request
     for field in [
         'first_name', 'last_name', 'email', 'phone', 'address', 'city', 'state',
@@ -157,36 +235,35 @@ def update_profile(profile_id):
         if field in data:
             setattr(profile, field, data[field])
     
-    # Handle numeric fields
-    for field in ['age', 'height', 'weight', 'bmi']:
+    # Handle numeric fields; age and BMI are derived from these and date_of_birth
+    for field in ['height', 'weight']:
         if field in data:
             setattr(profile, field, data[field])
     
     # Handle date field
     if 'date_of_birth' in data:
-        profile.date_of_birth = parse_date(data['date_of_birth'])
+        profile.date_of_birth = date_of_birth
     
     # Handle JSON fields
-    if 'allergies' in data:
-        profile.allergies = json.dumps(data['allergies'])
-    if 'medications' in data:
-        profile.medications = json.dumps(data['medications'])
-    if 'chronic_conditions' in data:
-        profile.chronic_conditions = json.dumps(data['chronic_conditions'])
-    if 'surgical_history' in data:
-        profile.surgical_history = json.dumps(data['surgical_history'])
-    if 'immunizations' in data:
-        profile.immunizations = json.dumps(data['immunizations'])
+    for field in PROFILE_LIST_FIELDS:
+        if field in data:
+            setattr(profile, field, data[field])
     
+    # The UPDATE returns the recomputed BMI (eager_defaults); serialize before the commit expires the profile
+    db.session.flush()
+    body = profile.to_dict()
     db.session.commit()
     
-    return jsonify(profile.to_dict())
+    return jsonify(body)
 
 @main_bp.route('/profiles/<int:profile_id>', methods=['DELETE'])
 def delete_profile(profile_id):
     """Delete a patient profile."""
-    profile = Profile.query.get_or_404(profile_id)
+    profile = db.get_or_404(Profile, profile_id)
     
+    # Keep the profile's appointments, unlinked, without loading them
+    db.session.execute(update(Appointment).where(Appointment.patient_id == profile_id)
+                       .values(patient_id=None, updated_at=datetime.utcnow()))
     db.session.delete(profile)
     db.session.commit()
     
@@ -0,0 +1,14 @@
+"""ASGI entry point for serving the backend with uvicorn.
+
+Run with:
+    uvicorn asgi:asgi_app --workers 4
+"""
+from asgiref.wsgi import WsgiToAsgi
+
+from app import create_app
+
+app = create_app()
+
+# The Flask routes stay synchronous and run in asgiref's thread pool, while the
+# OpenAI and literature calls are multiplexed on the symptom agent's event loop
+asgi_app = WsgiToAsgi(app)
@@ -1,12 +1,16 @@
-"""Script to create database tables for the Nuverse Hackathon project."""
-from app import create_app, db
-from app.models import Item, SymptomAssessment, PubMedReference, Profile, MedicalDocument
+"""Script to create database tables for the Nuverse Hackathon project.
+
+Applies the Alembic migrations in migrations/versions, the same as
+``flask db upgrade``.
+"""
+from flask_migrate import upgrade
+from app import create_app
 
 # Create Flask app
 app = create_app()
 
 # Create database tables
 with app.app_context():
-    print("Creating database tables...")
-    db.create_all()
+    print("Applying database migrations...")
+    upgrade()
     print("Database tables created successfully!")
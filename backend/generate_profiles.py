@@ -1,8 +1,11 @@
 """Script to generate 20 random patient profiles and insert them into the database."""
+import csv
+import io
 import random
-import json
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import sys
+import orjson
+from sqlalchemy import select
 from app import create_app, db
 from app.models import Profile
 
@@ -10,6 +13,14 @@ from app.models import Profile
 app = create_app()
 app.app_context().push()
 
+# Columns of the generated profiles, in COPY order; the JSON lists are encoded for COPY
+COPY_COLUMNS = [
+    "first_name", "last_name", "date_of_birth", "email", "phone", "gender", "blood_type",
+    "height", "weight", "allergies", "chronic_conditions", "primary_physician",
+    "insurance_provider", "medical_history", "created_at", "updated_at"
+]
+JSON_COLUMNS = {"allergies", "chronic_conditions"}
+
 # Lists for generating realistic data
 first_names = [
     "Emma", "Liam", "Olivia", "Noah", "Ava", "William", "Sophia", "James", 
@@ -25,6 +36,12 @@ last_names = [
     "White", "Harris", "Sanchez", "Clark", "Ramirez", "Lewis", "Robinson"
 ]
 
+# Profiles are deduplicated on name, so no run can create more than this many
+MAX_DISTINCT_NAMES = len(first_names) * len(last_names)
+# Batches at least this large are loaded with COPY instead of a batched INSERT;
+# kept well below MAX_DISTINCT_NAMES so a large run into an empty table reaches it
+COPY_THRESHOLD = 200
+
 blood_types = ["A+", "A-", "B+", "B-", "AB+", "AB-", "O+", "O-"]
 
 chronic_conditions_list = [
@@ -55,6 +72,9 @@ medical_history_templates = [
     "Patient reports {surgery} at age {surgery_age}. Has been on medication for {condition1} ({treatment1}) for the past {years1} years with good control."
 ]
 
+# Bound format_map of each template, called with one reused dict of fields per profile
+medical_history_formatters = [template.format_map for template in medical_history_templates]
+
 conditions = [
     "hypertension", "type 2 diabetes", "asthma", "migraines", "hypothyroidism", 
     "hyperlipidemia", "osteoarthritis", "anxiety disorder", "depression", "GERD", 
@@ -79,123 +99,172 @@ surgeries = [
     "hip replacement", "spinal fusion", "carpal tunnel release"
 ]
 
+def pick_two(items, randrange=random.randrange):
+    """Pick two different items from a list without copying it."""
+    first = randrange(len(items))
+    second = randrange(len(items) - 1)
+    if second >= first:
+        second += 1
+    return items[first], items[second]
+
+def generate_random_profiles(count):
+    """Generate a number of random patient profiles.
+    
+    Each independent field is drawn for all profiles at once with
+    random.choices, instead of one random call per field per profile; only
+    the draws that depend on other fields are made per profile.
+    """
+    genders = random.choices(["Male", "Female"], k=count)
+    first = random.choices(first_names, k=count)
+    last = random.choices(last_names, k=count)
+    ages = random.choices(range(18, 86), k=count)
+    birth_months = random.choices(range(1, 13), k=count)
+    birth_days = random.choices(range(1, 29), k=count)  # Using 28 to avoid month/day validation issues
+    email_numbers = random.choices(range(1, 1000), k=count)
+    phone_parts = zip(random.choices(range(200, 1000), k=count),
+                      random.choices(range(100, 1000), k=count),
+                      random.choices(range(1000, 10000), k=count))
+    
+    # Random height (in cm) and weight (in kg) for both genders, picked by gender below
+    male_heights = random.choices(range(150, 196), k=count)
+    female_heights = random.choices(range(145, 181), k=count)
+    male_weights = random.choices(range(60, 111), k=count)
+    female_weights = random.choices(range(45, 96), k=count)
+    
+    # 70% chance of 1-4 chronic conditions and 40% chance of 1-3 allergies, each count equally likely
+    chronic_counts = random.choices(range(5), weights=[12, 7, 7, 7, 7], k=count)
+    allergy_counts = random.choices(range(4), weights=[18, 4, 4, 4], k=count)
+    
+    # Medical history
+    history_years = random.choices(range(1, 16), k=count)
+    chosen_surgeries = random.choices(surgeries, k=count)
+    formatters = random.choices(medical_history_formatters, k=count)
+    
+    blood = random.choices(blood_types, k=count)
+    physicians = random.choices(last_names, k=count)
+    insurers = random.choices(insurance_providers, k=count)
+    
+    # Local aliases for the random functions called per profile in the loop below
+    sample = random.sample
+    randint = random.randint
+    
+    # Birth dates built for the whole batch at once, straight as dates
+    current_year = datetime.now().year
+    birth_years = [current_year - age for age in ages]
+    dates_of_birth = list(map(date, birth_years, birth_months, birth_days))
+    
+    history_fields = {}
+    profiles = []
+    for i, (phone1, phone2, phone3) in enumerate(phone_parts):
+        gender = genders[i]
+        first_name = first[i]
+        last_name = last[i]
+        age = ages[i]
+        birth_year = birth_years[i]
+        
+        history_fields["condition1"], history_fields["condition2"] = pick_two(conditions)
+        history_fields["treatment1"], history_fields["treatment2"] = pick_two(treatments)
+        years1 = history_years[i]
+        surgery_year = birth_year + randint(10, min(age-5, 40))
+        history_fields["years1"] = years1
+        history_fields["years2"] = randint(1, years1)
+        history_fields["surgery"] = chosen_surgeries[i]
+        history_fields["surgery_year"] = surgery_year
+        history_fields["surgery_age"] = surgery_year - birth_year
+        medical_history = formatters[i](history_fields)
+        
+        # Profile fields that match the Profile model
+        profiles.append({
+            "first_name": first_name,
+            "last_name": last_name,
+            "date_of_birth": dates_of_birth[i],
+            "email": f"{first_name.lower()}.{last_name.lower()}{email_numbers[i]}@example.com",
+            "phone": f"+1-{phone1}-{phone2}-{phone3}",
+            "gender": gender,
+            "blood_type": blood[i],
+            "height": male_heights[i] if gender == "Male" else female_heights[i],
+            "weight": male_weights[i] if gender == "Male" else female_weights[i],
+            "allergies": sample(allergy_list, allergy_counts[i]) or None,
+            "chronic_conditions": sample(chronic_conditions_list, chronic_counts[i]) or None,
+            "primary_physician": f"Dr. {physicians[i]}",
+            "insurance_provider": insurers[i],
+            "medical_history": medical_history
+        })
+    
+    return profiles
+
 def generate_random_profile():
     """Generate a random patient profile."""
-    gender = random.choice(["Male", "Female"])
-    first_name = random.choice(first_names)
-    last_name = random.choice(last_names)
-    
-    age = random.randint(18, 85)
-    # Generate a random birth date
-    today = datetime.now()
-    birth_year = today.year - age
-    birth_month = random.randint(1, 12)
-    birth_day = random.randint(1, 28)  # Using 28 to avoid month/day validation issues
-    date_of_birth = datetime(birth_year, birth_month, birth_day).date()
-    
-    email = f"{first_name.lower()}.{last_name.lower()}{random.randint(1, 999)}@example.com"
-    phone = f"+1-{random.randint(200, 999)}-{random.randint(100, 999)}-{random.randint(1000, 9999)}"
-    
-    # Generate random height (in cm) and weight (in kg) appropriate for age
-    if age < 18:
-        height = random.randint(120, 170)
-        weight = random.randint(30, 70)
-    else:
-        height = random.randint(150, 195) if gender == "Male" else random.randint(145, 180)
-        weight = random.randint(60, 110) if gender == "Male" else random.randint(45, 95)
-    
-    # Randomly decide if the patient has chronic conditions
-    has_chronic = random.random() < 0.7  # 70% chance to have at least one chronic condition
-    chronic_count = random.randint(1, 4) if has_chronic else 0
-    chronic_conditions = random.sample(chronic_conditions_list, chronic_count) if chronic_count > 0 else []
-    
-    # Randomly decide if the patient has allergies
-    has_allergies = random.random() < 0.4  # 40% chance to have allergies
-    allergy_count = random.randint(1, 3) if has_allergies else 0
-    allergies = random.sample(allergy_list, allergy_count) if allergy_count > 0 else []
-    
-    # Generate medical history
-    condition1 = random.choice(conditions)
-    condition2 = random.choice([c for c in conditions if c != condition1])
-    treatment1 = random.choice(treatments)
-    treatment2 = random.choice([t for t in treatments if t != treatment1])
-    years1 = random.randint(1, min(15, age))
-    years2 = random.randint(1, years1)
-    surgery = random.choice(surgeries)
-    surgery_year = birth_year + random.randint(10, min(age-5, 40))
-    surgery_age = surgery_year - birth_year
-    
-    template = random.choice(medical_history_templates)
-    medical_history = template.format(
-        condition1=condition1,
-        condition2=condition2,
-        treatment1=treatment1,
-        treatment2=treatment2,
-        years1=years1,
-        years2=years2,
-        surgery=surgery,
-        surgery_year=surgery_year,
-        surgery_age=surgery_age
-    )
-    
-    # Create profile object with fields that match the Profile model
-    return {
-        "first_name": first_name,
-        "last_name": last_name,
-        "date_of_birth": date_of_birth,
-        "email": email,
-        "phone": phone,
-        "gender": gender,
-        "age": age,
-        "blood_type": random.choice(blood_types),
-        "height": height,
-        "weight": weight,
-        "allergies": json.dumps(allergies) if allergies else None,
-        "chronic_conditions": json.dumps(chronic_conditions) if chronic_conditions else None,
-        "primary_physician": f"Dr. {random.choice(last_names)}",
-        "insurance_provider": random.choice(insurance_providers),
-        "medical_history": medical_history
-    }
+    return generate_random_profiles(1)[0]
+
+def copy_profiles(rows):
+    """Load generated profiles with COPY FROM STDIN in a single transaction."""
+    # COPY doesn't run the model's Python-side defaults
+    now = datetime.utcnow()
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        row["created_at"] = row["updated_at"] = now
+        writer.writerow([
+            "" if row[column] is None else
+            orjson.dumps(row[column]).decode() if column in JSON_COLUMNS else row[column]
+            for column in COPY_COLUMNS
+        ])
+    buffer.seek(0)
+    
+    connection = db.engine.raw_connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.copy_expert(f"COPY profiles ({', '.join(COPY_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buffer)
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
 
 def create_profiles(count):
     """Create a specified number of patient profiles and insert into the database."""
     print(f"Generating {count} patient profiles...")
     
-    # Check if profiles already exist
-    existing_count = Profile.query.count()
-    if existing_count > 0:
-        print(f"Database already contains {existing_count} profiles.")
-    
-    # Generate and insert profiles
-    profiles_created = 0
+    # Fetch the names already in the database once, rather than querying per candidate
+    existing_names = set(db.session.execute(select(Profile.first_name, Profile.last_name)).tuples())
+    if existing_names:
+        print(f"Database already contains profiles for {len(existing_names)} names.")
+    # End that read so its connection isn't left idle in a transaction meanwhile
+    db.session.close()
     
-    for _ in range(count):
-        profile_data = generate_random_profile()
-        
-        # Check if profile with this name already exists
-        existing = Profile.query.filter_by(
-            first_name=profile_data["first_name"],
-            last_name=profile_data["last_name"]
-        ).first()
-        
-        if existing:
-            print(f"Profile for {profile_data['first_name']} {profile_data['last_name']} already exists, skipping.")
+    # Generate the profiles, skipping names that already exist
+    rows = []
+    skipped = 0
+    for profile_data in generate_random_profiles(count):
+        name = (profile_data["first_name"], profile_data["last_name"])
+        if name in existing_names:
+            skipped += 1
             continue
-        
-        # Create a new profile
-        new_profile = Profile(**profile_data)
-        db.session.add(new_profile)
-        
-        try:
+        existing_names.add(name)
+        rows.append(profile_data)
+    if skipped:
+        print(f"Skipped {skipped} profiles whose names already exist.")
+    
+    if not rows:
+        print("No new patient profiles to create.")
+        return 0
+    
+    # Insert them all in one batched INSERT, or COPY for large batches, in a single transaction
+    try:
+        if len(rows) >= COPY_THRESHOLD:
+            copy_profiles(rows)
+        else:
+            db.session.execute(Profile.__table__.insert(), rows)
             db.session.commit()
-            profiles_created += 1
-            print(f"Created profile for {profile_data['first_name']} {profile_data['last_name']}")
-        except Exception as e:
-            db.session.rollback()
-            print(f"Error creating profile: {str(e)}")
-    
-    print(f"Successfully created {profiles_created} new patient profiles.")
-    return profiles_created
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error creating profiles: {str(e)}")
+        return 0
+    
+    print(f"Successfully created {len(rows)} new patient profiles.")
+    return len(rows)
 
 if __name__ == "__main__":
     # Get number of profiles to create from command line argument, default to 20
@@ -0,0 +1,25 @@
+"""Gunicorn configuration for serving the backend in production.
+
+Run with:
+    gunicorn -c gunicorn_conf.py
+
+Assessment requests spend most of their time waiting on OpenAI and PubMed.
+That I/O is multiplexed on the symptom agent's event loop, so each worker
+thread only blocks on a future. Threaded workers are used instead of gevent
+because monkey-patching would interfere with the agent's event loop thread.
+"""
+import multiprocessing
+import os
+
+wsgi_app = "run:app"
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+
+worker_class = "gthread"
+workers = int(os.environ.get("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+# Concurrent requests per worker; keep DB_POOL_SIZE + DB_MAX_OVERFLOW at or above this
+threads = int(os.environ.get("GUNICORN_THREADS", "16"))
+
+# Assessments can take tens of seconds when OpenAI is slow or retrying
+timeout = 120
+graceful_timeout = 30
+keepalive = 5
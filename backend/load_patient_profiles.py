@@ -1,88 +1,188 @@
 """Script to load patient profiles from CSV into the database."""
-import csv
-import json
+import io
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
+import orjson
+import pandas as pd
+from sqlalchemy import select
 from app import create_app, db
 from app.models import Profile
 
-def parse_date(date_str):
-    """Parse a date string in YYYY-MM-DD format."""
-    if not date_str:
-        return None
-    return datetime.strptime(date_str, '%Y-%m-%d').date()
+# Create Flask app context once for the whole import
+app = create_app()
+app.app_context().push()
+
+# Rows read from the CSV and sent per COPY
+CHUNK_SIZE = 10000
+# Chunks copied in parallel, each on its own connection; gains level off past ~8
+LOAD_WORKERS = 4
+
+# CSV columns loaded into profiles; age and bmi in the CSV are derived by the model instead
+TEXT_COLUMNS = [
+    'first_name', 'last_name', 'gender', 'email', 'phone', 'address', 'city', 'state', 'zip_code',
+    'blood_type', 'medical_history', 'family_medical_history', 'smoking_status', 'alcohol_consumption',
+    'exercise_frequency', 'diet_restrictions', 'occupation', 'emergency_contact_name',
+    'emergency_contact_phone', 'emergency_contact_relationship', 'primary_physician',
+    'primary_physician_phone', 'insurance_provider', 'insurance_policy_number'
+]
+NUMERIC_COLUMNS = ['height', 'weight']
+JSON_COLUMNS = ['allergies', 'medications', 'chronic_conditions', 'surgical_history', 'immunizations']
+COPY_COLUMNS = TEXT_COLUMNS + NUMERIC_COLUMNS + JSON_COLUMNS + ['date_of_birth', 'created_at', 'updated_at']
+
+# Empty CSV cells load as NULL, except in the text columns, which keep '' as before
+COPY_SQL = (
+    f"COPY profiles ({', '.join(COPY_COLUMNS)}) FROM STDIN "
+    f"WITH (FORMAT csv, FORCE_NOT_NULL ({', '.join(TEXT_COLUMNS)}))"
+)
+
+def normalize_json_list(value):
+    """Return a JSON list cell re-encoded for COPY, '' for an empty cell or null.
+    
+    Raises:
+        ValueError: If the cell isn't valid JSON or isn't a list
+    """
+    if not value:
+        return ''
+    parsed = orjson.loads(value)
+    if parsed is None:
+        return ''
+    if not isinstance(parsed, list):
+        raise ValueError(f"expected a list, got {type(parsed).__name__}")
+    return orjson.dumps(parsed).decode()
+
+def profile_frame(df):
+    """Convert a chunk of CSV rows into the COPY_COLUMNS of the profiles table.
+    
+    Dates and numbers are converted for the whole chunk at once and JSON
+    list cells are checked one by one, so a bad value can't fail the COPY
+    of the whole chunk. Rows with an invalid value are reported with their
+    line and left out.
+    
+    Returns:
+        Tuple of (frame of valid rows, number of invalid rows)
+    """
+    df = df[TEXT_COLUMNS + NUMERIC_COLUMNS + JSON_COLUMNS + ['date_of_birth']].copy()
+    errors = {}
+    
+    raw_dates = df['date_of_birth']
+    df['date_of_birth'] = pd.to_datetime(raw_dates, format='%Y-%m-%d', errors='coerce').dt.date
+    for index in df.index[df['date_of_birth'].isna()]:
+        errors.setdefault(index, f"invalid date_of_birth {raw_dates[index]!r}")
+    
+    for column in NUMERIC_COLUMNS:
+        raw = df[column]
+        df[column] = pd.to_numeric(raw, errors='coerce')
+        for index in df.index[df[column].isna() & (raw != '')]:
+            errors.setdefault(index, f"invalid {column} {raw[index]!r}")
+    
+    for column in JSON_COLUMNS:
+        values = []
+        for index, value in df[column].items():
+            try:
+                values.append(normalize_json_list(value))
+            except ValueError as e:
+                values.append('')
+                errors.setdefault(index, f"invalid {column}: {str(e)}")
+        df[column] = values
+    
+    for index, reason in sorted(errors.items()):
+        # The index counts data rows from 0 across chunks; line 1 is the header
+        print(f"Skipping line {index + 2} ({df.at[index, 'first_name']} {df.at[index, 'last_name']}): {reason}")
+    df = df.drop(index=list(errors))
+    
+    # COPY doesn't run the model's Python-side defaults
+    now = datetime.utcnow()
+    df['created_at'] = now
+    df['updated_at'] = now
+    return df[COPY_COLUMNS], len(errors)
+
+def copy_chunk(engine, buffer):
+    """Copy one prepared CSV buffer into profiles on its own connection and commit it."""
+    connection = engine.raw_connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.copy_expert(COPY_SQL, buffer)
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
 
 def load_profiles_from_csv(csv_file):
-    """Load patient profiles from a CSV file into the database."""
+    """Load patient profiles from a CSV file into the database.
+    
+    The file is read in chunks of CHUNK_SIZE rows, which are deduplicated
+    and converted in order here and then streamed to PostgreSQL with COPY
+    by LOAD_WORKERS threads, each chunk in its own transaction. Rows whose
+    name is already in the database, or earlier in the file, or that have
+    an invalid value are skipped and counted.
+    """
     print(f"Loading patient profiles from {csv_file}...")
     
-    # Count existing profiles
-    with app.app_context():
-        existing_count = Profile.query.count()
-        print(f"Found {existing_count} existing profiles in the database.")
-        if existing_count > 0:
-            print("Skipping import as profiles already exist.")
-            return
+    # Fetch the names already in the database once
+    existing_names = set(db.session.execute(select(Profile.first_name, Profile.last_name)).tuples())
+    print(f"Found {len(existing_names)} existing profile names in the database.")
+    # End that read so its connection isn't left idle in a transaction during the load
+    db.session.close()
     
+    # The worker threads have no app context, so they are handed the engine itself
+    engine = db.engine
     profiles_added = 0
+    skipped = 0
+    invalid = 0
+    pending = {}
     
-    with open(csv_file, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        
-        for row in reader:
+    def collect(futures):
+        nonlocal profiles_added
+        for future in futures:
+            rows = pending.pop(future)
             try:
-                with app.app_context():
-                    # Create a new profile
-                    profile = Profile(
-                        first_name=row['first_name'],
-                        last_name=row['last_name'],
-                        date_of_birth=parse_date(row['date_of_birth']),
-                        age=int(row['age']),
-                        gender=row['gender'],
-                        email=row['email'],
-                        phone=row['phone'],
-                        address=row['address'],
-                        city=row['city'],
-                        state=row['state'],
-                        zip_code=row['zip_code'],
-                        height=float(row['height']) if row['height'] else None,
-                        weight=float(row['weight']) if row['weight'] else None,
-                        blood_type=row['blood_type'],
-                        bmi=float(row['bmi']) if row['bmi'] else None,
-                        allergies=row['allergies'],
-                        medications=row['medications'],
-                        chronic_conditions=row['chronic_conditions'],
-                        medical_history=row['medical_history'],
-                        surgical_history=row['surgical_history'],
-                        family_medical_history=row['family_medical_history'],
-                        immunizations=row['immunizations'],
-                        smoking_status=row['smoking_status'],
-                        alcohol_consumption=row['alcohol_consumption'],
-                        exercise_frequency=row['exercise_frequency'],
-                        diet_restrictions=row['diet_restrictions'],
-                        occupation=row['occupation'],
-                        emergency_contact_name=row['emergency_contact_name'],
-                        emergency_contact_phone=row['emergency_contact_phone'],
-                        emergency_contact_relationship=row['emergency_contact_relationship'],
-                        primary_physician=row['primary_physician'],
-                        primary_physician_phone=row['primary_physician_phone'],
-                        insurance_provider=row['insurance_provider'],
-                        insurance_policy_number=row['insurance_policy_number']
-                    )
-                    
-                    # Add to database
-                    db.session.add(profile)
-                    db.session.commit()
-                    profiles_added += 1
-                    print(f"Added profile: {profile.first_name} {profile.last_name}")
+                future.result()
+                profiles_added += rows
+                print(f"Added {rows} profiles ({profiles_added} so far)")
             except Exception as e:
-                print(f"Error adding profile {row.get('first_name')} {row.get('last_name')}: {str(e)}")
+                print(f"Error adding {rows} profiles: {str(e)}")
     
+    with ThreadPoolExecutor(max_workers=LOAD_WORKERS) as executor:
+        # Read every column as text, keeping empty cells as '' like csv.DictReader
+        chunks = pd.read_csv(csv_file, chunksize=CHUNK_SIZE, dtype=str, keep_default_na=False, encoding='utf-8')
+        for chunk in chunks:
+            frame, chunk_invalid = profile_frame(chunk)
+            invalid += chunk_invalid
+            
+            # Deduplicate the valid rows, so an invalid row doesn't claim its name
+            is_new = []
+            for name in zip(frame['first_name'], frame['last_name']):
+                if name in existing_names:
+                    skipped += 1
+                    is_new.append(False)
+                else:
+                    existing_names.add(name)
+                    is_new.append(True)
+            frame = frame[is_new]
+            if frame.empty:
+                continue
+            
+            buffer = io.StringIO()
+            frame.to_csv(buffer, index=False, header=False)
+            buffer.seek(0)
+            
+            # Keep at most two chunks per worker in memory
+            if len(pending) >= 2 * LOAD_WORKERS:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            pending[executor.submit(copy_chunk, engine, buffer)] = len(frame)
+        
+        collect(list(pending))
+    
+    if skipped:
+        print(f"Skipped {skipped} profiles whose names already exist.")
+    if invalid:
+        print(f"Skipped {invalid} profiles with invalid values.")
     print(f"Successfully added {profiles_added} patient profiles to the database.")
 
 if __name__ == "__main__":
-    # Create Flask app
-    app = create_app()
-    
     # Load profiles from CSV
     load_profiles_from_csv('patient_profiles.csv')
     
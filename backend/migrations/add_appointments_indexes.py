@@ -0,0 +1,49 @@
+import sys
+import os
+
+# Add the parent directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Now import from the app package
+from app import db, create_app
+import sqlalchemy as sa
+from sqlalchemy import text
+
+app = create_app()
+
+# Indexes for the appointment listing's filters and ORDER BY (urgency_level DESC, created_at DESC)
+INDEXES = {
+    'ix_appointments_urgency_created': "(urgency_level DESC, created_at DESC)",
+    'ix_appointments_patient_urgency_created': "(patient_id, urgency_level DESC, created_at DESC)",
+    'ix_appointments_status': "(status)",
+}
+
+def run_migration():
+    with app.app_context():
+        try:
+            print("Starting migration to add indexes to appointments table...")
+            
+            # Check which indexes already exist
+            inspector = sa.inspect(db.engine)
+            indexes = [index['name'] for index in inspector.get_indexes('appointments')]
+            
+            # CREATE INDEX CONCURRENTLY doesn't block writes but can't run inside a transaction
+            with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+                for name, columns in INDEXES.items():
+                    if name not in indexes:
+                        print(f"Creating '{name}' index...")
+                        connection.execute(text(f"CREATE INDEX CONCURRENTLY {name} ON appointments {columns};"))
+                        print(f"Created '{name}' index successfully!")
+                    else:
+                        print(f"Index '{name}' already exists, skipping...")
+                
+                connection.execute(text("ANALYZE appointments;"))
+            
+            print("Migration completed successfully!")
+            
+        except Exception as e:
+            print(f"Error during migration: {str(e)}")
+            raise
+
+if __name__ == "__main__":
+    run_migration()
@@ -6,7 +6,6 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 
 # Now import from the app package
 from app import db, create_app
-import sqlalchemy as sa
 from sqlalchemy import text
 
 app = create_app()
@@ -17,23 +16,13 @@ def run_migration():
         try:
             print("Starting migration to add dos and donts columns...")
             
-            # Check if columns already exist
-            inspector = sa.inspect(db.engine)
-            columns = [col['name'] for col in inspector.get_columns('symptom_assessments')]
-            
-            # Add dos column if it doesn't exist
-            if 'dos' not in columns:
-                print("Adding 'dos' column...")
-                db.session.execute(text("ALTER TABLE symptom_assessments ADD COLUMN dos TEXT"))
-            else:
-                print("Column 'dos' already exists, skipping...")
-                
-            # Add donts column if it doesn't exist
-            if 'donts' not in columns:
-                print("Adding 'donts' column...")
-                db.session.execute(text("ALTER TABLE symptom_assessments ADD COLUMN donts TEXT"))
-            else:
-                print("Column 'donts' already exists, skipping...")
+            # Add both columns in one statement; IF NOT EXISTS skips any that are already there
+            print("Adding 'dos' and 'donts' columns if they don't exist...")
+            db.session.execute(text(
+                "ALTER TABLE symptom_assessments "
+                "ADD COLUMN IF NOT EXISTS dos TEXT, "
+                "ADD COLUMN IF NOT EXISTS donts TEXT"
+            ))
             
             # Commit the transaction
             db.session.commit()
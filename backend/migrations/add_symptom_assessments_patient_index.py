@@ -0,0 +1,43 @@
+import sys
+import os
+
+# Add the parent directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Now import from the app package
+from app import db, create_app
+import sqlalchemy as sa
+from sqlalchemy import text
+
+app = create_app()
+
+def run_migration():
+    with app.app_context():
+        try:
+            print("Starting migration to add patient_id index to symptom_assessments table...")
+            
+            # Check if index already exists
+            inspector = sa.inspect(db.engine)
+            indexes = [index['name'] for index in inspector.get_indexes('symptom_assessments')]
+            
+            if 'ix_symptom_assessments_patient_id' not in indexes:
+                print("Creating 'ix_symptom_assessments_patient_id' index...")
+                db.session.execute(text("""
+                CREATE INDEX ix_symptom_assessments_patient_id
+                ON symptom_assessments (patient_id);
+                """))
+                print("Created 'ix_symptom_assessments_patient_id' index successfully!")
+            else:
+                print("Index 'ix_symptom_assessments_patient_id' already exists, skipping...")
+            
+            # Commit the transaction
+            db.session.commit()
+            print("Migration completed successfully!")
+            
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error during migration: {str(e)}")
+            raise
+
+if __name__ == "__main__":
+    run_migration()
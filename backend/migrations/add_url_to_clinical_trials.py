@@ -6,40 +6,45 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 
 # Now import from the app package
 from app import db, create_app
-import sqlalchemy as sa
 from sqlalchemy import text
 
 app = create_app()
 
+# Rows backfilled per transaction, so a large table isn't locked and rewritten in one go
+BACKFILL_BATCH_SIZE = 10000
+
 def run_migration():
     with app.app_context():
         try:
             print("Starting migration to add URL column to clinical_trials table...")
             
-            # Check if column already exists
-            inspector = sa.inspect(db.engine)
-            columns = [col['name'] for col in inspector.get_columns('clinical_trials')]
+            # IF NOT EXISTS makes this a no-op when the column is already there
+            print("Adding 'url' column to 'clinical_trials' table if it doesn't exist...")
+            db.session.execute(text("""
+            ALTER TABLE clinical_trials 
+            ADD COLUMN IF NOT EXISTS url VARCHAR(255);
+            """))
+            db.session.commit()
             
-            if 'url' not in columns:
-                print("Adding 'url' column to 'clinical_trials' table...")
-                db.session.execute(text("""
-                ALTER TABLE clinical_trials 
-                ADD COLUMN url VARCHAR(255);
-                """))
-                
-                # Update existing records to have a URL based on their NCT ID
-                db.session.execute(text("""
+            # Fill in a URL based on the NCT ID for records that don't have one yet,
+            # one batch per transaction until none are left
+            backfilled = 0
+            while True:
+                result = db.session.execute(text("""
                 UPDATE clinical_trials 
                 SET url = 'https://clinicaltrials.gov/study/' || nct_id 
-                WHERE nct_id IS NOT NULL;
-                """))
-                
-                print("Added 'url' column to 'clinical_trials' table successfully!")
-            else:
-                print("Column 'url' already exists in 'clinical_trials' table, skipping...")
+                WHERE id IN (
+                    SELECT id FROM clinical_trials
+                    WHERE nct_id IS NOT NULL AND url IS NULL
+                    LIMIT :batch_size
+                );
+                """), {'batch_size': BACKFILL_BATCH_SIZE})
+                db.session.commit()
+                if result.rowcount == 0:
+                    break
+                backfilled += result.rowcount
+                print(f"Backfilled URLs for {backfilled} clinical trials...")
             
-            # Commit the transaction
-            db.session.commit()
             print("Migration completed successfully!")
             
         except Exception as e:
@@ -0,0 +1,58 @@
+import sys
+import os
+
+# Add the parent directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Now import from the app package
+from app import db, create_app
+import sqlalchemy as sa
+from sqlalchemy import text
+
+app = create_app()
+
+def run_migration():
+    with app.app_context():
+        try:
+            print("Starting migration to compress and index medical_documents.content_text...")
+            
+            # Large extracted text is already stored out of line (TOAST), so listings that
+            # defer the column never read it; lz4 makes those values smaller and faster to decompress
+            server_version = db.session.execute(text("SHOW server_version_num")).scalar()
+            if int(server_version) >= 140000:
+                print("Setting lz4 compression on 'content_text'...")
+                db.session.execute(text("""
+                ALTER TABLE medical_documents
+                ALTER COLUMN content_text SET COMPRESSION lz4;
+                """))
+                print("Set lz4 compression on 'content_text'; only values written from now on use it")
+                print("Existing values keep their compression until they are UPDATEd or the table is "
+                      "dumped and restored; VACUUM FULL and CLUSTER copy them as-is")
+            else:
+                print("PostgreSQL 14+ is required for lz4 column compression, skipping...")
+            
+            # Check if index already exists
+            inspector = sa.inspect(db.engine)
+            indexes = [index['name'] for index in inspector.get_indexes('medical_documents')]
+            
+            if 'ix_medical_documents_content_tsv' not in indexes:
+                print("Creating 'ix_medical_documents_content_tsv' full-text index...")
+                db.session.execute(text("""
+                CREATE INDEX ix_medical_documents_content_tsv
+                ON medical_documents USING GIN (to_tsvector('english', coalesce(content_text, '')));
+                """))
+                print("Created 'ix_medical_documents_content_tsv' index successfully!")
+            else:
+                print("Index 'ix_medical_documents_content_tsv' already exists, skipping...")
+            
+            # Commit the transaction
+            db.session.commit()
+            print("Migration completed successfully!")
+            
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error during migration: {str(e)}")
+            raise
+
+if __name__ == "__main__":
+    run_migration()
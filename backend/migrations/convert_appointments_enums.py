@@ -0,0 +1,72 @@
+import sys
+import os
+
+# Add the parent directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Now import from the app package
+from app import db, create_app
+from sqlalchemy import text
+
+app = create_app()
+
+def run_migration():
+    with app.app_context():
+        try:
+            print("Starting migration to convert appointments urgency_level and status to enums...")
+            
+            # Check if the columns have already been converted
+            column_types = dict(db.session.execute(text("""
+            SELECT column_name, udt_name FROM information_schema.columns
+            WHERE table_name = 'appointments' AND column_name IN ('urgency_level', 'status');
+            """)).all())
+            
+            if column_types.get('urgency_level') != 'urgency_level_enum':
+                print("Converting 'urgency_level' to urgency_level_enum...")
+                # Declared least to most severe, so ORDER BY sorts by severity
+                db.session.execute(text("""
+                CREATE TYPE urgency_level_enum AS ENUM ('low', 'medium', 'high', 'emergency');
+                """))
+                # Map free-text urgencies saved so far onto the levels
+                db.session.execute(text("""
+                ALTER TABLE appointments ALTER COLUMN urgency_level TYPE urgency_level_enum
+                USING (CASE lower(trim(urgency_level))
+                    WHEN 'low' THEN 'low'
+                    WHEN 'high' THEN 'high'
+                    WHEN 'urgent' THEN 'high'
+                    WHEN 'severe' THEN 'high'
+                    WHEN 'emergency' THEN 'emergency'
+                    WHEN 'immediate' THEN 'emergency'
+                    WHEN 'critical' THEN 'emergency'
+                    ELSE 'medium'
+                END)::urgency_level_enum;
+                """))
+                print("Converted 'urgency_level' successfully!")
+            else:
+                print("Column 'urgency_level' is already an enum, skipping...")
+            
+            if column_types.get('status') != 'appointment_status_enum':
+                print("Converting 'status' to appointment_status_enum...")
+                db.session.execute(text("""
+                CREATE TYPE appointment_status_enum AS ENUM ('pending', 'confirmed', 'completed', 'cancelled');
+                """))
+                db.session.execute(text("""
+                ALTER TABLE appointments ALTER COLUMN status TYPE appointment_status_enum
+                USING (CASE WHEN lower(trim(status)) IN ('pending', 'confirmed', 'completed', 'cancelled')
+                    THEN lower(trim(status)) ELSE 'pending' END)::appointment_status_enum;
+                """))
+                print("Converted 'status' successfully!")
+            else:
+                print("Column 'status' is already an enum, skipping...")
+            
+            # Commit the transaction
+            db.session.commit()
+            print("Migration completed successfully!")
+            
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error during migration: {str(e)}")
+            raise
+
+if __name__ == "__main__":
+    run_migration()
@@ -0,0 +1,77 @@
+import sys
+import os
+
+# Add the parent directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Now import from the app package
+from app import db, create_app
+from sqlalchemy import text
+
+app = create_app()
+
+# Text columns holding JSON lists, per table
+JSON_COLUMNS = {
+    'profiles': ['allergies', 'medications', 'chronic_conditions', 'surgical_history', 'immunizations'],
+    'symptom_assessments': ['recommendations', 'dos', 'donts']
+}
+
+def run_migration():
+    with app.app_context():
+        try:
+            print("Starting migration to convert JSON text columns to JSONB...")
+            
+            # Parses a value as JSON, returning NULL for text that isn't valid JSON
+            db.session.execute(text("""
+            CREATE FUNCTION pg_temp.try_jsonb(value text) RETURNS jsonb AS $$
+            BEGIN
+                RETURN value::jsonb;
+            EXCEPTION WHEN others THEN
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql IMMUTABLE;
+            """))
+            
+            for table, columns in JSON_COLUMNS.items():
+                column_types = dict(db.session.execute(text("""
+                SELECT column_name, data_type FROM information_schema.columns
+                WHERE table_name = :table;
+                """), {"table": table}).all())
+                
+                for column in columns:
+                    if column not in column_types:
+                        print(f"Column '{table}.{column}' does not exist, skipping...")
+                        continue
+                    if column_types[column] == 'jsonb':
+                        print(f"Column '{table}.{column}' is already JSONB, skipping...")
+                        continue
+                    
+                    print(f"Converting '{table}.{column}' to JSONB...")
+                    if column == 'recommendations':
+                        # Some older assessments saved a single recommendation as plain text
+                        using = ("COALESCE(pg_temp.try_jsonb(recommendations), "
+                                 "jsonb_build_array(recommendations))")
+                    else:
+                        using = f"pg_temp.try_jsonb(NULLIF({column}, ''))"
+                    db.session.execute(text(f"""
+                    ALTER TABLE {table} ALTER COLUMN {column} TYPE jsonb USING {using};
+                    """))
+                    print(f"Converted '{table}.{column}' successfully!")
+            
+            # Index allergies for containment searches
+            print("Creating index 'ix_profiles_allergies'...")
+            db.session.execute(text("""
+            CREATE INDEX IF NOT EXISTS ix_profiles_allergies ON profiles USING GIN (allergies jsonb_path_ops);
+            """))
+            
+            # Commit the transaction
+            db.session.commit()
+            print("Migration completed successfully!")
+        
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error during migration: {str(e)}")
+            raise
+
+if __name__ == "__main__":
+    run_migration()
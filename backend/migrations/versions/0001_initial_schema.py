@@ -0,0 +1,164 @@
+"""Initial schema
+
+Tables as defined by the models, without their secondary indexes, which
+0002 builds concurrently. Databases created earlier with create_tables.py
+and the scripts in migrations/ already match it; mark them with
+``flask db stamp 0001`` and then run ``flask db upgrade``.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-14 16:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'items',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'profiles',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('first_name', sa.String(length=100), nullable=False),
+        sa.Column('last_name', sa.String(length=100), nullable=False),
+        sa.Column('date_of_birth', sa.Date(), nullable=False),
+        sa.Column('age', sa.Integer(), nullable=False),
+        sa.Column('gender', sa.String(length=20), nullable=False),
+        sa.Column('email', sa.String(length=120), nullable=True),
+        sa.Column('phone', sa.String(length=20), nullable=True),
+        sa.Column('address', sa.String(length=255), nullable=True),
+        sa.Column('city', sa.String(length=100), nullable=True),
+        sa.Column('state', sa.String(length=100), nullable=True),
+        sa.Column('zip_code', sa.String(length=20), nullable=True),
+        sa.Column('height', sa.Float(), nullable=True),
+        sa.Column('weight', sa.Float(), nullable=True),
+        sa.Column('blood_type', sa.String(length=10), nullable=True),
+        sa.Column('bmi', sa.Float(), nullable=True),
+        sa.Column('allergies', postgresql.JSONB(), nullable=True),
+        sa.Column('medications', postgresql.JSONB(), nullable=True),
+        sa.Column('chronic_conditions', postgresql.JSONB(), nullable=True),
+        sa.Column('medical_history', sa.Text(), nullable=True),
+        sa.Column('surgical_history', postgresql.JSONB(), nullable=True),
+        sa.Column('family_medical_history', sa.Text(), nullable=True),
+        sa.Column('immunizations', postgresql.JSONB(), nullable=True),
+        sa.Column('smoking_status', sa.String(length=20), nullable=True),
+        sa.Column('alcohol_consumption', sa.String(length=20), nullable=True),
+        sa.Column('exercise_frequency', sa.String(length=20), nullable=True),
+        sa.Column('diet_restrictions', sa.String(length=100), nullable=True),
+        sa.Column('occupation', sa.String(length=100), nullable=True),
+        sa.Column('emergency_contact_name', sa.String(length=100), nullable=True),
+        sa.Column('emergency_contact_phone', sa.String(length=20), nullable=True),
+        sa.Column('emergency_contact_relationship', sa.String(length=50), nullable=True),
+        sa.Column('primary_physician', sa.String(length=100), nullable=True),
+        sa.Column('primary_physician_phone', sa.String(length=20), nullable=True),
+        sa.Column('insurance_provider', sa.String(length=100), nullable=True),
+        sa.Column('insurance_policy_number', sa.String(length=50), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'symptom_assessments',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('patient_id', sa.String(length=50), nullable=True),
+        sa.Column('symptoms', sa.Text(), nullable=False),
+        sa.Column('age', sa.Integer(), nullable=True),
+        sa.Column('sex', sa.String(length=20), nullable=True),
+        sa.Column('medical_history', sa.Text(), nullable=True),
+        sa.Column('urgency_level', sa.String(length=20), nullable=False),
+        sa.Column('urgency_description', sa.Text(), nullable=False),
+        sa.Column('reasoning', sa.Text(), nullable=False),
+        sa.Column('recommendations', postgresql.JSONB(), nullable=False),
+        sa.Column('dos', postgresql.JSONB(), nullable=True),
+        sa.Column('donts', postgresql.JSONB(), nullable=True),
+        sa.Column('disclaimer', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'pubmed_references',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('assessment_id', sa.Integer(), nullable=True),
+        sa.Column('pmid', sa.String(length=20), nullable=True),
+        sa.Column('title', sa.Text(), nullable=True),
+        sa.Column('abstract', sa.Text(), nullable=True),
+        sa.Column('date', sa.String(length=50), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['assessment_id'], ['symptom_assessments.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'clinical_trials',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('assessment_id', sa.Integer(), nullable=False),
+        sa.Column('nct_id', sa.String(length=20), nullable=True),
+        sa.Column('title', sa.Text(), nullable=True),
+        sa.Column('status', sa.String(length=50), nullable=True),
+        sa.Column('phase', sa.String(length=50), nullable=True),
+        sa.Column('summary', sa.Text(), nullable=True),
+        sa.Column('conditions', sa.Text(), nullable=True),
+        sa.Column('start_date', sa.String(length=50), nullable=True),
+        sa.Column('completion_date', sa.String(length=50), nullable=True),
+        sa.Column('url', sa.String(length=255), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['assessment_id'], ['symptom_assessments.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'medical_documents',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('patient_id', sa.String(length=100), nullable=True),
+        sa.Column('filename', sa.String(length=255), nullable=False),
+        sa.Column('file_type', sa.String(length=50), nullable=False),
+        sa.Column('file_size', sa.Integer(), nullable=False),
+        sa.Column('file_path', sa.String(length=500), nullable=False),
+        sa.Column('content_text', sa.Text(), nullable=True),
+        sa.Column('document_metadata', sa.Text(), nullable=True),
+        sa.Column('uploaded_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'appointments',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('patient_id', sa.Integer(), nullable=True),
+        sa.Column('assessment_id', sa.Integer(), nullable=True),
+        sa.Column('title', sa.String(length=255), nullable=False),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('urgency_level', sa.Enum('low', 'medium', 'high', 'emergency', name='urgency_level_enum'),
+                  nullable=False),
+        sa.Column('status', sa.Enum('pending', 'confirmed', 'completed', 'cancelled', name='appointment_status_enum'),
+                  nullable=False),
+        sa.Column('appointment_time', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['assessment_id'], ['symptom_assessments.id']),
+        sa.ForeignKeyConstraint(['patient_id'], ['profiles.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('appointments')
+    op.drop_table('medical_documents')
+    op.drop_table('clinical_trials')
+    op.drop_table('pubmed_references')
+    op.drop_table('symptom_assessments')
+    op.drop_table('profiles')
+    op.drop_table('items')
+    sa.Enum(name='appointment_status_enum').drop(op.get_bind(), checkfirst=True)
+    sa.Enum(name='urgency_level_enum').drop(op.get_bind(), checkfirst=True)
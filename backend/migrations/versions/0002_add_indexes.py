@@ -0,0 +1,43 @@
+"""Add secondary indexes
+
+Built with CREATE INDEX CONCURRENTLY, so reads and writes carry on while
+the indexes are built on a live database. That can't run inside a
+transaction, so each statement runs in an autocommit block. IF NOT EXISTS
+skips indexes that the older scripts in migrations/ already created.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-14 16:10:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+# Index name -> table and indexed expression, matching the models
+INDEXES = {
+    'ix_symptom_assessments_patient_id': "symptom_assessments (patient_id)",
+    'ix_medical_documents_patient_id': "medical_documents (patient_id)",
+    'ix_medical_documents_content_tsv':
+        "medical_documents USING GIN (to_tsvector('english', coalesce(content_text, '')))",
+    'ix_profiles_allergies': "profiles USING GIN (allergies jsonb_path_ops)",
+    'ix_appointments_urgency_created': "appointments (urgency_level DESC, created_at DESC)",
+    'ix_appointments_patient_urgency_created': "appointments (patient_id, urgency_level DESC, created_at DESC)",
+    'ix_appointments_status': "appointments (status)",
+}
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for name, definition in INDEXES.items():
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {definition}")
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name in reversed(list(INDEXES)):
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
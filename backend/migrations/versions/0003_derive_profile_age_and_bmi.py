@@ -0,0 +1,36 @@
+"""Derive profile age and BMI
+
+age is dropped; the model computes it from date_of_birth. bmi becomes a
+stored generated column computed from height and weight.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-14 16:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+BMI_EXPRESSION = 'weight / NULLIF((height / 100.0) * (height / 100.0), 0)'
+
+
+def upgrade():
+    op.drop_column('profiles', 'age')
+    # A column can't be turned into a generated one in place
+    op.drop_column('profiles', 'bmi')
+    op.add_column('profiles', sa.Column('bmi', sa.Float(), sa.Computed(BMI_EXPRESSION, persisted=True)))
+
+
+def downgrade():
+    op.drop_column('profiles', 'bmi')
+    op.add_column('profiles', sa.Column('bmi', sa.Float(), nullable=True))
+    op.add_column('profiles', sa.Column('age', sa.Integer(), nullable=True))
+    op.execute(f"UPDATE profiles SET bmi = {BMI_EXPRESSION}, "
+               "age = date_part('year', age(date_of_birth))::integer")
+    op.alter_column('profiles', 'age', nullable=False)
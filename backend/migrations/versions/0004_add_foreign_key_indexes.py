@@ -0,0 +1,39 @@
+"""Index assessment foreign keys
+
+PostgreSQL doesn't index foreign key columns by itself, so loading an
+assessment's references, trials and appointments scanned those tables.
+appointments.patient_id is already the leading column of
+ix_appointments_patient_urgency_created.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-14 16:45:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+# Index name -> (table, column)
+INDEXES = {
+    'ix_pubmed_references_assessment_id': ('pubmed_references', 'assessment_id'),
+    'ix_clinical_trials_assessment_id': ('clinical_trials', 'assessment_id'),
+    'ix_appointments_assessment_id': ('appointments', 'assessment_id'),
+}
+
+
+def upgrade():
+    # Built concurrently, which can't run inside a transaction
+    with op.get_context().autocommit_block():
+        for name, (table, column) in INDEXES.items():
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({column})")
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name in INDEXES:
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
@@ -0,0 +1,31 @@
+"""Store missing profile lists as SQL NULL
+
+The profile list columns now bind None as SQL NULL. Rows written before
+that, by the batched INSERT in generate_profiles.py or through the API,
+hold the JSON value null instead; this turns those into SQL NULL so
+every load path agrees.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-14 18:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+LIST_COLUMNS = ('allergies', 'medications', 'chronic_conditions', 'surgical_history', 'immunizations')
+
+
+def upgrade():
+    for column in LIST_COLUMNS:
+        op.execute(f"UPDATE profiles SET {column} = NULL WHERE {column} = 'null'::jsonb")
+
+
+def downgrade():
+    # SQL NULL and JSON null both read back as None, so there is nothing to restore
+    pass
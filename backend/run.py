@@ -1,12 +1,30 @@
-from app import create_app, db
+import json
+
+import click
+from flask_migrate import upgrade
+
+from app import create_app
 
 app = create_app()
 
 @app.cli.command("init-db")
 def init_db():
-    """Initialize the database."""
-    db.create_all()
+    """Initialize the database by applying the migrations, like ``flask db upgrade``."""
+    upgrade()
     print("Database initialized.")
 
+@app.cli.command("assess-batch")
+@click.argument("cases_file", type=click.File("r"))
+@click.argument("output_file", type=click.File("w"))
+@click.option("--poll-interval", default=60.0, help="Seconds between batch status checks.")
+def assess_batch(cases_file, output_file, poll_interval):
+    """Assess a JSON list of cases offline through the OpenAI Batch API."""
+    from app.ai.routes import get_symptom_agent
+    
+    cases = json.load(cases_file)
+    results = get_symptom_agent().assess_symptoms_offline(cases, poll_interval=poll_interval)
+    json.dump(results, output_file, indent=2)
+    print(f"Assessed {len(results)} cases.")
+
 if __name__ == '__main__':
     app.run(debug=True)